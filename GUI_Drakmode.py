@@ -1,21 +1,22 @@
+from startup_timing import StartupTimer  # 最先导入，启动计时从这里开始
 import os
-import subprocess
-import json
-import datetime
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import ttkbootstrap as tb
 from ttkbootstrap.constants import *
 from tkinter import filedialog, messagebox
-from plyer import notification
-import winreg  # Windows注册表，用于检测系统主题
+from batch_progress import format_eta
+from ui_events import REFRESH_MS, UiEventQueue
 
-CREATE_NO_WINDOW = 0x08000000  # 防止弹出控制台窗口
-VALID_EXTENSIONS = {".mp4", ".mkv", ".avi", ".mov", ".wmv", ".flv", ".ts", ".webm"}
+# 引擎、编码器检测、探测缓存和通知后端在窗口出现后才加载，见 initialize_backend
+
+AUTO_WORKERS = "自动"  # 按核数、内存和分辨率自动调度并发数
+THEME_POLL_MS = 5000  # 检查系统主题变化的间隔
 
 
 def is_windows_dark_mode():
     try:
+        import winreg  # Windows注册表，用于检测系统主题
+
         registry = winreg.ConnectRegistry(None, winreg.HKEY_CURRENT_USER)
         key = winreg.OpenKey(
             registry, r"SOFTWARE\Microsoft\Windows\CurrentVersion\Themes\Personalize"
@@ -28,56 +29,108 @@ def is_windows_dark_mode():
         return False
 
 
-def monitor_system_theme(style, root, interval=5000):
+def system_theme():
+    return "darkly" if is_windows_dark_mode() else "flatly"
+
+
+def monitor_system_theme(style, root, interval=THEME_POLL_MS):
+    """定期跟随系统主题；窗口创建时已按系统主题选择，第一次检查在 interval 之后"""
+
     def check_and_switch():
-        dark_mode = is_windows_dark_mode()
-        current_theme = style.theme_use()
-        target_theme = "darkly" if dark_mode else "flatly"
-        if current_theme != target_theme:
+        target_theme = system_theme()
+        if style.theme_use() != target_theme:
             style.theme_use(target_theme)
         root.after(interval, check_and_switch)
 
-    check_and_switch()
+    root.after(interval, check_and_switch)
+
+
+def notify(text):
+    """发送系统通知；plyer 在第一次通知时才导入，不可用时只打印"""
+    try:
+        from plyer import notification
+
+        notification.notify(
+            title="视频转换器", message=text, app_name="Video Converter", timeout=10
+        )
+    except Exception as e:
+        print(f"发送通知失败: {e}")
 
 
 class VideoConverterGUI:
-    def __init__(self, root):
+    def __init__(self, root, timer=None):
         self.root = root
         self.root.title("视频批量转换器")
         self.root.geometry("550x320")
+        self.timer = timer or StartupTimer()
 
         self.style = tb.Style()  # 初始化样式
         monitor_system_theme(self.style, self.root)  # 启动系统夜间模式监听器
 
-        # 检测显卡类型
-        self.gpu_type = self.detect_gpu()
+        # 以下几项由 initialize_backend 在后台线程中填充，完成后 backend_ready 置位
+        # 试编码检测可用编码器（结果按 ffmpeg 版本缓存）
+        self.capabilities = None
+        self.encoder_chain = None
+        # 编码路径熔断在整个程序运行期间有效
+        self.breaker = None
+        # 每个文件只探测一次，结果持久化缓存
+        self.probe_cache = None
+        self.backend_ready = threading.Event()
+        self.engine = None
+        # 引擎事件经队列交给主线程，按固定间隔合并处理
+        self.events = UiEventQueue()
+        self.status_detail = ""
+        self.status_dirty = False
 
         self.input_dir = tb.StringVar()
-        self.thread_count = tb.IntVar(value=2)  # 默认2线程
-        self.progress = tb.IntVar()
+        self.thread_count = tb.StringVar(value=AUTO_WORKERS)  # 默认自动调度
+        self.stream_mode = tb.BooleanVar(value=True)  # 边扫描边转换
+        self.resume_mode = tb.BooleanVar(value=True)  # 跳过已完成的文件
+        self.watch_mode = tb.BooleanVar(value=False)  # 常驻监视，新文件写完即转换
+        self.watch_stopping = False
+        self.progress = tb.DoubleVar()  # 按时长加权的百分比
         self.total_files = 0
+        self.done_files = 0
+        self.skipped_files = 0
         self.cancelled = False
-        self._stop_event = threading.Event()
 
         # 选择文件夹
         tb.Label(root, text="选择视频文件夹:", font=("微软雅黑", 12)).pack(pady=(15, 5))
         entry_frame = tb.Frame(root)
         entry_frame.pack(pady=5, fill=X, padx=15)
 
-        # 异步线程数选择
+        # 并行任务数选择
         thread_frame = tb.Frame(root)
         thread_frame.pack(pady=5, fill=X, padx=15)
-        tb.Label(thread_frame, text="异步线程数:", font=("微软雅黑", 10)).pack(
+        tb.Label(thread_frame, text="并行任务数:", font=("微软雅黑", 10)).pack(
             side=LEFT
         )
-        tb.Spinbox(
+        tb.Combobox(
             thread_frame,
-            from_=1,
-            to=5,
+            values=[AUTO_WORKERS] + [str(n) for n in range(1, (os.cpu_count() or 1) + 1)],
             textvariable=self.thread_count,
             width=5,
+            state="readonly",
             bootstyle="info",
         ).pack(side=LEFT, padx=10)
+        tb.Checkbutton(
+            thread_frame,
+            text="边扫描边转换",
+            variable=self.stream_mode,
+            bootstyle="info-round-toggle",
+        ).pack(side=LEFT, padx=10)
+        tb.Checkbutton(
+            thread_frame,
+            text="跳过已完成",
+            variable=self.resume_mode,
+            bootstyle="info-round-toggle",
+        ).pack(side=LEFT, padx=10)
+        tb.Checkbutton(
+            thread_frame,
+            text="监视文件夹",
+            variable=self.watch_mode,
+            bootstyle="info-round-toggle",
+        ).pack(side=LEFT, padx=10)
         self.entry = tb.Entry(
             entry_frame, textvariable=self.input_dir, bootstyle="info", width=45
         )
@@ -111,6 +164,7 @@ class VideoConverterGUI:
             orient="horizontal",
             length=480,
             mode="determinate",
+            maximum=100,
             variable=self.progress,
         )
         self.progress_bar.pack(pady=10, padx=15)
@@ -121,12 +175,41 @@ class VideoConverterGUI:
 
         # 硬件加速状态显示
         self.hw_status_label = tb.Label(
-            root, text="硬件加速: 未开始", font=("微软雅黑", 9)
+            root, text="正在检测编码器...", font=("微软雅黑", 9)
         )
         self.hw_status_label.pack(pady=2)
 
         # 绑定输入框变化，控制按钮状态
         self.input_dir.trace_add("write", self.toggle_start_button)
+        self.root.after(REFRESH_MS, self.drain_events)
+        # 窗口第一次空闲（已显示、可以响应操作）时输出启动耗时，再开始后台初始化
+        self.root.after_idle(self.on_window_ready)
+
+    def on_window_ready(self):
+        print(self.timer.report("窗口可交互"))
+        threading.Thread(target=self.initialize_backend, daemon=True).start()
+
+    def initialize_backend(self):
+        """后台导入引擎、加载探测缓存并检测编码器，结果经事件队列交给主线程"""
+        text = "可用编码器: 检测失败"
+        try:
+            with self.timer.step("导入引擎模块", background=True):
+                import convert_engine  # 预先导入，开始转换时不再等待
+                from encoder_caps import EncoderCapabilities
+                from circuit_breaker import EncoderCircuitBreaker
+                from media_probe import ProbeCache
+            with self.timer.step("加载探测缓存", background=True):
+                self.probe_cache = ProbeCache()
+            self.breaker = EncoderCircuitBreaker()
+            with self.timer.step("检测编码器", background=True):
+                self.capabilities = EncoderCapabilities()
+                self.encoder_chain = self.capabilities.build_chain()
+                text = f"可用编码器: {self.capabilities.describe()}"
+        except Exception as e:
+            print(f"后台初始化失败: {e}")
+        finally:
+            self.backend_ready.set()
+            self.events.put({"event": "backend_ready", "text": text})
 
     def browse_directory(self):
         path = filedialog.askdirectory()
@@ -144,516 +227,190 @@ class VideoConverterGUI:
             messagebox.showwarning("提示", "请选择视频文件夹！")
             return
         self.cancelled = False
-        self._stop_event.clear()
+        self.watch_stopping = False
+        # 新引擎创建前点击取消只设置 cancelled，由 convert_all_videos 在创建后取消，
+        # 不能作用到上一次运行留下的引擎
+        self.engine = None
         self.start_btn.config(state=DISABLED)
         self.cancel_btn.config(state=NORMAL)
         self.progress.set(0)
+        self.total_files = self.done_files = self.skipped_files = 0
         self.status_label.config(text="正在扫描文件...")
 
         threading.Thread(target=self.convert_all_videos, daemon=True).start()
 
     def cancel_conversion(self):
+        # 监视模式下第一次点击只停止监视，已排队的文件转换完再结束
+        if self.engine and self.engine.watch and not self.watch_stopping:
+            self.watch_stopping = True
+            self.engine.stop_watch()
+            self.status_label.config(text="已停止监视，正在转换已排队的文件...")
+            return
         self.cancelled = True
-        self._stop_event.set()
+        if self.engine:
+            self.engine.cancel()
         self.status_label.config(text="取消中，请稍候...")
 
     def convert_all_videos(self):
-        input_dir = self.input_dir.get().strip()
-        if not os.path.exists(input_dir):
-            self.show_error("路径不存在")
-            self.reset_buttons()
+        from convert_engine import ConversionEngine
+
+        # 编码器检测未完成时先等待；检测失败时由引擎自行生成编码链
+        if not self.backend_ready.is_set():
+            self.events.put({"event": "backend_waiting"})
+            self.backend_ready.wait()
+        workers = self.thread_count.get()
+        summary = None
+        try:
+            self.engine = ConversionEngine(
+                self.input_dir.get().strip(),
+                workers=0 if workers == AUTO_WORKERS else int(workers),
+                encoder_chain=self.encoder_chain,
+                breaker=self.breaker,
+                probe_cache=self.probe_cache,
+                stream=self.stream_mode.get(),
+                resume=self.resume_mode.get(),
+                watch=self.watch_mode.get(),
+                on_event=self.events.put,
+            )
+            if self.cancelled:
+                self.engine.cancel()
+            summary = self.engine.run()
+        except Exception as e:
+            # 例如输出目录不可写：报告错误，按钮照常恢复
+            self.events.put({"event": "error", "message": f"转换失败: {e}"})
+        finally:
+            # 结果在主线程中展示，这里只投递事件
+            self.events.put({"event": "batch_finished", "summary": summary})
+
+    def finish_batch(self, summary):
+        """批次结束：在主线程中恢复按钮、显示汇总并询问是否删除源文件"""
+        self.reset_buttons()
+        if summary is None:
+            self.status_label.config(text="转换失败")
             return
-
-        # 收集视频文件及其大小
-        video_files = []
-        for root_dir, _, files in os.walk(input_dir):
-            for f in files:
-                full_path = os.path.join(root_dir, f)
-                if self.is_video_file(full_path):
-                    try:
-                        size = os.path.getsize(full_path)
-                        video_files.append((size, full_path))
-                    except Exception as e:
-                        print(f"获取文件大小失败: {e}")
-                        video_files.append((0, full_path))  # 无法获取大小时默认0
-
-        # 按文件大小升序排序(先处理小文件)
-        video_files.sort(key=lambda x: x[0])
-        video_files = [f[1] for f in video_files]  # 只保留路径
-
-        self.total_files = len(video_files)
-        if self.total_files == 0:
-            self.show_error("未找到有效视频文件")
-            self.reset_buttons()
+        if summary["total"] == 0:
             return
 
-        self.progress_bar["maximum"] = self.total_files
-        self.status_label.config(text=f"准备转换 {self.total_files} 个文件")
-
-        output_dir = os.path.join(input_dir, "Converted")
-        log_dir = os.path.join(input_dir, "Logs")
-        os.makedirs(output_dir, exist_ok=True)
-        os.makedirs(log_dir, exist_ok=True)
-
-        success = 0
-        failed = []
-        skipped = 0
-
-        with ThreadPoolExecutor(max_workers=self.thread_count.get()) as executor:
-            futures = []
-            for vf in video_files:  # 已按大小排序
-                if self._stop_event.is_set():
-                    break
-                if not self.is_video_file(vf):
-                    skipped += 1
-                    continue
-                futures.append(
-                    executor.submit(self.convert_single_video, vf, output_dir, log_dir)
-                )
-
-            for idx, future in enumerate(as_completed(futures), 1):
-                if self._stop_event.is_set():
-                    break
-                try:
-                    result, input_file = future.result()
-                    if result:
-                        success += 1
-                    else:
-                        failed.append(input_file)
-                except Exception as e:
-                    failed.append(f"Error processing file: {str(e)}")
-
-                self.progress.set(success + len(failed))
-                self.status_label.config(
-                    text=f"处理文件 {success + len(failed)}/{self.total_files} (跳过 {skipped})"
-                )
-
-        if self.cancelled:
-            summary = f"转换已取消：完成 {success}/{self.total_files} (跳过 {skipped})"
+        success, failed, skipped = (
+            summary["success"],
+            summary["failed"],
+            summary["skipped"],
+        )
+        if summary["cancelled"]:
+            text = f"转换已取消：完成 {success}/{summary['total']} (跳过 {skipped})"
         else:
-            summary = f"转换完成：成功 {success}/{self.total_files}，失败 {len(failed)}，跳过 {skipped}"
+            text = f"转换完成：成功 {success}/{summary['total']}，失败 {len(failed)}，跳过 {skipped}"
+            if summary["kept"]:
+                text += f"，{len(summary['kept'])} 个编码后没有变小，保留源文件"
             if failed:
-                summary += f"\n失败示例：{', '.join([os.path.basename(f) if isinstance(f, str) and os.path.exists(f) else f for f in failed[:3]])} 等"
+                text += f"\n失败示例：{', '.join([os.path.basename(f) if isinstance(f, str) and os.path.exists(f) else f for f in failed[:3]])} 等"
 
-        notification.notify(
-            title="视频转换器", message=summary, app_name="Video Converter", timeout=10
-        )
+        # 通知后端第一次加载较慢，不占用主线程
+        threading.Thread(target=notify, args=(text,), daemon=True).start()
 
-        self.status_label.config(text=summary)
-        self.reset_buttons()
+        self.status_label.config(text=text)
 
         # 检查并删除源文件（安全版本）
-        if not self.cancelled and success > 0 and len(failed) == 0:
+        if not summary["cancelled"] and success > 0 and len(failed) == 0:
             if messagebox.askyesno("确认", f"转换完成，是否删除{success}个源文件？"):
-                deleted = 0
-                input_dir = os.path.normpath(self.input_dir.get().strip())
-                for future in futures:
-                    try:
-                        result, input_file = future.result()
-                        if result and os.path.exists(input_file):
-                            # 安全检查：确保文件在输入目录下
-                            file_path = os.path.normpath(input_file)
-                            common_path = os.path.commonpath([input_dir, file_path])
-                            if (
-                                common_path == input_dir
-                                and file_path != input_dir
-                                and os.path.dirname(file_path) != input_dir
-                            ):
-                                try:
-                                    os.remove(input_file)
-                                    deleted += 1
-                                except Exception as e:
-                                    print(f"删除文件失败: {e}")
-                    except Exception as e:
-                        print(f"删除文件错误: {e}")
-                self.status_label.config(text=f"{summary}\n已安全删除{deleted}个源文件")
-
-    def detect_gpu(self):
-        """检测显卡类型"""
-        # 方法1: 使用dxdiag命令检测
-        try:
-            result = subprocess.run(
-                ["dxdiag", "/t", "dxdiag.txt"],
-                capture_output=True,
-                text=True,
-                creationflags=CREATE_NO_WINDOW,
-                timeout=10,
-            )
-
-            if os.path.exists("dxdiag.txt"):
-                with open("dxdiag.txt", "r", encoding="utf-16") as f:
-                    dxdiag = f.read()
-                os.remove("dxdiag.txt")
-
-                if "NVIDIA" in dxdiag:
-                    self.root.after(
-                        0,
-                        lambda: self.hw_status_label.config(text="检测到显卡: NVIDIA"),
-                    )
-                    return "nvidia"
-                elif "AMD" in dxdiag or "Radeon" in dxdiag:
-                    self.root.after(
-                        0, lambda: self.hw_status_label.config(text="检测到显卡: AMD")
-                    )
-                    return "amd"
-                elif "Intel" in dxdiag:
-                    self.root.after(
-                        0, lambda: self.hw_status_label.config(text="检测到显卡: Intel")
-                    )
-                    return "intel"
-        except Exception as e:
-            print(f"dxdiag检测失败: {e}")
-
-        # 方法2: 使用wmic命令检测
-        try:
-            result = subprocess.run(
-                ["wmic", "path", "win32_VideoController", "get", "name"],
-                capture_output=True,
-                text=True,
-                creationflags=CREATE_NO_WINDOW,
-                timeout=5,
-            )
-            if result.returncode == 0:
-                output = result.stdout
-                if "NVIDIA" in output:
-                    self.root.after(
-                        0,
-                        lambda: self.hw_status_label.config(text="检测到显卡: NVIDIA"),
-                    )
-                    return "nvidia"
-                elif "AMD" in output or "Radeon" in output:
-                    self.root.after(
-                        0, lambda: self.hw_status_label.config(text="检测到显卡: AMD")
-                    )
-                    return "amd"
-                elif "Intel" in output:
-                    self.root.after(
-                        0, lambda: self.hw_status_label.config(text="检测到显卡: Intel")
-                    )
-                    return "intel"
-        except Exception as e:
-            print(f"wmic检测失败: {e}")
+                # 文件很多时删除较慢，放到后台线程
+                threading.Thread(
+                    target=self.delete_converted,
+                    args=(self.engine.input_dir, summary["converted"], text),
+                    daemon=True,
+                ).start()
 
-    def verify_conversion(self, input_file, output_file):
-        """验证转换是否成功完成"""
-        try:
-            # 检查输出文件是否存在且大小合理
-            if not os.path.exists(output_file):
-                return False
-
-            input_size = os.path.getsize(input_file)
-            output_size = os.path.getsize(output_file)
-
-            # 输出文件不应为0且不应小于输入文件的10%
-            if output_size == 0 or output_size < input_size * 0.1:
-                return False
-
-            # 检查视频时长是否匹配
-            def get_duration(file):
-                cmd = [
-                    "ffprobe",
-                    "-v",
-                    "error",
-                    "-show_entries",
-                    "format=duration",
-                    "-of",
-                    "default=noprint_wrappers=1:nokey=1",
-                    file,
-                ]
-                result = subprocess.run(
-                    cmd, capture_output=True, text=True, creationflags=CREATE_NO_WINDOW
-                )
-                if result.returncode == 0:
-                    return float(result.stdout.strip())
-                return 0
-
-            input_duration = get_duration(input_file)
-            output_duration = get_duration(output_file)
-
-            # 允许1秒的误差
-            if abs(input_duration - output_duration) > 1:
-                return False
-
-            # 检查编解码器是否为H.265
-            cmd = [
-                "ffprobe",
-                "-v",
-                "error",
-                "-select_streams",
-                "v:0",
-                "-show_entries",
-                "stream=codec_name",
-                "-of",
-                "default=noprint_wrappers=1:nokey=1",
-                output_file,
-            ]
-            result = subprocess.run(
-                cmd, capture_output=True, text=True, creationflags=CREATE_NO_WINDOW
-            )
-            if result.returncode != 0 or "hevc" not in result.stdout.lower():
-                return False
+    def delete_converted(self, input_dir, files, text):
+        from convert_engine import delete_sources
 
-            return True
-        except Exception:
-            return False
-
-    def convert_single_video(self, input_file, output_dir, log_dir):
-        if self._stop_event.is_set():
-            return False, input_file
+        deleted = delete_sources(input_dir, files)
+        self.events.put({"event": "sources_deleted", "deleted": deleted, "text": text})
 
+    def drain_events(self):
+        """主线程定时取出积压的引擎事件，合并后只重绘一次"""
         try:
-            if not self.is_video_file(input_file):
-                return False, input_file
-
-            width, height, framerate = self.get_video_info(input_file)
-            bitrate, crf = self.get_adaptive_params(width, height, framerate)
-
-            base_name = os.path.splitext(os.path.basename(input_file))[0]
-            out_file = os.path.join(output_dir, base_name + "_hevc.mp4")
-            log_file = os.path.join(
-                log_dir,
-                base_name + f"_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.log",
+            for event in self.events.drain():
+                self.handle_event(event)
+            if self.status_dirty:
+                self.update_status(self.status_detail)
+        finally:
+            self.root.after(REFRESH_MS, self.drain_events)
+
+    def handle_event(self, event):
+        """在Tk主线程中处理引擎事件；状态文字由 drain_events 统一刷新"""
+        kind = event["event"]
+        if kind == "error":
+            messagebox.showerror("错误", event["message"])
+        elif kind == "batch_finished":
+            self.finish_batch(event["summary"])
+        elif kind == "backend_ready":
+            self.hw_status_label.config(text=event["text"])
+            print(self.timer.report("后台初始化完成"))
+        elif kind == "backend_waiting":
+            self.status_label.config(text="等待编码器检测完成...")
+        elif kind == "sources_deleted":
+            self.status_label.config(
+                text=f"{event['text']}\n已安全删除{event['deleted']}个源文件"
             )
-
-            os.makedirs(output_dir, exist_ok=True)
-            os.makedirs(log_dir, exist_ok=True)
-
-            # 根据显卡类型设置默认编码方式
-            if self.gpu_type == "nvidia":
-                hw_accels = ["cuda"]
-                codecs = ["hevc_nvenc"]
-            elif self.gpu_type == "amd":
-                hw_accels = ["d3d11va"]
-                codecs = ["hevc_amf"]
-            elif self.gpu_type == "intel":
-                hw_accels = ["d3d11va"]
-                codecs = ["hevc_qsv"]
+        elif kind == "watch_start":
+            self.status_detail = f"正在监视文件夹（{event['backend']}）"
+            self.status_dirty = True
+        elif kind in ("scan_done", "scan_progress", "file_queued"):
+            # 流水线模式下总数随扫描增长
+            self.total_files = event["total"]
+            self.status_dirty = True
+        elif kind == "file_skipped":
+            self.skipped_files = event["skipped"]
+            self.status_dirty = True
+        elif kind == "encoder":
+            if event["status"] == "using":
+                text = f"硬件加速: 使用 {event['hwaccel']} + {event['codec']}"
+            elif event["status"] == "fallback":
+                text = f"硬件加速: 回退到 {event['hwaccel']} + {event['codec']}"
             else:
-                hw_accels = ["vulkan"]
-                codecs = ["libx265"]
-
-            for hw_accel in hw_accels:
-                for codec in codecs:
-                    try:
-                        # 更新硬件加速状态
-                        self.root.after(
-                            0,
-                            lambda: self.hw_status_label.config(
-                                text=f"硬件加速: 尝试 {hw_accel} + {codec}"
-                            ),
-                        )
-
-                        cmd = [
-                            "ffmpeg",
-                            "-hwaccel",
-                            hw_accel,
-                            "-i",
-                            input_file,
-                            "-c:v",
-                            codec,
-                            "-rc_mode",
-                            "VBR_LATENCY",
-                            "-b:v",
-                            bitrate,
-                            "-c:a",
-                            "copy",
-                            "-f",
-                            "mp4",
-                            out_file,
-                            "-y",
-                        ]
-                        result = subprocess.run(
-                            cmd,
-                            capture_output=True,
-                            text=True,
-                            encoding="utf-8",
-                            creationflags=CREATE_NO_WINDOW,
-                        )
-                        if (
-                            result.returncode == 0
-                            and os.path.exists(out_file)
-                            and self.verify_conversion(input_file, out_file)
-                        ):
-                            # 更新成功使用的硬件加速
-                            self.root.after(
-                                0,
-                                lambda: self.hw_status_label.config(
-                                    text=f"硬件加速: 使用 {hw_accel} + {codec}"
-                                ),
-                            )
-                            return True, input_file
-                    except Exception:
-                        continue
-
-            # 所有硬件加速失败后回退到Vulkan
-            self.root.after(
-                0,
-                lambda: self.hw_status_label.config(
-                    text="硬件加速: 回退到 Vulkan + 软件编码"
-                ),
+                text = f"硬件加速: 尝试 {event['hwaccel']} + {event['codec']}"
+            self.hw_status_label.config(text=text)
+        elif kind == "breaker_tripped":
+            self.hw_status_label.config(
+                text=f"已停用 {event['encoder']}: {event['reason']}"
             )
-            cmd = [
-                "ffmpeg",
-                "-hwaccel",
-                "vulkan",
-                "-i",
-                input_file,
-                "-c:v",
-                "libx265",
-                "-crf",
-                str(crf),
-                "-preset",
-                "medium",
-                "-c:a",
-                "copy",
-                "-f",
-                "mp4",
-                out_file,
-                "-y",
-            ]
-
-            try:
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    encoding="utf-8",
-                    creationflags=CREATE_NO_WINDOW,
-                )
-                if result.returncode == 0 and os.path.exists(out_file):
-                    return True, input_file
-            except Exception as e:
-                print(f"硬件编码失败: {e}")
-
-            # 软件编码fallback
-            cmd = [
-                "ffmpeg",
-                "-hwaccel",
-                "vulkan",
-                "-i",
-                input_file,
-                "-vf",
-                "scale_vulkan",
-                "-c:v",
-                "libx265",
-                "-crf",
-                str(crf),
-                "-preset",
-                "medium",
-                "-c:a",
-                "copy",
-                "-f",
-                "mp4",
-                out_file,
-                "-y",
-            ]
-            try:
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    encoding="utf-8",
-                    creationflags=CREATE_NO_WINDOW,
-                )
-                return (result.returncode == 0 and os.path.exists(out_file)), input_file
-            except Exception as e:
-                print(f"软件编码失败: {e}")
-                return False, input_file
-        except Exception as e:
-            print(f"转换过程中出错: {e}")
-            return False, input_file
-
-    def is_video_file(self, path):
-        try:
-            if not os.path.exists(path):
-                return False
-
-            ext = os.path.splitext(path)[1].lower()
-            if ext not in VALID_EXTENSIONS:
-                return False
-
-            result = subprocess.run(
-                [
-                    "ffprobe",
-                    "-v",
-                    "error",
-                    "-show_streams",
-                    "-select_streams",
-                    "v:0",
-                    path,
-                ],
-                capture_output=True,
-                text=True,
-                creationflags=CREATE_NO_WINDOW,
+        elif kind == "progress":
+            self.progress.set(event["percent"])
+            self.status_detail = (
+                f"{event['percent']:.1f}% · {event['batch_fps']:.0f} fps · "
+                f"剩余 {format_eta(event['eta'])}"
             )
-            return result.returncode == 0 and "codec_type=video" in result.stdout
-        except Exception as e:
-            print(f"视频文件验证失败: {e}")
-            return False
-
-    def get_video_info(self, path):
-        try:
-            result = subprocess.run(
-                [
-                    "ffprobe",
-                    "-v",
-                    "error",
-                    "-select_streams",
-                    "v:0",
-                    "-show_entries",
-                    "stream=width,height,r_frame_rate",
-                    "-of",
-                    "json",
-                    path,
-                ],
-                capture_output=True,
-                text=True,
-                creationflags=CREATE_NO_WINDOW,
+            self.status_dirty = True
+        elif kind == "file_done":
+            self.done_files = event["done"]
+            self.skipped_files = event["skipped"]
+            self.progress.set(event["percent"])
+            self.status_detail = (
+                f"{event['percent']:.1f}% · 剩余 {format_eta(event['eta'])}"
             )
-            info = json.loads(result.stdout)
-            w = info["streams"][0]["width"]
-            h = info["streams"][0]["height"]
-            fr_str = info["streams"][0]["r_frame_rate"]
-            fr = eval(fr_str)
-            return w, h, fr
-        except:
-            return 1920, 1080, 30
-
-    def get_adaptive_params(self, w, h, fr):
-        if w <= 720:
-            bitrate = "800k"
-            crf = 24
-        elif w <= 1280:
-            bitrate = "1500k"
-            crf = 23
-        elif w <= 1920:
-            bitrate = "3000k"
-            crf = 22
-        elif w <= 2560:
-            bitrate = "4500k"
-            crf = 21
-        else:
-            bitrate = "6000k"
-            crf = 20
-        if fr > 30:
-            num = int(bitrate[:-1])
-            bitrate = f"{int(num * 1.2)}k"
-        return bitrate, crf
+            self.status_dirty = True
 
-    def show_error(self, msg):
-        self.root.after(0, lambda: messagebox.showerror("错误", msg))
+    def update_status(self, detail=""):
+        text = f"处理文件 {self.done_files}/{self.total_files} (跳过 {self.skipped_files})"
+        if detail:
+            text += f"\n{detail}"
+        self.status_label.config(text=text)
+        self.status_dirty = False
 
     def reset_buttons(self):
-        self.root.after(
-            0,
-            lambda: self.start_btn.config(
-                state=NORMAL if self.input_dir.get().strip() else DISABLED
-            ),
+        self.start_btn.config(
+            state=NORMAL if self.input_dir.get().strip() else DISABLED
         )
-        self.root.after(0, lambda: self.cancel_btn.config(state=DISABLED))
+        self.cancel_btn.config(state=DISABLED)
 
 
 if __name__ == "__main__":
-    root = tb.Window(title="视频批量转换器", themename="flatly")  # 初始浅色主题
-    app = VideoConverterGUI(root)
+    timer = StartupTimer()
+    timer.since_start("导入模块")
+    with timer.step("读取系统主题"):
+        theme = system_theme()  # 按系统主题创建窗口，启动后不再切换一次
+    with timer.step("创建窗口"):
+        root = tb.Window(title="视频批量转换器", themename=theme)
+    with timer.step("构建界面"):
+        app = VideoConverterGUI(root, timer)
     root.mainloop()
@@ -0,0 +1,62 @@
+import time
+import threading
+
+
+class BatchProgress:
+    """按时长加权的整批进度：汇总各文件已编码时长，估算总 fps 和剩余时间"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._durations = {}
+        self._active = {}
+        self.total_duration = 0.0
+        self.done_duration = 0.0
+        self.start_time = None
+
+    def add_file(self, path, duration):
+        with self._lock:
+            self._durations[path] = duration
+            self.total_duration += duration
+
+    def start_file(self, path):
+        """编码开始时调用，第一个文件开始的时间作为吞吐统计的起点"""
+        with self._lock:
+            if self.start_time is None:
+                self.start_time = time.monotonic()
+            self._active[path] = (0.0, 0.0)
+
+    def update(self, path, out_time, fps):
+        """记录某个文件的最新进度；回退重编码时 out_time 会从 0 重新开始"""
+        with self._lock:
+            duration = self._durations.get(path, 0.0)
+            if duration:
+                out_time = min(out_time, duration)
+            self._active[path] = (out_time, fps)
+        return self.snapshot()
+
+    def finish_file(self, path):
+        with self._lock:
+            self._active.pop(path, None)
+            self.done_duration += self._durations.get(path, 0.0)
+        return self.snapshot()
+
+    def snapshot(self):
+        with self._lock:
+            active_time = sum(t for t, _ in self._active.values())
+            processed = self.done_duration + active_time
+            total = self.total_duration
+            fps = sum(f for _, f in self._active.values())
+            elapsed = time.monotonic() - self.start_time if self.start_time else 0.0
+        percent = min(100.0, processed * 100.0 / total) if total else 0.0
+        # 用开始以来的实际吞吐(媒体秒/墙钟秒)估算，包含失败重试等开销
+        eta = None
+        if processed > 0 and elapsed > 0:
+            eta = int(max(0.0, (total - processed) * elapsed / processed))
+        return {"percent": percent, "fps": fps, "eta": eta}
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "--:--:--"
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
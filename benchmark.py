@@ -0,0 +1,275 @@
+"""编码基准测试：用 ffmpeg lavfi 生成固定的合成片段，在不同并发数、预设和
+编码器组合下走完整的转换流程，输出吞吐量、耗时、CPU 利用率和体积比
+
+示例（纯 CPU 的 Linux 机器）:
+    python benchmark.py --encoders libx265 --presets fast,medium --workers 1,2 \\
+        --json bench.json --csv bench.csv
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from convert_engine import ConversionEngine
+from encoder_caps import parse_encoder_chain
+from media_probe import CREATE_NO_WINDOW, ProbeCache
+from scheduler import PRESET_COST
+
+DEFAULT_CLIPS_DIR = os.path.join(
+    os.path.expanduser("~"), ".hevc_converter", "bench_clips"
+)
+# (名称, 宽, 高, 帧率, 时长秒)；lavfi 源是确定性的，每次生成的内容相同
+CLIPS = (
+    ("360p30", 640, 360, 30, 20),
+    ("720p30", 1280, 720, 30, 15),
+    ("1080p30", 1920, 1080, 30, 10),
+    ("1080p60", 1920, 1080, 60, 10),
+    ("2160p30", 3840, 2160, 30, 5),
+)
+QUICK_CLIPS = ("360p30", "720p30")
+CSV_FIELDS = (
+    "encoder",
+    "preset",
+    "workers",
+    "files",
+    "success",
+    "wall_time",
+    "fps",
+    "realtime",
+    "mb_per_s",
+    "cpu_util",
+    "size_ratio",
+    "verify_time",
+)
+
+
+def clip_path(clips_dir, name):
+    return os.path.join(clips_dir, f"{name}.mp4")
+
+
+def generate_clips(clips_dir, names=None):
+    """生成（或复用已有的）合成片段，返回 [(路径, 时长, 帧率)]
+
+    源片段用 ffmpeg 自带的 mpeg4/aac 编码，不依赖 libx264。
+    """
+    os.makedirs(clips_dir, exist_ok=True)
+    clips = []
+    for name, width, height, rate, seconds in CLIPS:
+        if names and name not in names:
+            continue
+        path = clip_path(clips_dir, name)
+        if not os.path.exists(path):
+            cmd = [
+                "ffmpeg",
+                "-hide_banner",
+                "-nostdin",
+                "-v",
+                "error",
+                "-f",
+                "lavfi",
+                "-i",
+                f"testsrc2=size={width}x{height}:rate={rate}",
+                "-f",
+                "lavfi",
+                "-i",
+                "sine=frequency=440:sample_rate=48000",
+                "-t",
+                str(seconds),
+                "-c:v",
+                "mpeg4",
+                "-q:v",
+                "3",
+                "-c:a",
+                "aac",
+                "-shortest",
+                path + ".tmp.mp4",
+                "-y",
+            ]
+            result = subprocess.run(
+                cmd, capture_output=True, creationflags=CREATE_NO_WINDOW
+            )
+            if result.returncode != 0:
+                raise RuntimeError(
+                    f"生成片段 {name} 失败: {result.stderr.decode(errors='replace')}"
+                )
+            os.replace(path + ".tmp.mp4", path)
+        clips.append((path, seconds, rate))
+    return clips
+
+
+class BenchmarkEngine(ConversionEngine):
+    """统计校验（含抽样质量检测）耗时的转换引擎"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.verify_time = 0.0
+
+    def verify_conversion(self, input_file, output_file):
+        started = time.monotonic()
+        try:
+            return super().verify_conversion(input_file, output_file)
+        finally:
+            with self._lock:
+                self.verify_time += time.monotonic() - started
+
+    def check_quality(self, *args, **kwargs):
+        started = time.monotonic()
+        try:
+            return super().check_quality(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.verify_time += time.monotonic() - started
+
+
+def cpu_seconds():
+    # 编码在 ffmpeg 子进程中进行，计入已结束子进程的 CPU 时间
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def run_case(clips_dir, clips, encoder, preset, workers, work_root, quality_windows):
+    """对全部片段执行一次完整的批量转换，返回一行结果"""
+    case_dir = tempfile.mkdtemp(prefix=f"{encoder}_{preset}_{workers}_", dir=work_root)
+    engine = BenchmarkEngine(
+        clips_dir,
+        output_dir=os.path.join(case_dir, "out"),
+        log_dir=os.path.join(case_dir, "logs"),
+        workers=workers,
+        encoder_chain=parse_encoder_chain(encoder),
+        probe_cache=ProbeCache(cache_file=None),
+        smart_skip=False,
+        size_guard=0,
+        quality_windows=quality_windows,
+        preset=preset,
+    )
+    cpu_start = cpu_seconds()
+    started = time.monotonic()
+    summary = engine.run()
+    wall = time.monotonic() - started
+    cpu = cpu_seconds() - cpu_start
+
+    bytes_in = sum(os.path.getsize(path) for path, _, _ in clips)
+    bytes_out = 0
+    for path in summary["converted"]:
+        out_file, _ = engine.output_paths(path)
+        if os.path.exists(out_file):
+            bytes_out += os.path.getsize(out_file)
+    frames = sum(seconds * rate for _, seconds, rate in clips)
+    media_seconds = sum(seconds for _, seconds, _ in clips)
+    shutil.rmtree(case_dir, ignore_errors=True)
+    return {
+        "encoder": encoder,
+        "preset": preset,
+        "workers": workers or "auto",
+        "files": summary["total"],
+        "success": summary["success"],
+        "wall_time": round(wall, 2),
+        "fps": round(frames / wall, 1) if wall else 0.0,
+        "realtime": round(media_seconds / wall, 2) if wall else 0.0,
+        "mb_per_s": round(bytes_in / wall / 1e6, 2) if wall else 0.0,
+        "cpu_util": round(cpu / (wall * (os.cpu_count() or 1)), 3) if wall else 0.0,
+        "size_ratio": round(bytes_out / bytes_in, 3) if bytes_in else 0.0,
+        "verify_time": round(engine.verify_time, 2),
+    }
+
+
+def parse_list(text, convert=str):
+    return [convert(item.strip()) for item in text.split(",") if item.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="HEVC 转换基准测试（合成片段）")
+    parser.add_argument(
+        "--encoders", default="libx265", help="编码方式列表，逗号分隔（默认 libx265）"
+    )
+    parser.add_argument(
+        "--presets", default="medium", help="预设列表，逗号分隔（默认 medium）"
+    )
+    parser.add_argument(
+        "--workers", default="1,0", help="并发数列表，逗号分隔，0 为自动（默认 1,0）"
+    )
+    parser.add_argument("--clips-dir", default=DEFAULT_CLIPS_DIR, help="合成片段目录")
+    parser.add_argument(
+        "--quick", action="store_true", help="只用 360p/720p 片段，快速比较"
+    )
+    parser.add_argument(
+        "--quality-samples",
+        type=int,
+        default=0,
+        metavar="N",
+        help="校验时的抽样质量检测窗口数（默认 0: 只做基本校验）",
+    )
+    parser.add_argument("--json", help="结果写入 JSON 文件（默认输出到 stdout）")
+    parser.add_argument("--csv", help="结果另写入 CSV 文件")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    presets = parse_list(args.presets)
+    for preset in presets:
+        if preset not in PRESET_COST:
+            print(f"未知预设: {preset}", file=sys.stderr)
+            return 2
+    try:
+        encoders = parse_list(args.encoders)
+        for encoder in encoders:
+            parse_encoder_chain(encoder)
+        workers_list = parse_list(args.workers, int)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    # 每组片段单独一个目录，整个目录作为批量转换的输入；输出目录在其外
+    clips_dir = os.path.join(args.clips_dir, "quick" if args.quick else "full")
+    try:
+        clips = generate_clips(clips_dir, QUICK_CLIPS if args.quick else None)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    work_root = tempfile.mkdtemp(prefix="hevc_bench_")
+    results = []
+    try:
+        for encoder in encoders:
+            for preset in presets:
+                for workers in workers_list:
+                    row = run_case(
+                        clips_dir,
+                        clips,
+                        encoder,
+                        preset,
+                        workers,
+                        work_root,
+                        args.quality_samples,
+                    )
+                    results.append(row)
+                    print(json.dumps(row, ensure_ascii=False), file=sys.stderr)
+    finally:
+        shutil.rmtree(work_root, ignore_errors=True)
+
+    report = {
+        "clips": [os.path.basename(path) for path, _, _ in clips],
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=1))
+    if args.csv:
+        with open(args.csv, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+import os
+import sys
+import subprocess
+from media_probe import CREATE_NO_WINDOW
+from stream_plan import stream_args
+
+
+def find_keyframes(path, targets, tracker=None, start_time=0.0):
+    """返回每个目标时间点之前最近的关键帧时间（秒），去重并排序
+
+    通过 -read_intervals 只读取每个目标点附近的一个包，不需要扫描整个文件。
+    ffprobe 的区间和包时间戳都是绝对 PTS，而分段编码的输入 -ss 从文件起点算起：
+    目标点加上容器的 start_time 后查询，返回的关键帧时间再减去它。
+    """
+    if not targets:
+        return []
+    intervals = ",".join(f"{t + start_time:.3f}%+#1" for t in targets)
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-read_intervals",
+        intervals,
+        "-show_entries",
+        "packet=pts_time,flags",
+        "-of",
+        "csv=p=0",
+        path,
+    ]
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            creationflags=CREATE_NO_WINDOW,
+        )
+        if tracker is not None:
+            tracker.register(proc)
+        try:
+            stdout, _ = proc.communicate()
+        finally:
+            if tracker is not None:
+                tracker.unregister(proc)
+    except Exception as e:
+        print(f"查找关键帧失败: {e}", file=sys.stderr)
+        return []
+    if proc.returncode != 0:
+        return []
+
+    keyframes = set()
+    for line in stdout.decode("utf-8", errors="replace").splitlines():
+        parts = line.strip().split(",")
+        if len(parts) < 2 or "K" not in parts[1]:
+            continue
+        try:
+            keyframes.add(round(max(0.0, float(parts[0]) - start_time), 6))
+        except ValueError:
+            continue
+    return sorted(keyframes)
+
+
+def plan_chunks(duration, keyframes, min_chunk=10.0):
+    """按关键帧切分为 [(开始, 结束)]，最后一段结束为 None（到文件末尾）"""
+    bounds = [0.0]
+    for t in keyframes:
+        if t - bounds[-1] >= min_chunk and duration - t >= min_chunk:
+            bounds.append(t)
+    chunks = [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+    chunks.append((bounds[-1], None))
+    return chunks
+
+
+def chunk_targets(duration, count):
+    return [duration * i / count for i in range(1, count)]
+
+
+def build_chunk_cmd(base_cmd, start, end):
+    """在编码命令的 -i 之前插入 -ss/-t，并去掉音频、字幕和数据流，只编码视频片段"""
+    idx = base_cmd.index("-i")
+    seek = ["-ss", f"{start:.6f}"]
+    if end is not None:
+        seek += ["-t", f"{end - start:.6f}"]
+    cmd = base_cmd[:idx] + seek + base_cmd[idx:]
+    # 音频在合并时从源文件直接复制
+    a_idx = cmd.index("-c:a")
+    cmd[a_idx : a_idx + 2] = ["-an", "-sn", "-dn"]
+    return cmd
+
+
+def write_concat_list(list_file, chunk_files):
+    with open(list_file, "w", encoding="utf-8") as f:
+        for chunk_file in chunk_files:
+            escaped = os.path.abspath(chunk_file).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+
+def build_concat_cmd(list_file, input_file, out_file, streams=None):
+    """用 concat demuxer 拼接视频片段，音频从源文件复制，不重新编码
+
+    streams 为 stream_plan.plan_streams() 的结果时，音频和字幕按流计划映射和转码。
+    """
+    cmd = ["ffmpeg", "-f", "concat", "-safe", "0", "-i", list_file, "-i", input_file]
+    cmd += ["-map", "0:v:0"]
+    if streams is None:
+        cmd += ["-map", "1:a?", "-c", "copy"]
+    else:
+        cmd += ["-c", "copy"] + stream_args(streams, input_index=1, video=False)
+    return cmd + ["-f", "mp4", out_file, "-y"]
@@ -0,0 +1,92 @@
+import os
+import re
+import threading
+
+# 与源文件本身有关的错误：换编码器也不会好，不计入熔断
+INPUT_ERROR_PATTERNS = (
+    "invalid data found when processing input",
+    "moov atom not found",
+    "error while decoding",
+    "corrupt",
+    "could not find codec parameters",
+    "no such file or directory",
+    "end of file",
+)
+# 编码路径本身不可用：驱动、设备、编码器或滤镜问题
+ENCODER_ERROR_PATTERNS = (
+    "cannot load",
+    "no nvenc capable devices",
+    "openencodesessionex failed",
+    "no device available",
+    "device creation failed",
+    "failed to initialise",
+    "failed to initialize",
+    "hardware device",
+    "hwaccel",
+    "unknown encoder",
+    "no such filter",
+    "error initializing output stream",
+    "error while opening encoder",
+    "driver",
+    "not supported",
+)
+
+
+def classify_failure(tail, input_file=None):
+    """根据 ffmpeg stderr 末尾判断失败原因，返回 (类别, 原因签名)
+
+    类别为 "input"（源文件问题）、"encoder"（编码路径问题）或 "unknown"。
+    原因签名去掉了数字和文件名，用于判断连续失败是否出于同一原因。
+    """
+    lines = [line.strip() for line in tail if line.strip()]
+    text = "\n".join(lines).lower()
+    for pattern in INPUT_ERROR_PATTERNS:
+        if pattern in text:
+            return "input", pattern
+    for pattern in ENCODER_ERROR_PATTERNS:
+        if pattern in text:
+            return "encoder", pattern
+    last = lines[-1] if lines else "exit without message"
+    if input_file:
+        last = last.replace(input_file, "<input>")
+        last = last.replace(os.path.basename(input_file), "<input>")
+    return "unknown", re.sub(r"0x[0-9a-f]+|\d+", "#", last.lower())[:120]
+
+
+class EncoderCircuitBreaker:
+    """会话级编码路径熔断
+
+    某个编码尝试因同一原因连续失败 threshold 次后标记为不可用，
+    之后的任务直接跳过它。源文件本身导致的失败不计数，成功一次即清零。
+    """
+
+    def __init__(self, threshold=3):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._streaks = {}
+        self.tripped = {}
+
+    def is_open(self, name):
+        with self._lock:
+            return name in self.tripped
+
+    def record_success(self, name):
+        with self._lock:
+            self._streaks.pop(name, None)
+
+    def record_failure(self, name, tail, input_file=None):
+        """记录一次失败；本次导致熔断时返回原因说明，否则返回 None"""
+        category, signature = classify_failure(tail, input_file)
+        if category == "input":
+            return None
+        with self._lock:
+            if name in self.tripped:
+                return None
+            last_signature, count = self._streaks.get(name, (None, 0))
+            count = count + 1 if signature == last_signature else 1
+            self._streaks[name] = (signature, count)
+            if count < self.threshold:
+                return None
+            reason = f"连续 {count} 次失败: {signature}"
+            self.tripped[name] = reason
+            return reason
@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import time
+import threading
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+class ConversionManifest:
+    """转换清单：JSON lines 追加写入，每个源文件以最后一条记录为准
+
+    记录源文件的大小/修改时间、使用的编码器、输出路径及校验状态，
+    用于断点续转时跳过已完成且未变化的文件。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records = {}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # 崩溃时可能留下不完整的最后一行
+                    self._records[record["source"]] = record
+        except Exception as e:
+            print(f"读取转换清单失败: {e}", file=sys.stderr)
+
+    def get(self, source):
+        with self._lock:
+            return self._records.get(os.path.abspath(source))
+
+    def record(self, source, status, output=None, encoder=None, verified=False, **extra):
+        try:
+            st = os.stat(source)
+            size, mtime = st.st_size, st.st_mtime_ns
+        except OSError:
+            size, mtime = None, None
+        output_size = None
+        if output and os.path.exists(output):
+            output_size = os.path.getsize(output)
+        record = {
+            "source": os.path.abspath(source),
+            "size": size,
+            "mtime": mtime,
+            "status": status,
+            "encoder": encoder,
+            "output": os.path.abspath(output) if output else None,
+            "output_size": output_size,
+            "verified": bool(verified),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        record.update(extra)
+        with self._lock:
+            self._records[record["source"]] = record
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except Exception as e:
+                print(f"写入转换清单失败: {e}", file=sys.stderr)
+        return record
+
+    def is_done(self, source, size=None, mtime=None):
+        """源文件未变化，且已有通过校验的输出或已判定无需转换时返回 True"""
+        record = self.get(source)
+        if not record:
+            return False
+        # skipped: 已是 HEVC/MP4；kept: 编码后没有明显变小，保留了源文件
+        no_output = record["status"] in ("skipped", "kept")
+        if not no_output and (record["status"] != "done" or not record["verified"]):
+            return False
+        if size is None or mtime is None:
+            try:
+                st = os.stat(source)
+            except OSError:
+                return False
+            size, mtime = st.st_size, st.st_mtime_ns
+        if record["size"] != size or record["mtime"] != mtime:
+            return False
+        if no_output:
+            return True
+        output = record.get("output")
+        try:
+            return bool(output) and os.path.getsize(output) == record["output_size"]
+        except OSError:
+            return False
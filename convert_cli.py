@@ -0,0 +1,315 @@
+"""命令行入口：不依赖 Tk，适合在无显示环境(cron/systemd)中批量转换
+
+示例:
+    python convert_cli.py /data/videos -o /data/hevc -j 4 --encoders libx265
+
+进度以 JSON lines 形式输出到 stdout，每行一个事件。
+"""
+
+import sys
+import json
+import signal
+import argparse
+from scheduler import ORDERINGS, PRESET_COST
+from convert_engine import ConversionEngine, delete_sources
+from encoder_caps import ENCODER_ATTEMPTS, EncoderCapabilities, parse_encoder_chain
+from circuit_breaker import EncoderCircuitBreaker
+from encode_decision import SIZE_GUARD
+from quality_check import SAMPLE_WINDOWS, DEFAULT_FLOORS, QUALITY_ACTIONS
+from crf_search import DEFAULT_TARGETS
+from stream_plan import AUDIO_CODEC_CHOICES
+from renditions import parse_renditions
+from watch_folder import SETTLE_SECONDS
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="批量将视频转换为 H.265/HEVC MP4")
+    parser.add_argument("input_dir", nargs="?", help="视频文件夹")
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        help="输出根目录，可在另一块磁盘上，其下镜像源目录结构（默认: <input_dir>/Converted）",
+    )
+    parser.add_argument("--log-dir", help="日志目录（默认: <input_dir>/Logs）")
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=0,
+        help="并行任务数（默认 0: 按核数、内存和分辨率自动调度）",
+    )
+    parser.add_argument(
+        "--device-jobs",
+        type=int,
+        default=0,
+        metavar="N",
+        help="同一磁盘/NAS 上同时读写的任务数上限（默认 0: 不限）",
+    )
+    parser.add_argument(
+        "--device-limit",
+        action="append",
+        default=[],
+        metavar="PATH=N",
+        help="单独限制 PATH 所在设备的任务数，可重复指定",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="边扫描边转换：探测完成的文件立即进入编码队列",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="常驻监视输入目录，新文件写完后立即转换（Ctrl+C 停止监视并转换完已排队的文件，"
+        "再按一次立即取消）",
+    )
+    parser.add_argument(
+        "--watch-settle",
+        type=float,
+        default=SETTLE_SECONDS,
+        metavar="SECONDS",
+        help="文件大小保持不变多少秒后认为已写完（默认 %(default)s）",
+    )
+    parser.add_argument(
+        "--probe-workers", type=int, default=8, help="--stream 模式下的并行探测数"
+    )
+    parser.add_argument(
+        "--ordering",
+        choices=ORDERINGS,
+        default="lpt",
+        help="任务顺序：lpt 最长优先(整批最快)，spt 最短优先(尽早出结果)，size 按文件大小",
+    )
+    parser.add_argument(
+        "--simulate",
+        action="store_true",
+        help="只扫描探测，不编码，输出各调度策略的模拟整批耗时",
+    )
+    parser.add_argument(
+        "--chunk-min-duration",
+        type=float,
+        default=0,
+        metavar="SECONDS",
+        help="时长不少于该秒数的文件按关键帧分段并行编码后无损拼接（默认 0: 关闭）",
+    )
+    parser.add_argument(
+        "--chunks", type=int, default=0, help="分段数（默认按核数和分辨率决定）"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="断点续转：跳过清单中已校验且源文件未变化的文件",
+    )
+    parser.add_argument(
+        "--manifest", help="转换清单路径（默认: <output_dir>/manifest.jsonl）"
+    )
+    parser.add_argument(
+        "--force-encode",
+        action="store_true",
+        help="总是重新编码，不跳过或转封装已是 HEVC 的文件",
+    )
+    parser.add_argument(
+        "--size-guard",
+        type=float,
+        default=SIZE_GUARD,
+        metavar="RATIO",
+        help="输出不小于源文件 × RATIO 时放弃编码结果（默认 %(default)s，0 为关闭）",
+    )
+    parser.add_argument(
+        "--quality-samples",
+        type=int,
+        default=SAMPLE_WINDOWS,
+        metavar="N",
+        help="在 N 个抽样片段上检测 SSIM/VMAF（默认 %(default)s，0 为关闭）",
+    )
+    parser.add_argument(
+        "--quality-metric",
+        choices=("auto", "ssim", "vmaf"),
+        default="auto",
+        help="质量指标（默认 auto: ffmpeg 支持 libvmaf 时用 VMAF，否则 SSIM）",
+    )
+    parser.add_argument(
+        "--quality-floor",
+        type=float,
+        help="质量下限（默认 SSIM %s / VMAF %s）"
+        % (DEFAULT_FLOORS["ssim"], DEFAULT_FLOORS["vmaf"]),
+    )
+    parser.add_argument(
+        "--quality-action",
+        choices=QUALITY_ACTIONS,
+        default="flag",
+        help="低于质量下限时: flag 仅在清单中标记，reencode 提高码率重新编码一次",
+    )
+    parser.add_argument(
+        "--crf-search",
+        action="store_true",
+        help="编码前在抽样片段上并行试编码候选 CRF，按目标选择码率（结果按源文件缓存）",
+    )
+    parser.add_argument(
+        "--crf-target-quality",
+        type=float,
+        help="CRF 搜索的目标质量（默认 SSIM %s / VMAF %s）"
+        % (DEFAULT_TARGETS["ssim"], DEFAULT_TARGETS["vmaf"]),
+    )
+    parser.add_argument(
+        "--crf-target-size",
+        type=float,
+        metavar="RATIO",
+        help="改为按体积比搜索：选输出不超过源文件 × RATIO 的最好质量",
+    )
+    parser.add_argument(
+        "--preset",
+        choices=list(PRESET_COST),
+        default="medium",
+        help="libx265 等 CRF 模式编码器的预设（默认 %(default)s）",
+    )
+    parser.add_argument(
+        "--audio-codec",
+        choices=AUDIO_CODEC_CHOICES,
+        default="aac",
+        help="MP4 不支持的音频(WMA、PCM 等)转码为该格式（默认 %(default)s）",
+    )
+    parser.add_argument(
+        "--renditions",
+        default="",
+        metavar="LIST",
+        help="与全分辨率输出一起生成的附加输出，逗号分隔，如 720p,thumbs"
+        "（同一次解码，分别校验并写入清单）",
+    )
+    parser.add_argument(
+        "--encoders",
+        help="编码尝试顺序，逗号分隔（可选: %s；默认按实测的编码器能力选择）"
+        % ", ".join(sorted(ENCODER_ATTEMPTS)),
+    )
+    parser.add_argument(
+        "--breaker-threshold",
+        type=int,
+        default=3,
+        help="同一编码方式因同一原因连续失败多少次后，本次运行不再尝试",
+    )
+    parser.add_argument(
+        "--probe-encoders",
+        action="store_true",
+        help="重新试编码检测编码器能力（忽略缓存），输出结果后退出",
+    )
+    parser.add_argument(
+        "--metrics-textfile",
+        metavar="PATH",
+        help="另把批次指标写为 Prometheus textfile（如 /var/lib/node_exporter/hevc.prom）",
+    )
+    parser.add_argument(
+        "--delete-sources",
+        action="store_true",
+        help="全部成功后删除源文件（仅限输入目录的子文件夹）",
+    )
+    return parser.parse_args(argv)
+
+
+def parse_device_limits(items):
+    """把 ["PATH=N", ...] 解析为 {PATH: N}"""
+    limits = {}
+    for item in items:
+        path, sep, value = item.rpartition("=")
+        if not sep or not path or not value.isdigit():
+            raise ValueError(f"无效的设备限制: {item}（格式 PATH=N）")
+        limits[path] = int(value)
+    return limits
+
+
+def print_event(event):
+    sys.stdout.write(json.dumps(event, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    capabilities = EncoderCapabilities()
+    if args.probe_encoders:
+        caps = capabilities.load(refresh=True)
+        print_event({"event": "encoder_caps", "encoders": caps})
+        return 0
+    if not args.input_dir:
+        print("缺少视频文件夹参数", file=sys.stderr)
+        return 2
+    try:
+        device_limits = parse_device_limits(args.device_limit)
+        renditions = parse_renditions(args.renditions)
+        if args.encoders:
+            encoder_chain = parse_encoder_chain(args.encoders)
+        else:
+            encoder_chain = capabilities.build_chain()
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    engine = ConversionEngine(
+        args.input_dir,
+        output_dir=args.output_dir,
+        log_dir=args.log_dir,
+        workers=args.workers,
+        encoder_chain=encoder_chain,
+        on_event=print_event,
+        stream=args.stream,
+        probe_workers=args.probe_workers,
+        resume=args.resume,
+        manifest_path=args.manifest,
+        ordering=args.ordering,
+        breaker=EncoderCircuitBreaker(threshold=args.breaker_threshold),
+        chunk_min_duration=args.chunk_min_duration,
+        chunks=args.chunks,
+        smart_skip=not args.force_encode,
+        size_guard=args.size_guard,
+        quality_windows=args.quality_samples,
+        quality_metric=None if args.quality_metric == "auto" else args.quality_metric,
+        quality_floor=args.quality_floor,
+        quality_action=args.quality_action,
+        crf_search=args.crf_search,
+        crf_target_quality=args.crf_target_quality,
+        crf_target_size=args.crf_target_size,
+        preset=args.preset,
+        metrics_textfile=args.metrics_textfile,
+        audio_codec=args.audio_codec,
+        watch=args.watch,
+        watch_settle=args.watch_settle,
+        device_jobs=args.device_jobs,
+        device_limits=device_limits,
+        renditions=renditions,
+    )
+
+    if args.simulate:
+        print_event(dict(event="simulation", **engine.simulate()))
+        return 0
+
+    stopping = []
+
+    def handle_signal(signum, frame):
+        # 监视模式下第一次只停止监视，已排队的文件照常转换
+        if args.watch and not stopping:
+            stopping.append(signum)
+            engine.stop_watch()
+            return
+        engine.cancel()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    summary = engine.run()
+
+    if (
+        args.delete_sources
+        and not summary["cancelled"]
+        and summary["success"] > 0
+        and not summary["failed"]
+    ):
+        deleted = delete_sources(engine.input_dir, summary["converted"])
+        print_event({"event": "sources_deleted", "deleted": deleted})
+
+    if summary["cancelled"]:
+        return 130
+    # 全部文件都已转换、被跳过时不算失败；输入中没有任何视频文件时返回 1
+    if summary["failed"] or (summary["total"] == 0 and not summary["skipped"]):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
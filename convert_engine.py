@@ -0,0 +1,1693 @@
+import os
+import sys
+import queue
+import shutil
+import subprocess
+import time
+import datetime
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from batch_progress import BatchProgress
+from ffmpeg_runner import run_ffmpeg
+from process_tracker import ProcessTracker
+from scheduler import (
+    ORDERINGS,
+    DeviceLimiter,
+    ResourceScheduler,
+    ScanJob,
+    job_cost,
+    estimate_cost,
+    order_jobs,
+    simulate_makespan,
+)
+from encoder_caps import ENCODER_ATTEMPTS, EncoderCapabilities, video_encode_args
+from circuit_breaker import EncoderCircuitBreaker
+from chunked import (
+    find_keyframes,
+    plan_chunks,
+    chunk_targets,
+    build_chunk_cmd,
+    write_concat_list,
+    build_concat_cmd,
+)
+from quality_check import (
+    SAMPLE_WINDOWS,
+    DEFAULT_FLOORS,
+    measure_quality,
+    quality_metric,
+    boost_params,
+)
+from crf_search import CrfSearchCache, search_crf
+from job_metrics import BatchMetrics, METRICS_NAME
+from conversion_manifest import ConversionManifest, MANIFEST_NAME
+from encode_decision import (
+    SIZE_GUARD,
+    SKIP,
+    REMUX,
+    ENCODE,
+    KEPT,
+    decide_action,
+    video_bitrate,
+    build_remux_cmd,
+    is_meaningfully_smaller,
+)
+from media_probe import (
+    ProbeCache,
+    run_ffprobe,
+    is_valid_video,
+    get_dimensions,
+    get_duration,
+    get_start_time,
+    get_video_codec,
+)
+from stream_plan import plan_streams, stream_args
+from renditions import build_rendition_cmd, rendition_file, scaled_size
+from watch_folder import FolderWatcher, SETTLE_SECONDS
+
+VALID_EXTENSIONS = {".mp4", ".mkv", ".avi", ".mov", ".wmv", ".flv", ".ts", ".webm"}
+
+ERROR_TAIL_LINES = 20  # 失败尝试保留的 stderr 末尾行数
+
+
+def get_adaptive_params(w, h, fr):
+    if w <= 720:
+        bitrate = "800k"
+        crf = 24
+    elif w <= 1280:
+        bitrate = "1500k"
+        crf = 23
+    elif w <= 1920:
+        bitrate = "3000k"
+        crf = 22
+    elif w <= 2560:
+        bitrate = "4500k"
+        crf = 21
+    else:
+        bitrate = "6000k"
+        crf = 20
+    if fr > 30:
+        num = int(bitrate[:-1])
+        bitrate = f"{int(num * 1.2)}k"
+    return bitrate, crf
+
+
+def build_ffmpeg_cmd(
+    attempt,
+    input_file,
+    out_file,
+    bitrate,
+    crf,
+    threads=None,
+    preset="medium",
+    streams=None,
+):
+    cmd = ["ffmpeg"]
+    if attempt.get("hwaccel"):
+        cmd += ["-hwaccel", attempt["hwaccel"]]
+    if threads:
+        cmd += ["-threads", str(threads)]  # 解码线程
+    cmd += ["-i", input_file]
+    if attempt.get("vf"):
+        cmd += ["-vf", attempt["vf"]]
+    cmd += video_encode_args(attempt, bitrate, crf, threads, preset)
+    # streams 为流计划时逐流映射；None 时保持原来的 -c:a copy
+    cmd += stream_args(streams)
+    cmd += ["-f", "mp4", out_file, "-y"]
+    return cmd
+
+
+def iter_video_candidates(root_dir, exclude_dirs=()):
+    """用 os.scandir 递归枚举扩展名有效的文件，边遍历边产出 (路径, 大小)"""
+    exclude = {os.path.normcase(os.path.abspath(d)) for d in exclude_dirs}
+    stack = [root_dir]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = list(it)
+        except OSError as e:
+            print(f"读取目录失败: {e}", file=sys.stderr)
+            continue
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if os.path.normcase(os.path.abspath(entry.path)) not in exclude:
+                        subdirs.append(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in VALID_EXTENSIONS:
+                    yield entry.path, entry.stat().st_size
+            except OSError as e:
+                print(f"获取文件信息失败: {e}", file=sys.stderr)
+        # 保持目录的自然顺序
+        stack.extend(reversed(subdirs))
+
+
+def write_log(log, text):
+    log.write((text + "\n").encode("utf-8"))
+    log.flush()
+
+
+def delete_sources(input_dir, files):
+    """安全删除源文件：只删除输入目录子文件夹中的文件，返回删除数量"""
+    deleted = 0
+    input_dir = os.path.normpath(input_dir)
+    for input_file in files:
+        try:
+            if not os.path.exists(input_file):
+                continue
+            # 安全检查：确保文件在输入目录下
+            file_path = os.path.normpath(input_file)
+            common_path = os.path.commonpath([input_dir, file_path])
+            if (
+                common_path == input_dir
+                and file_path != input_dir
+                and os.path.dirname(file_path) != input_dir
+            ):
+                os.remove(input_file)
+                deleted += 1
+        except Exception as e:
+            print(f"删除文件失败: {e}", file=sys.stderr)
+    return deleted
+
+
+class ConversionEngine:
+    """无界面的批量转换引擎：扫描、探测、编码、校验
+
+    进度通过 on_event 回调以字典形式发出，例如
+    {"event": "file_done", "file": ..., "ok": True, "done": 3, "total": 10}。
+    回调在工作线程中调用，界面端需要自行切回主线程。
+    """
+
+    def __init__(
+        self,
+        input_dir,
+        output_dir=None,
+        log_dir=None,
+        workers=0,
+        encoder_chain=None,
+        probe_cache=None,
+        on_event=None,
+        stream=False,
+        probe_workers=8,
+        resume=False,
+        manifest_path=None,
+        ordering="lpt",
+        breaker=None,
+        chunk_min_duration=0,
+        chunks=0,
+        smart_skip=True,
+        size_guard=SIZE_GUARD,
+        quality_windows=SAMPLE_WINDOWS,
+        quality_metric=None,
+        quality_floor=None,
+        quality_action="flag",
+        crf_search=False,
+        crf_target_quality=None,
+        crf_target_size=None,
+        crf_cache=None,
+        preset="medium",
+        metrics_textfile=None,
+        audio_codec="aac",
+        watch=False,
+        watch_settle=SETTLE_SECONDS,
+        device_jobs=0,
+        device_limits=None,
+        renditions=(),
+    ):
+        self.input_dir = os.path.normpath(input_dir)
+        # 输出根目录可以在另一块磁盘上，其下按源文件的相对路径镜像目录结构
+        self.output_dir = os.path.normpath(
+            output_dir or os.path.join(self.input_dir, "Converted")
+        )
+        self.log_dir = os.path.normpath(log_dir or os.path.join(self.input_dir, "Logs"))
+        # workers 为 0/None 时按核数、内存和分辨率自动决定并发数
+        self.scheduler = ResourceScheduler(max_jobs=workers or None)
+        self.workers = self.scheduler.max_jobs
+        # 同一设备上同时进行的任务数上限（源文件和输出目录所在设备分别计数）
+        self.devices = DeviceLimiter(device_jobs, device_limits)
+        # 非流水线模式下的任务顺序，见 scheduler.ORDERINGS
+        self.ordering = ordering
+        # CRF 模式编码器(libx265)的预设
+        self.preset = preset
+        # MP4 不支持的音频转码为 aac 或 opus，见 stream_plan
+        self.audio_codec = audio_codec
+        # 附加输出（缩小分辨率的 HEVC 代理、缩略图条），与主输出共用一次解码，
+        # 见 renditions.parse_renditions
+        self.renditions = list(renditions or ())
+        # 未指定编码链时按实测的编码器能力生成
+        self.encoder_chain = encoder_chain or EncoderCapabilities().build_chain()
+        # 熔断器可由调用方传入，在多次批量转换之间共享
+        self.breaker = breaker or EncoderCircuitBreaker()
+        # 时长超过 chunk_min_duration 秒(0 为关闭)的文件按关键帧分段并行编码
+        self.chunk_min_duration = chunk_min_duration
+        self.chunks = chunks
+        # 已是 HEVC 且码率合理的文件跳过或转封装，不重新编码
+        self.smart_skip = smart_skip
+        # 编码结果不小于源文件 × size_guard 时放弃编码结果(0 为关闭)
+        self.size_guard = size_guard
+        # 在 quality_windows 个抽样窗口上计算 SSIM/VMAF(0 为关闭)，
+        # 低于 quality_floor 时标记(flag)或提高码率重新编码一次(reencode)
+        self.quality_windows = quality_windows
+        self.quality_metric = quality_metric
+        self.quality_floor = quality_floor
+        self.quality_action = quality_action
+        # 编码前在抽样片段上试编码候选 CRF，按目标质量或体积比选择码率
+        self.crf_search = crf_search
+        self.crf_target_quality = crf_target_quality
+        self.crf_target_size = crf_target_size
+        self.crf_cache = crf_cache or (CrfSearchCache() if crf_search else None)
+        self.probe_cache = probe_cache or ProbeCache()
+        self.on_event = on_event
+        # stream=True 时边扫描边编码，不等待全部探测完成
+        self.stream = stream
+        self.probe_workers = max(1, int(probe_workers))
+        # watch=True 时常驻监视输入目录，新文件停止增长后直接交给编码线程；
+        # 监视模式总是跳过清单中已完成的文件
+        self.watch = watch
+        self.watch_settle = watch_settle
+        self._watcher = None
+        # 清单总是写入；resume=True 时跳过已完成且源文件未变化的文件
+        self.resume = resume or watch
+        self.manifest = ConversionManifest(
+            manifest_path or os.path.join(self.output_dir, MANIFEST_NAME)
+        )
+        self.skipped_files = 0
+        self.total_files = 0
+        # 每个文件的分阶段计时写入 <log_dir>/metrics.jsonl；
+        # metrics_textfile 不为 None 时另写 Prometheus textfile
+        self.metrics_textfile = metrics_textfile
+        self.metrics = BatchMetrics()
+        self.processes = ProcessTracker()
+        # 批量模式下已提交、尚未完成的任务，最多约 2 × workers 个
+        self._futures = set()
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._stop_event.is_set()
+
+    def cancel(self):
+        """立即取消：结束正在运行的 ffmpeg/ffprobe，丢弃尚未开始的任务"""
+        self._stop_event.set()
+        self.stop_watch()
+        self.processes.kill_all()
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+
+    def stop_watch(self):
+        """停止监视：不再接收新文件，已排队的文件照常转换完"""
+        watcher = self._watcher
+        if watcher is not None:
+            watcher.stop()
+
+    def emit(self, event, **data):
+        if self.on_event is None:
+            return
+        try:
+            self.on_event(dict(event=event, **data))
+        except Exception as e:
+            print(f"事件回调出错: {e}", file=sys.stderr)
+
+    def iter_candidates(self):
+        # 跳过输出和日志目录，避免把转换结果再次加入队列
+        return iter_video_candidates(
+            self.input_dir, exclude_dirs=(self.output_dir, self.log_dir)
+        )
+
+    def should_skip(self, path):
+        """续转模式下已完成的文件直接跳过，不再探测"""
+        if not self.resume or not self.manifest.is_done(path):
+            return False
+        with self._lock:
+            self.skipped_files += 1
+            skipped = self.skipped_files
+        self.emit("file_skipped", file=path, skipped=skipped)
+        return True
+
+    def plan_action(self, path):
+        """按探测信息决定 skip / remux / encode，返回 (动作, 原因)"""
+        if not self.smart_skip:
+            return ENCODE, "已关闭智能跳过"
+        info = self.probe(path)
+        width, height, framerate = get_dimensions(info)
+        bitrate, _ = get_adaptive_params(width, height, framerate)
+        return decide_action(info, path, bitrate)
+
+    def skip_unneeded(self, path):
+        """已是 HEVC/MP4 且码率合理的文件记入清单后跳过，不计入待转换总数"""
+        action, reason = self.plan_action(path)
+        if action != SKIP:
+            return False
+        self.manifest.record(path, "skipped", reason=reason)
+        self.metrics.finish(path, "skipped")
+        with self._lock:
+            self.skipped_files += 1
+            skipped = self.skipped_files
+        self.emit("file_skipped", file=path, skipped=skipped, reason=reason)
+        return True
+
+    def scan(self):
+        """收集输入目录下的有效视频文件，按调度策略排序后返回路径列表"""
+        return [job.path for job in self.scan_jobs()]
+
+    def scan_jobs(self):
+        """同 scan()，但返回带时长和工作量的 ScanJob 列表，避免之后再次查询探测缓存"""
+        jobs = []
+        for path, size in self.iter_candidates():
+            if self.should_skip(path):
+                continue
+            # 探测用时只记在 ScanJob 上，扫描时不为每个文件建立完整的指标记录
+            with self.metrics.scanning(path) as probe:
+                if not self.is_video_file(path) or self.skip_unneeded(path):
+                    continue
+                job = self.scan_job(path, size)
+            job.probe = probe
+            job.queued = time.time()
+            jobs.append(job)
+
+        self.probe_cache.save()
+        return order_jobs(jobs, self.ordering)
+
+    def scan_job(self, path, size):
+        duration = self.get_duration(path)
+        return ScanJob(path, size, self.job_cost(path, duration), duration)
+
+    def job_cost(self, path, duration=None):
+        """按时长 × 分辨率 × 帧率 × 首选编码器估算编码工作量"""
+        width, height, framerate = self.get_video_info(path)
+        codec = self.encoder_chain[0]["codec"] if self.encoder_chain else "libx265"
+        if duration is None:
+            duration = self.get_duration(path)
+        return estimate_cost(duration, width, height, framerate, codec, self.preset)
+
+    def simulate(self):
+        """不编码，只扫描并模拟各调度策略下的整批耗时（工作量单位）"""
+        jobs = [
+            self.scan_job(path, size)
+            for path, size in self.iter_candidates()
+            if self.is_video_file(path)
+        ]
+        self.probe_cache.save()
+        costs = [job.cost for job in jobs]
+        total = sum(costs)
+        results = {
+            "files": len(jobs),
+            "workers": self.workers,
+            "total_cost": round(total, 1),
+            "lower_bound": round(max([total / self.workers] + costs), 1),
+        }
+        for ordering in ORDERINGS:
+            order = order_jobs(jobs, ordering)
+            results[ordering] = round(
+                simulate_makespan([job.cost for job in order], self.workers), 1
+            )
+        return results
+
+    def run(self):
+        """执行整批转换，返回汇总字典"""
+        summary = {
+            "input_dir": self.input_dir,
+            "output_dir": self.output_dir,
+            "total": 0,
+            "success": 0,
+            "failed": [],
+            "skipped": 0,
+            "converted": [],
+            "kept": [],
+            "cancelled": False,
+        }
+        if not os.path.exists(self.input_dir):
+            self.emit("error", message="路径不存在")
+            return summary
+
+        self.total_files = 0
+        self.skipped_files = 0
+        self.progress = BatchProgress()
+        self.metrics = BatchMetrics(
+            os.path.join(self.log_dir, METRICS_NAME), self.metrics_textfile
+        )
+        self.emit(
+            "encoder_chain", encoders=[attempt["name"] for attempt in self.encoder_chain]
+        )
+        self.emit("scan_start", input_dir=self.input_dir)
+        if self.watch:
+            self._run_watch(summary)
+        elif self.stream:
+            self._run_pipelined(summary)
+        else:
+            self._run_batch(summary)
+
+        self.probe_cache.save()
+        summary["total"] = self.total_files
+        summary["skipped"] = self.skipped_files
+        if self.total_files == 0:
+            if self.skipped_files:
+                self.emit(
+                    "error", message=f"{self.skipped_files} 个文件均已转换，无需处理"
+                )
+            else:
+                self.emit("error", message="未找到有效视频文件")
+            return summary
+
+        summary["cancelled"] = self._stop_event.is_set()
+        self.metrics.write_summary(summary["cancelled"])
+        self.emit(
+            "batch_done",
+            total=summary["total"],
+            success=summary["success"],
+            failed=len(summary["failed"]),
+            skipped=summary["skipped"],
+            kept=len(summary["kept"]),
+            cancelled=summary["cancelled"],
+        )
+        return summary
+
+    def _run_batch(self, summary):
+        """先完整扫描并按工作量排序，再分批提交任务
+
+        同时在途的任务不超过 2 × workers 个，完成一个再补交一个；
+        已提交的记录随即出队释放，文件再多内存占用也基本不变。
+        """
+        pending = deque(self.scan_jobs())  # 已按调度策略排序
+        self.total_files = len(pending)
+        if self.total_files == 0:
+            return
+        for job in pending:
+            self.progress.add_file(job.path, job.duration)
+        self.metrics.scan_done()
+        self.emit("scan_done", total=self.total_files)
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        os.makedirs(self.log_dir, exist_ok=True)
+
+        window = self.workers * 2
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            in_flight = set()
+            while pending or in_flight:
+                while pending and len(in_flight) < window:
+                    if self._stop_event.is_set():
+                        pending.clear()
+                        break
+                    job = pending.popleft()
+                    self.metrics.enqueue(job.path, job.probe, job.queued)
+                    in_flight.add(executor.submit(self.convert_single_video, job.path))
+                with self._lock:
+                    self._futures = set(in_flight)
+                if not in_flight:
+                    break
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.cancelled() or self._stop_event.is_set():
+                        continue  # 取消后不再记录结果
+                    try:
+                        result, input_file = future.result()
+                    except Exception as e:
+                        result, input_file = False, f"Error processing file: {str(e)}"
+                    self._record_result(summary, result, input_file)
+            with self._lock:
+                self._futures = set()
+
+    def _run_pipelined(self, summary):
+        """扫描 -> 并行探测 -> 有界队列 -> 编码线程，第一个文件探测完成即开始编码"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        os.makedirs(self.log_dir, exist_ok=True)
+
+        # 队列有界：编码跟不上时反压探测，探测也不会无限超前
+        job_queue = queue.Queue(maxsize=self.workers * 2)
+        probe_slots = threading.BoundedSemaphore(self.probe_workers * 2)
+
+        def probe_and_enqueue(path):
+            try:
+                with self.metrics.scanning(path) as probe:
+                    if self._stop_event.is_set() or not self.is_video_file(path):
+                        return
+                    if self.skip_unneeded(path):
+                        return
+                    self.progress.add_file(path, self.get_duration(path))
+                with self._lock:
+                    self.total_files += 1
+                    total = self.total_files
+                self.emit("scan_progress", total=total)
+                self.metrics.enqueue(path, probe)
+                job_queue.put(path)
+            finally:
+                probe_slots.release()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for _ in range(self.workers):
+                executor.submit(self._encode_worker, job_queue, summary)
+            try:
+                with ThreadPoolExecutor(max_workers=self.probe_workers) as probe_pool:
+                    for path, _ in self.iter_candidates():
+                        if self._stop_event.is_set():
+                            break
+                        if self.should_skip(path):
+                            continue
+                        probe_slots.acquire()
+                        probe_pool.submit(probe_and_enqueue, path)
+                self.metrics.scan_done()
+                self.emit("scan_done", total=self.total_files)
+            finally:
+                for _ in range(self.workers):
+                    job_queue.put(None)
+
+    def _run_watch(self, summary):
+        """监视输入目录：已有文件和之后写完的新文件逐个探测后进入同一个编码队列
+
+        不重新遍历目录树，文件落地到输出完成的延迟只有稳定检测和编码时间。
+        stop_watch() 后把已排队的文件转换完再返回，cancel() 立即结束。
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        os.makedirs(self.log_dir, exist_ok=True)
+        job_queue = queue.Queue(maxsize=self.workers * 2)
+        active = set()  # 已排队或正在转换的文件，重复的变化通知直接忽略
+
+        def on_ready(path):
+            if self._stop_event.is_set():
+                return
+            with self._lock:
+                if path in active:
+                    return
+                active.add(path)
+            with self.metrics.scanning(path) as probe:
+                if (
+                    self.should_skip(path)
+                    or not self.is_video_file(path)
+                    or self.skip_unneeded(path)
+                ):
+                    on_done(path)
+                    return
+                duration = self.get_duration(path)
+            with self._lock:
+                self.total_files += 1
+                total = self.total_files
+            self.progress.add_file(path, duration)
+            self.emit("file_queued", file=path, total=total)
+            self.metrics.enqueue(path, probe)
+            job_queue.put(path)
+
+        def on_done(path):
+            with self._lock:
+                active.discard(path)
+
+        self._watcher = FolderWatcher(
+            self.input_dir,
+            VALID_EXTENSIONS,
+            on_ready,
+            exclude_dirs=(self.output_dir, self.log_dir),
+            settle=self.watch_settle,
+        )
+        if self._stop_event.is_set():
+            return
+        self.emit("watch_start", input_dir=self.input_dir, backend=self._watcher.backend)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for _ in range(self.workers):
+                executor.submit(self._encode_worker, job_queue, summary, on_done)
+            try:
+                self._watcher.run()
+            finally:
+                self.probe_cache.save()
+                self.emit("watch_stopped", total=self.total_files)
+                for _ in range(self.workers):
+                    job_queue.put(None)
+        self._watcher = None
+
+    def _encode_worker(self, job_queue, summary, on_done=None):
+        """从队列取文件转换，直到取到 None"""
+        while True:
+            path = job_queue.get()
+            if path is None:
+                return
+            if self._stop_event.is_set():
+                continue  # 取消后只清空队列
+            try:
+                result, input_file = self.convert_single_video(path)
+            except Exception as e:
+                result, input_file = False, f"Error processing file: {str(e)}"
+            if not self._stop_event.is_set():
+                # 与批量模式一致：取消时被中断的文件不记为失败
+                self._record_result(summary, result, input_file)
+            if on_done is not None:
+                on_done(path)
+
+    def _record_result(self, summary, result, input_file):
+        with self._lock:
+            if result == KEPT:
+                # 编码结果没有明显变小，保留了源文件，不算作已转换
+                summary["kept"].append(input_file)
+            elif result:
+                summary["success"] += 1
+                summary["converted"].append(input_file)
+            else:
+                summary["failed"].append(input_file)
+            done = summary["success"] + len(summary["failed"]) + len(summary["kept"])
+            total = self.total_files
+        overall = self.progress.finish_file(input_file)
+        self.finish_metrics(input_file, result)
+        self.emit(
+            "file_done",
+            file=input_file,
+            ok=bool(result),
+            kept=result == KEPT,
+            done=done,
+            total=total,
+            skipped=self.skipped_files,
+            percent=round(overall["percent"], 2),
+            eta=overall["eta"],
+        )
+
+    def finish_metrics(self, input_file, result):
+        if result == KEPT:
+            status = "kept"
+        else:
+            status = "success" if result else "failed"
+        bytes_in = bytes_out = None
+        try:
+            bytes_in = os.path.getsize(input_file)
+            out_file, _ = self.output_paths(input_file)
+            if result and result != KEPT and os.path.exists(out_file):
+                bytes_out = os.path.getsize(out_file)
+        except OSError:
+            pass
+        duration = self.get_duration(input_file) if bytes_in is not None else 0.0
+        self.metrics.finish(input_file, status, duration, bytes_in, bytes_out)
+
+    def _on_ffmpeg_progress(self, input_file, duration, update):
+        overall = self.progress.update(input_file, update["out_time"], update["fps"])
+        file_percent = 0.0
+        if duration:
+            file_percent = min(100.0, update["out_time"] * 100.0 / duration)
+        self.emit(
+            "progress",
+            file=input_file,
+            file_percent=round(file_percent, 2),
+            out_time=round(update["out_time"], 2),
+            fps=update["fps"],
+            speed=update["speed"],
+            percent=round(overall["percent"], 2),
+            batch_fps=round(overall["fps"], 1),
+            eta=overall["eta"],
+        )
+
+    def verify_conversion(self, input_file, output_file):
+        """验证转换是否成功完成，用时计入该文件的 verify 阶段"""
+        with self.metrics.job(input_file).stage("verify") as stage:
+            stage["ok"] = self._check_output(input_file, output_file)
+        return stage["ok"]
+
+    def _check_output(self, input_file, output_file):
+        try:
+            # 检查输出文件是否存在且大小合理
+            if not os.path.exists(output_file):
+                return False
+
+            input_size = os.path.getsize(input_file)
+            output_size = os.path.getsize(output_file)
+
+            # 输出文件不应为0且不应小于输入文件的10%
+            if output_size == 0 or output_size < input_size * 0.1:
+                return False
+
+            # 输入信息来自缓存，输出文件只探测一次
+            input_info = self.probe(input_file)
+            output_info = self.probe_output(output_file, input_file)
+
+            # 检查视频时长是否匹配，允许1秒的误差
+            if abs(get_duration(input_info) - get_duration(output_info)) > 1:
+                return False
+
+            # 检查编解码器是否为H.265
+            if get_video_codec(output_info).lower() != "hevc":
+                return False
+
+            return True
+        except Exception:
+            return False
+
+    def convert_single_video(self, input_file):
+        if self._stop_event.is_set():
+            return False, input_file
+
+        try:
+            if not self.is_video_file(input_file):
+                return False, input_file
+
+            self.metrics.job(input_file).start()
+            width, height, framerate = self.get_video_info(input_file)
+            duration = self.get_duration(input_file)
+            action, reason = self.plan_action(input_file)
+            # 第一次编码前确定每条流的处理方式，避免整片编码到最后才因封装失败
+            plan = self.stream_plan(input_file)
+            if plan and plan["notes"]:
+                self.emit("stream_plan", file=input_file, notes=plan["notes"])
+            out_file, _ = self.output_paths(input_file)
+            # 先占用源文件和输出所在设备的名额，再申请 CPU 槽，顺序固定不会死锁
+            with self.metrics.job(input_file).stage("wait_device"):
+                devices = self.devices.acquire(
+                    (input_file, os.path.dirname(out_file)), self._stop_event
+                )
+            if devices is None:
+                return False, input_file
+            try:
+                result = self._convert_on_devices(
+                    input_file, width, height, framerate, duration, action, reason
+                )
+            finally:
+                self.devices.release(devices)
+            return result, input_file
+        except Exception as e:
+            print(f"转换过程中出错: {e}", file=sys.stderr)
+            return False, input_file
+
+    def _convert_on_devices(
+        self, input_file, width, height, framerate, duration, action, reason
+    ):
+        if action == REMUX:
+            result = self._convert_remux(input_file, duration, reason)
+            if result is not None:
+                return result
+        bitrate, crf = get_adaptive_params(width, height, framerate)
+        bitrate, crf = self.tune_rate(input_file, duration, width, height, bitrate, crf)
+        if self._stop_event.is_set():
+            return False
+        if self.chunk_min_duration and duration >= self.chunk_min_duration:
+            result = self._convert_chunked(
+                input_file, width, height, framerate, bitrate, crf, duration
+            )
+            if result is not None:
+                return result
+        with self.metrics.job(input_file).stage("wait_slot"):
+            slot = self.scheduler.acquire(width, height, self._stop_event)
+        if slot is None:
+            return False
+        try:
+            result, _ = self._convert_with_slot(
+                input_file, width, height, framerate, bitrate, crf, duration, slot
+            )
+            return result
+        finally:
+            self.scheduler.release(slot)
+
+    def output_paths(self, input_file):
+        """输出和日志按源文件相对输入目录的路径镜像，不同子目录的同名文件不会互相覆盖"""
+        base_name = os.path.splitext(os.path.basename(input_file))[0]
+        rel_dir = os.path.relpath(os.path.dirname(input_file), self.input_dir)
+        if rel_dir == os.curdir or rel_dir.startswith(os.pardir):
+            rel_dir = ""  # 不在输入目录下的文件直接放在根目录
+        out_file = os.path.join(self.output_dir, rel_dir, base_name + "_hevc.mp4")
+        log_file = os.path.join(
+            self.log_dir,
+            rel_dir,
+            base_name + f"_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.log",
+        )
+        return out_file, log_file
+
+    @staticmethod
+    def staging_path(out_file):
+        """编码先写入同目录下的隐藏临时文件，校验通过后再原子改名为 out_file"""
+        directory, name = os.path.split(out_file)
+        base, ext = os.path.splitext(name)
+        return os.path.join(directory, f".{base}.part{ext}")
+
+    def publish(self, work_file, out_file, log=None):
+        """用 os.replace 原子发布通过校验的输出，读取方不会看到写了一半的文件"""
+        try:
+            os.replace(work_file, out_file)
+            return True
+        except OSError as e:
+            if log is not None:
+                write_log(log, f"发布输出失败: {e}")
+            print(f"发布输出失败: {e}", file=sys.stderr)
+            self.remove_partial(work_file)
+            return False
+
+    def prepare_dirs(self, out_file, log_file):
+        os.makedirs(os.path.dirname(out_file), exist_ok=True)
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+
+    def stream_plan(self, input_file, log=None):
+        """按缓存的探测信息生成流计划，log 不为 None 时把说明写入日志"""
+        plan = plan_streams(self.probe(input_file), self.audio_codec)
+        if plan and log is not None:
+            for note in plan["notes"]:
+                write_log(log, f"流处理: {note}")
+        return plan
+
+    def rendition_outputs(self, input_file, width, height, framerate, log=None):
+        """附加输出列表：输出路径、临时文件、缩放后尺寸和按该尺寸计算的码率/CRF
+
+        源分辨率不高于目标的代理不生成（不放大），log 不为 None 时写明原因。
+        """
+        out_file, _ = self.output_paths(input_file)
+        outputs = []
+        for rendition in self.renditions:
+            size = bitrate = crf = None
+            if rendition["kind"] == "video":
+                size = scaled_size(width, height, rendition["height"])
+                if size is None:
+                    if log is not None:
+                        write_log(
+                            log,
+                            f"跳过 {rendition['name']}：源分辨率 {width}x{height} "
+                            f"不高于目标",
+                        )
+                    continue
+                bitrate, crf = get_adaptive_params(size[0], size[1], framerate)
+            output = rendition_file(out_file, rendition)
+            outputs.append(
+                {
+                    "rendition": rendition,
+                    "output": output,
+                    "work": self.staging_path(output),
+                    "size": size,
+                    "bitrate": bitrate,
+                    "crf": crf,
+                    "verified": False,
+                }
+            )
+        return outputs
+
+    def verify_renditions(self, input_file, outputs, log):
+        """逐个校验附加输出，结果写入各项的 verified，未通过的删除"""
+        for output in outputs:
+            name = output["rendition"]["name"]
+            with self.metrics.job(input_file).stage(
+                "verify_rendition", rendition=name
+            ) as stage:
+                stage["ok"] = self._check_rendition(input_file, output)
+            output["verified"] = stage["ok"]
+            write_log(log, f"校验 {name}: {'通过' if stage['ok'] else '未通过'}")
+            if not stage["ok"]:
+                self.remove_partial(output["work"])
+
+    def _check_rendition(self, input_file, output):
+        try:
+            work_file = output["work"]
+            if not os.path.exists(work_file) or os.path.getsize(work_file) == 0:
+                return False
+            if output["rendition"]["kind"] == "thumbs":
+                return True
+            info = self.probe_output(work_file, input_file)
+            if abs(self.get_duration(input_file) - get_duration(info)) > 1:
+                return False
+            if get_video_codec(info).lower() != "hevc":
+                return False
+            return get_dimensions(info)[1] == output["size"][1]
+        except Exception:
+            return False
+
+    def publish_renditions(self, input_file, outputs, log):
+        """发布通过校验的附加输出，返回写入清单的逐项结果；未配置附加输出时返回 None"""
+        if not self.renditions:
+            return None
+        entries = []
+        for output in outputs:
+            ok = output["verified"] and self.publish(
+                output["work"], output["output"], log
+            )
+            entries.append(
+                {
+                    "name": output["rendition"]["name"],
+                    "output": os.path.abspath(output["output"]),
+                    "verified": ok,
+                    "output_size": os.path.getsize(output["output"]) if ok else None,
+                }
+            )
+            self.emit(
+                "rendition",
+                file=input_file,
+                name=output["rendition"]["name"],
+                output=output["output"],
+                ok=ok,
+            )
+        return entries
+
+    def discard_renditions(self, outputs):
+        for output in outputs:
+            self.remove_partial(output["work"])
+
+    def _encode_renditions(self, input_file, duration, log):
+        """主输出来自转封装或分段编码时，单独解码一次生成全部附加输出"""
+        if not self.renditions:
+            return None
+        width, height, framerate = self.get_video_info(input_file)
+        outputs = self.rendition_outputs(input_file, width, height, framerate, log)
+        if not outputs:
+            return []
+        slot = self.scheduler.acquire(width, height, self._stop_event)
+        if slot is None:
+            return self.publish_renditions(input_file, outputs, log)
+        try:
+            for attempt in self.active_encoder_chain(log):
+                if self._stop_event.is_set():
+                    break
+                cmd = build_rendition_cmd(
+                    attempt,
+                    input_file,
+                    None,
+                    None,
+                    None,
+                    outputs,
+                    duration,
+                    slot["threads"],
+                    self.preset,
+                )
+                write_log(log, f"\n===== 附加输出: {attempt['name']} =====")
+                write_log(log, "命令: " + subprocess.list2cmdline(cmd))
+                with self.metrics.job(input_file).stage(
+                    "encode_renditions", encoder=attempt["name"]
+                ) as stage:
+                    returncode, _ = run_ffmpeg(
+                        cmd,
+                        log=log,
+                        tail_lines=ERROR_TAIL_LINES,
+                        tracker=self.processes,
+                    )
+                    stage["returncode"] = returncode
+                write_log(log, f"----- 结束: 退出码 {returncode}")
+                if returncode == 0 and not self._stop_event.is_set():
+                    self.verify_renditions(input_file, outputs, log)
+                    break
+                self.discard_renditions(outputs)
+        finally:
+            self.scheduler.release(slot)
+        return self.publish_renditions(input_file, outputs, log)
+
+    def tune_rate(self, input_file, duration, width, height, bitrate, crf):
+        """按抽样片段的 CRF 搜索结果调整码率参数，结果按源文件缓存
+
+        硬件编码器按码率控制，CRF 对它们无效：此时用 libx265 搜索，
+        再把所选 CRF 下片段的平均码率交给硬件编码器。
+        """
+        if not self.crf_search:
+            return bitrate, crf
+        attempt = self.active_encoder_chain()[0]
+        if attempt["rate"] != "crf":
+            attempt = dict(ENCODER_ATTEMPTS["libx265"], name="libx265")
+        # 目标质量按所选指标的刻度解读，指标不同的结果不能共用
+        metric = self.quality_metric or quality_metric()
+        if self.crf_target_size is not None:
+            target = f"size:{self.crf_target_size}"
+        else:
+            target = f"quality:{metric}:{self.crf_target_quality}"
+        key = self.crf_cache.key(input_file, attempt["name"], target)
+        result = self.crf_cache.get(key) if key else None
+        cached = result is not None
+        if result is None:
+            started_at, started = time.time(), time.monotonic()
+            slot = self.scheduler.acquire(width, height, self._stop_event)
+            if slot is None:
+                return bitrate, crf
+            try:
+                result = search_crf(
+                    lambda clip_file, clip_crf: build_ffmpeg_cmd(
+                        attempt,
+                        input_file,
+                        clip_file,
+                        bitrate,
+                        clip_crf,
+                        max(1, slot["threads"] // 2),
+                        self.preset,
+                    ),
+                    input_file,
+                    duration,
+                    width,
+                    height,
+                    crf,
+                    source_bitrate=video_bitrate(self.probe(input_file)),
+                    target_quality=self.crf_target_quality,
+                    target_size=self.crf_target_size,
+                    metric=metric,
+                    tracker=self.processes,
+                )
+            finally:
+                self.scheduler.release(slot)
+            self.metrics.job(input_file).add_stage(
+                "crf_search", started_at, time.monotonic() - started
+            )
+            if result is None or self._stop_event.is_set():
+                return bitrate, crf
+            if key:
+                self.crf_cache.put(key, result)
+                self.crf_cache.save()
+        if not result["met"]:
+            print(
+                f"CRF 搜索未达到目标 {target}，退回 CRF {result['crf']}: {input_file}",
+                file=sys.stderr,
+            )
+        self.emit(
+            "crf_search",
+            file=input_file,
+            crf=result["crf"],
+            bitrate=result["bitrate"],
+            score=result["score"],
+            metric=result["metric"],
+            size_ratio=result["size_ratio"],
+            met=result["met"],
+            cached=cached,
+        )
+        return result["bitrate"], result["crf"]
+
+    def _convert_chunked(
+        self, input_file, width, height, framerate, bitrate, crf, duration
+    ):
+        """按关键帧把大文件切成若干段，各段作为独立任务并行编码后无损拼接
+
+        每段单独向调度器申请核数，与其他文件的任务共享整机资源。
+        找不到足够的关键帧时返回 None，由调用方按整文件编码。
+        """
+        threads, _ = job_cost(width, height)
+        count = self.chunks or max(2, self.scheduler.cpu_count // threads)
+        keyframes = find_keyframes(
+            input_file,
+            chunk_targets(duration, count),
+            self.processes,
+            self.get_start_time(input_file),
+        )
+        chunks = plan_chunks(duration, keyframes)
+        if len(chunks) < 2:
+            return None
+
+        out_file, log_file = self.output_paths(input_file)
+        work_file = self.staging_path(out_file)
+        base_name = os.path.splitext(os.path.basename(out_file))[0]
+        chunk_dir = os.path.join(os.path.dirname(out_file), f".{base_name}_chunks")
+        self.prepare_dirs(out_file, log_file)
+        os.makedirs(chunk_dir, exist_ok=True)
+        self.progress.start_file(input_file)
+
+        # 各段进度累加为整个文件的进度
+        chunk_progress = {}
+        progress_lock = threading.Lock()
+
+        def on_chunk_progress(idx, update):
+            with progress_lock:
+                chunk_progress[idx] = (update["out_time"], update["fps"])
+                out_time = sum(t for t, _ in chunk_progress.values())
+                fps = sum(f for _, f in chunk_progress.values())
+            self._on_ffmpeg_progress(
+                input_file,
+                duration,
+                {"out_time": out_time, "fps": fps, "speed": update["speed"]},
+            )
+
+        def encode_chunk(idx, start, end):
+            chunk_file = os.path.join(chunk_dir, f"chunk_{idx:04d}.mp4")
+            chunk_log = os.path.join(chunk_dir, f"chunk_{idx:04d}.log")
+            slot = self.scheduler.acquire(width, height, self._stop_event)
+            if slot is None:
+                return None, None
+            try:
+                with open(chunk_log, "ab") as log:
+                    for attempt in self.active_encoder_chain(log):
+                        if self._stop_event.is_set():
+                            return None, None
+                        cmd = build_chunk_cmd(
+                            build_ffmpeg_cmd(
+                                attempt,
+                                input_file,
+                                chunk_file,
+                                bitrate,
+                                crf,
+                                slot["threads"],
+                                self.preset,
+                            ),
+                            start,
+                            end,
+                        )
+                        write_log(log, f"\n===== 片段 {idx}: {attempt['name']} =====")
+                        write_log(log, "命令: " + subprocess.list2cmdline(cmd))
+                        with self.metrics.job(input_file).stage(
+                            "encode_chunk", chunk=idx, encoder=attempt["name"]
+                        ) as stage:
+                            returncode, tail = run_ffmpeg(
+                                cmd,
+                                on_progress=lambda u: on_chunk_progress(idx, u),
+                                log=log,
+                                tail_lines=ERROR_TAIL_LINES,
+                                tracker=self.processes,
+                            )
+                            stage["returncode"] = returncode
+                        write_log(log, f"----- 结束: 退出码 {returncode}")
+                        if returncode == 0 and os.path.exists(chunk_file):
+                            self.breaker.record_success(attempt["name"])
+                            return chunk_file, attempt["name"]
+                        if self._stop_event.is_set():
+                            continue
+                        reason = self.breaker.record_failure(
+                            attempt["name"], tail, input_file
+                        )
+                        if reason:
+                            # 片段日志随后按顺序并入主日志
+                            write_log(
+                                log,
+                                f"熔断: 本次会话后续任务不再尝试 {attempt['name']}"
+                                f"（{reason}）",
+                            )
+                            self.emit(
+                                "breaker_tripped", encoder=attempt["name"], reason=reason
+                            )
+                return None, None
+            finally:
+                self.scheduler.release(slot)
+
+        ok = False
+        try:
+            with open(log_file, "ab") as log:
+                write_log(log, f"源文件: {input_file}")
+                write_log(
+                    log,
+                    f"分段编码: {len(chunks)} 段，时长 {duration:.2f}s, "
+                    f"{width}x{height} @ {framerate:.3f}fps",
+                )
+                plan = self.stream_plan(input_file, log)
+                with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+                    futures = [
+                        executor.submit(encode_chunk, idx, start, end)
+                        for idx, (start, end) in enumerate(chunks)
+                    ]
+                    results = [future.result() for future in futures]
+
+                # 各段日志按顺序并入主日志
+                for idx in range(len(chunks)):
+                    chunk_log = os.path.join(chunk_dir, f"chunk_{idx:04d}.log")
+                    if os.path.exists(chunk_log):
+                        with open(chunk_log, "rb") as f:
+                            shutil.copyfileobj(f, log)
+                if self._stop_event.is_set():
+                    write_log(log, "\n已取消，删除未完成的输出文件")
+                    return False
+                failed = [idx for idx, (chunk, _) in enumerate(results) if not chunk]
+                if failed:
+                    write_log(log, f"\n片段编码失败: {failed}")
+                    self.manifest.record(
+                        input_file, "failed", output=out_file, log=log_file
+                    )
+                    return False
+
+                list_file = os.path.join(chunk_dir, "concat.txt")
+                write_concat_list(list_file, [chunk for chunk, _ in results])
+                cmd = build_concat_cmd(list_file, input_file, work_file, plan)
+                write_log(log, "\n===== 拼接 =====")
+                write_log(log, "命令: " + subprocess.list2cmdline(cmd))
+                with self.metrics.job(input_file).stage("concat") as stage:
+                    returncode, _ = run_ffmpeg(cmd, log=log, tracker=self.processes)
+                    stage["returncode"] = returncode
+                write_log(log, f"----- 结束: 退出码 {returncode}")
+                ok = returncode == 0 and self.verify_conversion(input_file, work_file)
+                write_log(log, "校验: 通过" if ok else "校验: 未通过")
+                encoder = "chunked:" + "+".join(sorted({name for _, name in results}))
+                quality = None
+                if ok:
+                    # 分段输出只标记质量，不重新编码
+                    quality = self.check_quality(
+                        input_file, work_file, duration, width, height, log
+                    )
+                    outcome = self.apply_size_guard(
+                        input_file, work_file, duration, log
+                    )
+                    if outcome == KEPT:
+                        self.manifest.record(
+                            input_file,
+                            "kept",
+                            encoder=encoder,
+                            log=log_file,
+                            renditions=self._encode_renditions(
+                                input_file, duration, log
+                            ),
+                        )
+                        return KEPT
+                    if outcome == REMUX:
+                        encoder, quality = "remux", None
+                    ok = self.publish(work_file, out_file, log)
+                # 分段编码没有整片解码的过程，附加输出单独解码一次生成
+                self.manifest.record(
+                    input_file,
+                    "done" if ok else "failed",
+                    output=out_file,
+                    encoder=encoder,
+                    verified=ok,
+                    log=log_file,
+                    chunks=len(chunks),
+                    quality=quality,
+                    renditions=(
+                        self._encode_renditions(input_file, duration, log)
+                        if ok
+                        else None
+                    ),
+                )
+                return ok
+        finally:
+            shutil.rmtree(chunk_dir, ignore_errors=True)
+            if not ok:
+                self.remove_partial(work_file)
+
+    def _convert_with_slot(
+        self, input_file, width, height, framerate, bitrate, crf, duration, slot
+    ):
+        try:
+            self.progress.start_file(input_file)
+
+            out_file, log_file = self.output_paths(input_file)
+            work_file = self.staging_path(out_file)
+            self.prepare_dirs(out_file, log_file)
+
+            # 第一项为首选编码方式，其余为回退方式，输出都需要通过校验；
+            # 编码、校验和质量检测都针对临时文件，全部通过后才发布到 out_file
+            attempts = []
+            with open(log_file, "ab") as log:
+                write_log(log, f"源文件: {input_file}")
+                write_log(
+                    log,
+                    f"时长: {duration:.2f}s, {width}x{height} @ {framerate:.3f}fps，"
+                    f"线程数: {slot['threads']}",
+                )
+                self.stream_plan(input_file, log)
+                # 附加输出与主输出在同一条命令中编码，每次尝试都重新生成
+                outputs = self.rendition_outputs(
+                    input_file, width, height, framerate, log
+                )
+                for idx, attempt in enumerate(self.active_encoder_chain(log)):
+                    if self._stop_event.is_set():
+                        break
+                    ok, failure = self._run_attempt(
+                        idx,
+                        attempt,
+                        input_file,
+                        work_file,
+                        bitrate,
+                        crf,
+                        duration,
+                        log,
+                        slot["threads"],
+                        outputs,
+                    )
+                    if ok:
+                        quality = self.check_quality(
+                            input_file, work_file, duration, width, height, log
+                        )
+                        if (
+                            quality
+                            and not quality["ok"]
+                            and self.quality_action == "reencode"
+                        ):
+                            quality = self._reencode_for_quality(
+                                idx,
+                                attempt,
+                                input_file,
+                                work_file,
+                                bitrate,
+                                crf,
+                                duration,
+                                (width, height),
+                                log,
+                                slot["threads"],
+                                quality,
+                            )
+                        outcome = self.apply_size_guard(
+                            input_file, work_file, duration, log
+                        )
+                        if outcome == KEPT:
+                            self.manifest.record(
+                                input_file,
+                                "kept",
+                                encoder=attempt["name"],
+                                log=log_file,
+                                renditions=self.publish_renditions(
+                                    input_file, outputs, log
+                                ),
+                            )
+                            return KEPT, input_file
+                        if not self.publish(work_file, out_file, log):
+                            self.discard_renditions(outputs)
+                            break
+                        self.manifest.record(
+                            input_file,
+                            "done",
+                            output=out_file,
+                            encoder="remux" if outcome == REMUX else attempt["name"],
+                            verified=True,
+                            log=log_file,
+                            quality=quality if outcome == ENCODE else None,
+                            renditions=self.publish_renditions(
+                                input_file, outputs, log
+                            ),
+                        )
+                        return True, input_file
+                    if failure:
+                        attempts.append(failure)
+                if self._stop_event.is_set():
+                    # 被结束的 ffmpeg 会留下不完整的文件
+                    write_log(log, "\n已取消，删除未完成的输出文件")
+                    self.remove_partial(work_file)
+                    self.discard_renditions(outputs)
+                    return False, input_file
+            self.manifest.record(
+                input_file, "failed", output=out_file, log=log_file, attempts=attempts
+            )
+            return False, input_file
+        except Exception as e:
+            print(f"转换过程中出错: {e}", file=sys.stderr)
+            return False, input_file
+
+    def check_quality(self, input_file, out_file, duration, width, height, log):
+        """抽样计算 SSIM/VMAF 并与质量下限比较，结果写入日志；关闭或无法计算时返回 None"""
+        if not self.quality_windows:
+            return None
+        started = time.monotonic()
+        with self.metrics.job(input_file).stage("quality") as stage:
+            result = measure_quality(
+                input_file,
+                out_file,
+                duration,
+                width,
+                height,
+                metric=self.quality_metric,
+                windows=self.quality_windows,
+                tracker=self.processes,
+            )
+            if result:
+                stage.update(metric=result["metric"], score=result["score"])
+        if result is None:
+            write_log(log, "质量检测: 无法计算")
+            return None
+        floor = self.quality_floor
+        if floor is None:
+            floor = DEFAULT_FLOORS[result["metric"]]
+        result["floor"] = floor
+        result["ok"] = result["score"] >= floor
+        write_log(
+            log,
+            f"质量检测: {result['metric']} 最低 {result['score']}"
+            f"（各窗口 {result['windows']}），下限 {floor}，"
+            f"{'达标' if result['ok'] else '未达标'}，用时 {time.monotonic() - started:.1f}s",
+        )
+        self.emit("quality", file=input_file, **result)
+        return result
+
+    def _reencode_for_quality(
+        self,
+        idx,
+        attempt,
+        input_file,
+        out_file,
+        bitrate,
+        crf,
+        duration,
+        size,
+        log,
+        threads,
+        quality,
+    ):
+        """质量未达标时提高码率重新编码一次，质量更好才替换原输出"""
+        width, height = size
+        bitrate, crf = boost_params(bitrate, crf)
+        write_log(log, f"\n质量未达标，以码率 {bitrate} / CRF {crf} 重新编码")
+        retry_file = os.path.splitext(out_file)[0] + ".retry.mp4"
+        ok, _ = self._run_attempt(
+            idx, attempt, input_file, retry_file, bitrate, crf, duration, log, threads
+        )
+        retry = None
+        if ok:
+            retry = self.check_quality(
+                input_file, retry_file, duration, width, height, log
+            )
+        if retry and retry["score"] > quality["score"]:
+            os.replace(retry_file, out_file)
+            retry["reencoded"] = True
+            return retry
+        self.remove_partial(retry_file)
+        write_log(log, "重新编码没有提高质量，保留原输出")
+        return quality
+
+    def _convert_remux(self, input_file, duration, reason):
+        """已是 HEVC 的文件只转封装；失败时返回 None，由调用方重新编码"""
+        self.progress.start_file(input_file)
+        out_file, log_file = self.output_paths(input_file)
+        work_file = self.staging_path(out_file)
+        self.prepare_dirs(out_file, log_file)
+        with open(log_file, "ab") as log:
+            write_log(log, f"源文件: {input_file}")
+            write_log(log, f"转封装: {reason}")
+            self.stream_plan(input_file, log)
+            ok = self._run_remux(input_file, work_file, duration, log)
+            if self._stop_event.is_set():
+                self.remove_partial(work_file)
+                return False
+            if not ok:
+                write_log(log, "转封装失败，改为重新编码")
+                return None
+            if not self.publish(work_file, out_file, log):
+                return False
+            # 转封装不解码，附加输出单独解码一次生成
+            renditions = self._encode_renditions(input_file, duration, log)
+        self.emit("encoder", file=input_file, status="using", hwaccel="none", codec="copy")
+        self.manifest.record(
+            input_file,
+            "done",
+            output=out_file,
+            encoder="remux",
+            verified=True,
+            log=log_file,
+            renditions=renditions,
+        )
+        return True
+
+    def _run_remux(self, input_file, out_file, duration, log):
+        """用 -c copy 复制流到 MP4，通过校验返回 True，否则删除输出"""
+        cmd = build_remux_cmd(input_file, out_file, self.stream_plan(input_file))
+        write_log(log, "\n===== 转封装 (-c copy) =====")
+        write_log(log, "命令: " + subprocess.list2cmdline(cmd))
+        def on_progress(update):
+            self._on_ffmpeg_progress(input_file, duration, update)
+
+        with self.metrics.job(input_file).stage("remux") as stage:
+            returncode, _ = run_ffmpeg(
+                cmd,
+                on_progress=on_progress,
+                log=log,
+                tracker=self.processes,
+            )
+            stage["returncode"] = returncode
+        write_log(log, f"----- 结束: 退出码 {returncode}")
+        ok = returncode == 0 and self.verify_conversion(input_file, out_file)
+        write_log(log, "校验: 通过" if ok else "校验: 未通过")
+        if not ok:
+            self.remove_partial(out_file)
+        return ok
+
+    def apply_size_guard(self, input_file, out_file, duration, log):
+        """编码结果没有明显变小时放弃它
+
+        源文件已是 HEVC 时改为转封装源文件，否则保留源文件不输出。
+        返回 ENCODE（采用编码结果）、REMUX 或 KEPT。
+        """
+        if is_meaningfully_smaller(input_file, out_file, self.size_guard):
+            return ENCODE
+        write_log(
+            log,
+            f"\n输出 {os.path.getsize(out_file)} 字节不小于源文件 "
+            f"{os.path.getsize(input_file)} 字节 × {self.size_guard}，放弃编码结果",
+        )
+        self.remove_partial(out_file)
+        if get_video_codec(self.probe(input_file)).lower() == "hevc":
+            if self._run_remux(input_file, out_file, duration, log):
+                return REMUX
+        write_log(log, "保留源文件，不输出")
+        self.emit("file_kept", file=input_file)
+        return KEPT
+
+    def active_encoder_chain(self, log=None):
+        """去掉已熔断的编码尝试；全部熔断时仍保留最后一项兜底"""
+        chain = [a for a in self.encoder_chain if not self.breaker.is_open(a["name"])]
+        if log is not None:
+            for attempt in self.encoder_chain:
+                if attempt not in chain:
+                    reason = self.breaker.tripped.get(attempt["name"])
+                    write_log(log, f"跳过 {attempt['name']}：已熔断（{reason}）")
+        return chain or self.encoder_chain[-1:]
+
+    def _run_attempt(
+        self,
+        idx,
+        attempt,
+        input_file,
+        out_file,
+        bitrate,
+        crf,
+        duration,
+        log,
+        threads,
+        renditions=None,
+    ):
+        """执行编码链中的一次尝试，日志中每次尝试单独成节
+
+        返回 (是否采用该输出, 失败信息)。输出未通过校验时删除，继续尝试下一项。
+        renditions 不为空时同一条命令经 split 滤镜同时编码附加输出，
+        主输出通过校验后再逐个校验附加输出；附加输出不影响主输出是否采用。
+        """
+        hw_accel = attempt.get("hwaccel") or "none"
+        codec = attempt["codec"]
+        self.emit(
+            "encoder",
+            file=input_file,
+            status="trying" if idx == 0 else "fallback",
+            hwaccel=hw_accel,
+            codec=codec,
+        )
+        if renditions:
+            cmd = build_rendition_cmd(
+                attempt,
+                input_file,
+                out_file,
+                bitrate,
+                crf,
+                renditions,
+                duration,
+                threads,
+                self.preset,
+                self.stream_plan(input_file),
+            )
+        else:
+            cmd = build_ffmpeg_cmd(
+                attempt,
+                input_file,
+                out_file,
+                bitrate,
+                crf,
+                threads,
+                self.preset,
+                self.stream_plan(input_file),
+            )
+        write_log(
+            log,
+            f"\n===== 尝试 {idx + 1}: {attempt['name']} ({hw_accel} + {codec}) =====",
+        )
+        write_log(log, "命令: " + subprocess.list2cmdline(cmd))
+        last = {"out_time": 0.0, "speed": 0.0}
+
+        def on_progress(update):
+            last.update(update)
+            self._on_ffmpeg_progress(input_file, duration, update)
+
+        started = time.monotonic()
+        with self.metrics.job(input_file).stage(
+            "encode", attempt=idx + 1, encoder=attempt["name"]
+        ) as stage:
+            try:
+                returncode, tail = run_ffmpeg(
+                    cmd,
+                    on_progress=on_progress,
+                    log=log,
+                    tail_lines=ERROR_TAIL_LINES,
+                    tracker=self.processes,
+                )
+            except Exception as e:
+                returncode, tail = None, [str(e)]
+            stage.update(
+                returncode=returncode,
+                out_time=round(last["out_time"], 3),
+                speed=last["speed"],
+            )
+        write_log(
+            log,
+            f"----- 结束: 退出码 {returncode}，用时 {time.monotonic() - started:.1f}s，"
+            f"已编码 {last['out_time']:.1f}/{duration:.1f}s，速度 {last['speed']}x",
+        )
+
+        failure = {"encoder": attempt["name"], "returncode": returncode}
+        if self._stop_event.is_set():
+            return False, None
+        if returncode == 0 and os.path.exists(out_file):
+            self.breaker.record_success(attempt["name"])
+            if self.verify_conversion(input_file, out_file):
+                write_log(log, "校验: 通过")
+                if renditions:
+                    self.verify_renditions(input_file, renditions, log)
+                self.emit(
+                    "encoder",
+                    file=input_file,
+                    status="using",
+                    hwaccel=hw_accel,
+                    codec=codec,
+                )
+                return True, None
+            write_log(log, "校验: 未通过")
+            self.remove_partial(out_file)
+            self.discard_renditions(renditions or ())
+            failure["error"] = ["校验未通过"]
+            return False, failure
+
+        failure["error"] = tail
+        self.discard_renditions(renditions or ())
+        print(
+            f"编码失败 ({hw_accel} + {codec})，退出码 {returncode}，详见 {log.name}",
+            file=sys.stderr,
+        )
+        reason = self.breaker.record_failure(attempt["name"], tail, input_file)
+        if reason:
+            write_log(log, f"熔断: 本次会话后续任务不再尝试 {attempt['name']}（{reason}）")
+            self.emit("breaker_tripped", encoder=attempt["name"], reason=reason)
+        self.emit(
+            "encoder",
+            file=input_file,
+            status="failed",
+            hwaccel=hw_accel,
+            codec=codec,
+            returncode=returncode,
+            error=tail[-5:],
+        )
+        return False, failure
+
+    def remove_partial(self, out_file):
+        try:
+            if os.path.exists(out_file):
+                os.remove(out_file)
+        except OSError as e:
+            print(f"删除未完成的输出失败: {e}", file=sys.stderr)
+
+    def is_video_file(self, path):
+        try:
+            if not os.path.exists(path):
+                return False
+
+            ext = os.path.splitext(path)[1].lower()
+            if ext not in VALID_EXTENSIONS:
+                return False
+
+            return is_valid_video(self.probe(path))
+        except Exception as e:
+            print(f"视频文件验证失败: {e}", file=sys.stderr)
+            return False
+
+    def probe(self, path, job=None):
+        """探测文件；调用次数、缓存未命中次数和用时计入 job（默认为该文件）的指标，
+        扫描阶段计入该文件的 ScanProbe，入队时作为 probe 阶段并入"""
+        cached = self.probe_cache.is_cached(path)
+        started = time.monotonic()
+        info = self.probe_cache.probe(path, tracker=self.processes)
+        self.metrics.add_probe(job or path, time.monotonic() - started, cached)
+        return info
+
+    def probe_output(self, path, job):
+        """探测临时输出（.part、.retry 等）：直接执行 ffprobe，不写入持久缓存
+
+        这些文件随后会被改名或删除，缓存它们只会在缓存文件中留下失效的条目。
+        """
+        started = time.monotonic()
+        info = run_ffprobe(path, tracker=self.processes)
+        self.metrics.add_probe(job, time.monotonic() - started, False)
+        return info
+
+    def get_video_info(self, path):
+        return get_dimensions(self.probe(path))
+
+    def get_duration(self, path):
+        return get_duration(self.probe(path))
+
+    def get_start_time(self, path):
+        return get_start_time(self.probe(path))
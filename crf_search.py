@@ -0,0 +1,192 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from chunked import build_chunk_cmd
+from ffmpeg_runner import run_ffmpeg
+from quality_check import (
+    build_quality_cmd,
+    quality_metric,
+    run_quality_cmd,
+    sample_windows,
+)
+
+CACHE_VERSION = 2  # 2: 键中加入质量指标，质量比较改为共用时间原点
+DEFAULT_CACHE_FILE = os.path.join(
+    os.path.expanduser("~"), ".hevc_converter", "crf_cache.json"
+)
+SEARCH_CLIPS = 3  # 抽样片段数
+CLIP_SECONDS = 4.0
+CRF_OFFSETS = (-4, -2, 0, 2, 4, 6)  # 相对静态表 CRF 的候选值
+# 搜索的目标质量，比校验下限略高，留出余量
+DEFAULT_TARGETS = {"ssim": 0.97, "vmaf": 93.0}
+
+
+def candidate_crfs(base_crf, offsets=CRF_OFFSETS):
+    return sorted({min(51, max(0, base_crf + offset)) for offset in offsets})
+
+
+def meets_target(result, target_quality=None, target_size=None):
+    if target_size is not None:
+        return result["size_ratio"] <= target_size
+    return result["score"] is not None and result["score"] >= target_quality
+
+
+def choose_crf(results, target_quality=None, target_size=None):
+    """results 为按 CRF 升序的 [{"crf", "score", "size_ratio"}]
+
+    target_size 不为 None 时选体积比不超过它的最低 CRF（质量最好）；
+    否则选分数不低于 target_quality 的最高 CRF（码率最低）。没有满足条件的候选时
+    分别退回到体积最小 / 质量最好的一项。
+    """
+    if not results:
+        return None
+    fits = [r for r in results if meets_target(r, target_quality, target_size)]
+    if target_size is not None:
+        return fits[0] if fits else results[-1]
+    return fits[-1] if fits else results[0]
+
+
+class CrfSearchCache:
+    """CRF 搜索结果缓存，以 (源文件, 大小, 修改时间, 编码方式, 目标) 为键持久化到磁盘"""
+
+    def __init__(self, cache_file=DEFAULT_CACHE_FILE):
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                self._entries = data.get("entries", {})
+        except Exception as e:
+            print(f"读取 CRF 搜索缓存失败: {e}", file=sys.stderr)
+
+    def save(self):
+        if not self.cache_file or not self._dirty:
+            return
+        with self._lock:
+            data = {"version": CACHE_VERSION, "entries": dict(self._entries)}
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_file = self.cache_file + ".tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            print(f"保存 CRF 搜索缓存失败: {e}", file=sys.stderr)
+
+    @staticmethod
+    def key(path, attempt_name, target):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{attempt_name}|{target}"
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._dirty = True
+
+
+def search_crf(
+    make_cmd,
+    input_file,
+    duration,
+    width,
+    height,
+    base_crf,
+    source_bitrate=None,
+    target_quality=None,
+    target_size=None,
+    metric=None,
+    clips=SEARCH_CLIPS,
+    parallel=2,
+    tracker=None,
+):
+    """在抽样片段上并行试编码各候选 CRF，返回选中的参数
+
+    make_cmd(输出文件, crf) 返回整文件的编码命令，片段的 -ss/-t 在此基础上插入。
+    返回 {"crf", "bitrate", "score", "size_ratio", "metric", "met", "candidates"}，
+    片段都编码失败时返回 None。bitrate 为所选 CRF 下片段的平均码率，
+    供按码率控制的硬件编码器使用；met 为 False 表示没有候选达到目标，
+    所选为退回值。
+    """
+    metric = metric or quality_metric()
+    if target_quality is None:
+        target_quality = DEFAULT_TARGETS[metric]
+    windows = sample_windows(duration, clips, CLIP_SECONDS)
+    crfs = candidate_crfs(base_crf)
+    workdir = tempfile.mkdtemp(prefix="hevc_crf_")
+
+    def encode_clip(crf, idx, start, length):
+        clip_file = os.path.join(workdir, f"crf{crf}_{idx}.mp4")
+        cmd = build_chunk_cmd(make_cmd(clip_file, crf), start, start + length)
+        returncode, _ = run_ffmpeg(cmd, tail_lines=5, tracker=tracker)
+        if returncode != 0 or not os.path.exists(clip_file):
+            return None
+        score = run_quality_cmd(
+            build_quality_cmd(
+                input_file, clip_file, start, length, metric, width, height, 0.0
+            ),
+            metric,
+            tracker,
+        )
+        return score, os.path.getsize(clip_file) * 8 / length
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+            futures = {
+                (crf, idx): executor.submit(encode_clip, crf, idx, start, length)
+                for crf in crfs
+                for idx, (start, length) in enumerate(windows)
+            }
+            samples = {key: future.result() for key, future in futures.items()}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = []
+    for crf in crfs:
+        clip_results = [samples[(crf, idx)] for idx in range(len(windows))]
+        if not clip_results or any(r is None for r in clip_results):
+            continue
+        scores = [score for score, _ in clip_results if score is not None]
+        bits_per_second = sum(bps for _, bps in clip_results) / len(clip_results)
+        results.append(
+            {
+                "crf": crf,
+                "score": min(scores) if scores else None,
+                "kbps": int(bits_per_second / 1000),
+                "size_ratio": round(bits_per_second / source_bitrate, 3)
+                if source_bitrate
+                else 1.0,
+            }
+        )
+    chosen = choose_crf(results, target_quality, target_size)
+    if chosen is None:
+        return None
+    return {
+        "crf": chosen["crf"],
+        "bitrate": f"{max(chosen['kbps'], 100)}k",
+        "score": chosen["score"],
+        "size_ratio": chosen["size_ratio"],
+        "metric": metric,
+        "met": meets_target(chosen, target_quality, target_size),
+        "candidates": results,
+    }
+
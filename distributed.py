@@ -0,0 +1,790 @@
+"""分布式编码：协调端持有任务列表，通过 HTTP 把任务分发给多台编码机
+
+协调端:
+    python distributed.py coordinator /nas/videos --port 8765
+编码端（共享存储，路径不同时用 --path-map 映射）:
+    python distributed.py worker http://coordinator:8765 --path-map /nas=/mnt/nas
+编码端（无共享存储，下载源文件并上传结果）:
+    python distributed.py worker http://coordinator:8765 --fetch
+
+协议只适合在可信网络中使用，可用 --token 设置共享口令。
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import socket
+import argparse
+import tempfile
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from chunked import (
+    find_keyframes,
+    plan_chunks,
+    chunk_targets,
+    build_chunk_cmd,
+    write_concat_list,
+    build_concat_cmd,
+)
+from batch_progress import BatchProgress
+from circuit_breaker import EncoderCircuitBreaker
+from convert_engine import (
+    ConversionEngine,
+    ERROR_TAIL_LINES,
+    build_ffmpeg_cmd,
+    get_adaptive_params,
+)
+from encoder_caps import EncoderCapabilities, parse_encoder_chain
+from ffmpeg_runner import run_ffmpeg
+from process_tracker import ProcessTracker
+
+LEASE_TIMEOUT = 120  # 超过该秒数没有心跳的任务重新分配
+MAX_ATTEMPTS = 3  # 单个任务最多分配次数
+HEARTBEAT_INTERVAL = 5
+POLL_INTERVAL = 3
+
+
+def lease_path(target, lease):
+    """每次租约写入独立的文件：过期租约的编码端仍在运行时不会与新租约写同一个文件"""
+    base, ext = os.path.splitext(target)
+    return f"{base}.lease{lease}{ext}"
+
+
+class Coordinator:
+    """持有扫描得到的任务列表，处理租约、心跳、完成和超时重新分配"""
+
+    def __init__(
+        self,
+        engine,
+        lease_timeout=LEASE_TIMEOUT,
+        max_attempts=MAX_ATTEMPTS,
+        chunk_min_duration=0,
+        chunks=4,
+    ):
+        self.engine = engine
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.chunk_min_duration = chunk_min_duration
+        self.chunks = chunks
+        self.jobs = {}
+        self.pending = []
+        self.files = {}
+        self.summary = None
+        self.finished = threading.Event()
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def prepare(self):
+        """扫描输入目录并生成任务：普通文件一个任务，大文件按关键帧分段"""
+        engine = self.engine
+        self.summary = {
+            "input_dir": engine.input_dir,
+            "output_dir": engine.output_dir,
+            "total": 0,
+            "success": 0,
+            "failed": [],
+            "skipped": 0,
+            "converted": [],
+            "kept": [],
+            "cancelled": False,
+        }
+        engine.progress = BatchProgress()
+        os.makedirs(engine.output_dir, exist_ok=True)
+        engine.emit("scan_start", input_dir=engine.input_dir)
+        for source in engine.scan():
+            width, height, framerate = engine.get_video_info(source)
+            bitrate, crf = get_adaptive_params(width, height, framerate)
+            duration = engine.get_duration(source)
+            out_file, log_file = engine.output_paths(source)
+            engine.progress.add_file(source, duration)
+            params = {
+                "source": source,
+                "bitrate": bitrate,
+                "crf": crf,
+                "duration": duration,
+                "streams": engine.stream_plan(source),
+            }
+            spans = [(0.0, None)]
+            if self.chunk_min_duration and duration >= self.chunk_min_duration:
+                keyframes = find_keyframes(
+                    source,
+                    chunk_targets(duration, self.chunks),
+                    engine.processes,
+                    engine.get_start_time(source),
+                )
+                spans = plan_chunks(duration, keyframes)
+            # 输出先写入临时文件，拼接和校验通过后再原子发布
+            work_file = engine.staging_path(out_file)
+            os.makedirs(os.path.dirname(out_file), exist_ok=True)
+            chunk_dir = None
+            if len(spans) > 1:
+                base_name = os.path.splitext(os.path.basename(out_file))[0]
+                chunk_dir = os.path.join(
+                    os.path.dirname(out_file), f".{base_name}_chunks"
+                )
+                os.makedirs(chunk_dir, exist_ok=True)
+            job_ids = []
+            for idx, (start, end) in enumerate(spans):
+                job_id = str(self._next_id)
+                self._next_id += 1
+                job = dict(params, id=job_id, kind="file", status="pending")
+                job.update(attempts=0, worker=None, deadline=None, out_time=0.0)
+                # target 为任务的正式输出；每次租约写入 output（见 lease_path），
+                # 只有完成的那次租约的输出改名为 target
+                job.update(target=work_file, lease=None, output=None, leases=[])
+                if chunk_dir:
+                    job.update(kind="chunk", index=idx, start=start, end=end)
+                    job["target"] = os.path.join(chunk_dir, f"chunk_{idx:04d}.mp4")
+                self.jobs[job_id] = job
+                self.pending.append(job_id)
+                job_ids.append(job_id)
+            self.files[source] = {
+                "output": out_file,
+                "work": work_file,
+                "log": log_file,
+                "chunk_dir": chunk_dir,
+                "jobs": job_ids,
+                "encoders": set(),
+            }
+        engine.total_files = self.summary["total"] = len(self.files)
+        self.summary["skipped"] = engine.skipped_files
+        engine.emit("scan_done", total=engine.total_files, jobs=len(self.jobs))
+        if not self.files:
+            self.finished.set()
+
+    def public_job(self, job):
+        keys = (
+            "id",
+            "lease",
+            "kind",
+            "source",
+            "output",
+            "bitrate",
+            "crf",
+            "duration",
+            "streams",
+        )
+        data = {k: job[k] for k in keys}
+        if job["kind"] == "chunk":
+            data.update(start=job["start"], end=job["end"])
+        return data
+
+    def reap_expired(self):
+        """租约过期的任务放回队列，超过最大次数判为失败"""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for job in self.jobs.values():
+                if job["status"] == "leased" and job["deadline"] < now:
+                    expired.append(job)
+        for job in expired:
+            self.engine.emit("job_expired", job=job["id"], worker=job["worker"])
+            self.fail_job(job["id"], job["worker"], job["lease"], "租约超时")
+
+    def lease(self, worker):
+        self.reap_expired()
+        with self._lock:
+            if self.engine.cancelled or not self.pending:
+                return None
+            job = self.jobs[self.pending.pop(0)]
+            job.update(
+                status="leased",
+                worker=worker,
+                attempts=job["attempts"] + 1,
+                deadline=time.monotonic() + self.lease_timeout,
+            )
+            job["lease"] = f"{job['id']}-{job['attempts']}"
+            job["output"] = lease_path(job["target"], job["lease"])
+            job["leases"].append(job["output"])
+        self.engine.emit("job_leased", job=job["id"], worker=worker, file=job["source"])
+        return self.public_job(job)
+
+    def owns(self, job, worker, lease):
+        """任务仍处于该编码端的这次租约中"""
+        return (
+            job is not None
+            and job["status"] == "leased"
+            and job["worker"] == worker
+            and job["lease"] == lease
+        )
+
+    def heartbeat(self, job_id, worker, lease, out_time=0.0, fps=0.0, speed=0.0):
+        """延长租约并更新进度；返回 False 表示任务已不属于该编码端，应当停止"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if not self.owns(job, worker, lease):
+                return False
+            job["deadline"] = time.monotonic() + self.lease_timeout
+            job["out_time"] = out_time
+            source = job["source"]
+            out_time = sum(
+                self.jobs[j]["out_time"]
+                for j in self.files[source]["jobs"]
+                if self.jobs[j]["status"] in ("leased", "done")
+            )
+        if self.engine.cancelled:
+            return False
+        self.engine._on_ffmpeg_progress(
+            source,
+            job["duration"],
+            {"out_time": out_time, "fps": fps, "speed": speed},
+        )
+        return True
+
+    def complete(self, job_id, worker, lease, ok, encoder=None, error=None):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if not self.owns(job, worker, lease):
+                return
+            entry = self.files[job["source"]]
+            if entry.get("failed"):
+                # 同一文件的其他任务已失败，这一段的输出不再需要
+                job["status"] = "failed"
+                ok = None
+            if ok:
+                try:
+                    # 只采用当前租约的输出，过期租约写的文件不会被改名为正式输出
+                    os.replace(job["output"], job["target"])
+                except OSError as e:
+                    ok, error = False, f"发布输出失败: {e}"
+            if ok:
+                job["status"] = "done"
+                if job["kind"] == "file":
+                    job["out_time"] = job["duration"]
+                if encoder:
+                    entry["encoders"].add(encoder)
+                all_done = all(self.jobs[j]["status"] == "done" for j in entry["jobs"])
+        if ok is None:
+            self.discard_lease_file(job["output"])
+            return
+        if not ok:
+            self.fail_job(job_id, worker, lease, error)
+            return
+        self.engine.emit("job_done", job=job_id, worker=worker, encoder=encoder)
+        if all_done:
+            # 拼接和校验可能较慢，不占用 HTTP 处理线程
+            threading.Thread(
+                target=self.finish_file, args=(job["source"],), daemon=True
+            ).start()
+
+    def fail_job(self, job_id, worker, lease, error):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if not self.owns(job, worker, lease):
+                return
+            job["out_time"] = 0.0
+            entry = self.files[job["source"]]
+            if (
+                job["attempts"] < self.max_attempts
+                and not self.engine.cancelled
+                and not entry.get("failed")
+            ):
+                job.update(status="pending", worker=None, deadline=None)
+                self.pending.append(job_id)
+                retry = True
+            else:
+                job["status"] = "failed"
+                retry = False
+            # 同一文件的其他任务仍在等待时不重复判定失败
+            first_failure = not retry and not entry.get("failed")
+            if first_failure:
+                entry["failed"] = True
+                # 整个文件已失败，尚未租出的其他分段不再编码
+                for other_id in entry["jobs"]:
+                    if self.jobs[other_id]["status"] == "pending":
+                        self.jobs[other_id]["status"] = "failed"
+                        self.pending.remove(other_id)
+        self.engine.emit(
+            "job_failed", job=job_id, worker=worker, error=error, retry=retry
+        )
+        # 失败或过期租约的输出不再使用；编码端可能仍在写入，删除失败时留到文件结束再清理
+        self.discard_lease_file(job["output"])
+        if first_failure:
+            self.discard_leases(job["source"])
+            if entry["chunk_dir"]:
+                shutil.rmtree(entry["chunk_dir"], ignore_errors=True)
+            self.record_file(job["source"], False)
+
+    def discard_lease_file(self, path):
+        try:
+            if path and os.path.exists(path):
+                os.remove(path)
+        except OSError:
+            pass
+
+    def discard_leases(self, source):
+        """删除该文件各任务所有租约留下的输出"""
+        with self._lock:
+            jobs = [self.jobs[j] for j in self.files[source]["jobs"]]
+            paths = [path for job in jobs for path in job["leases"]]
+        for path in paths:
+            self.discard_lease_file(path)
+
+    def finish_file(self, source):
+        engine = self.engine
+        entry = self.files[source]
+        ok = True
+        if entry["chunk_dir"]:
+            chunk_files = [self.jobs[j]["target"] for j in entry["jobs"]]
+            list_file = os.path.join(entry["chunk_dir"], "concat.txt")
+            write_concat_list(list_file, chunk_files)
+            cmd = build_concat_cmd(
+                list_file, source, entry["work"], engine.stream_plan(source)
+            )
+            returncode, _ = run_ffmpeg(cmd, tracker=engine.processes)
+            ok = returncode == 0
+            shutil.rmtree(entry["chunk_dir"], ignore_errors=True)
+        ok = ok and engine.verify_conversion(source, entry["work"])
+        ok = ok and engine.publish(entry["work"], entry["output"])
+        if not ok:
+            engine.remove_partial(entry["work"])
+        self.discard_leases(source)
+        engine.manifest.record(
+            source,
+            "done" if ok else "failed",
+            output=entry["output"],
+            encoder="+".join(sorted(entry["encoders"])) or None,
+            verified=ok,
+            chunks=len(entry["jobs"]),
+        )
+        self.record_file(source, ok)
+
+    def record_file(self, source, ok):
+        self.engine._record_result(self.summary, ok, source)
+        with self._lock:
+            done = self.summary["success"] + len(self.summary["failed"])
+        if done >= len(self.files):
+            self.finished.set()
+
+    def status(self):
+        with self._lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {
+            "jobs": counts,
+            "files": len(self.files),
+            "progress": self.engine.progress.snapshot(),
+            "finished": self.finished.is_set(),
+        }
+
+    def find_job_path(self, job_id, key):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return job[key] if job else None
+
+    def lease_output(self, lease):
+        """当前有效租约的输出路径；租约已过期或不存在时返回 None"""
+        job_id = lease.rpartition("-")[0]
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job and job["status"] == "leased" and job["lease"] == lease:
+                return job["output"]
+            return None
+
+    def cancel(self):
+        self.engine.cancel()
+        with self._lock:
+            self.pending.clear()
+        self.finished.set()
+
+
+def make_handler(coordinator, token=None):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass  # 事件已以 JSON lines 输出
+
+        def _authorized(self):
+            if token and self.headers.get("X-Token") != token:
+                self.send_error(403)
+                return False
+            return True
+
+        def _send_json(self, data, code=200):
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            if not self._authorized():
+                return
+            if self.path == "/status":
+                self._send_json(coordinator.status())
+            elif self.path.startswith("/source/"):
+                path = coordinator.find_job_path(self.path[len("/source/") :], "source")
+                if not path or not os.path.exists(path):
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(os.path.getsize(path)))
+                self.end_headers()
+                with open(path, "rb") as f:
+                    shutil.copyfileobj(f, self.wfile, 1024 * 1024)
+            else:
+                self.send_error(404)
+
+        def do_PUT(self):
+            if not self._authorized():
+                return
+            if not self.path.startswith("/result/"):
+                self.send_error(404)
+                return
+            # 按租约上传，过期租约的上传不会覆盖新租约的结果
+            path = coordinator.lease_output(self.path[len("/result/") :])
+            if not path:
+                self.send_error(404)
+                return
+            remaining = int(self.headers.get("Content-Length") or 0)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                while remaining > 0:
+                    block = self.rfile.read(min(remaining, 1024 * 1024))
+                    if not block:
+                        break
+                    f.write(block)
+                    remaining -= len(block)
+            self._send_json({"ok": remaining == 0})
+
+        def do_POST(self):
+            if not self._authorized():
+                return
+            data = self._read_json()
+            worker = data.get("worker", self.client_address[0])
+            if self.path == "/lease":
+                job = coordinator.lease(worker)
+                self._send_json({"job": job, "done": coordinator.finished.is_set()})
+            elif self.path == "/heartbeat":
+                keep = coordinator.heartbeat(
+                    data["job_id"],
+                    worker,
+                    data.get("lease"),
+                    data.get("out_time", 0.0),
+                    data.get("fps", 0.0),
+                    data.get("speed", 0.0),
+                )
+                self._send_json({"continue": keep})
+            elif self.path == "/complete":
+                coordinator.complete(
+                    data["job_id"],
+                    worker,
+                    data.get("lease"),
+                    data.get("ok", False),
+                    data.get("encoder"),
+                    data.get("error"),
+                )
+                self._send_json({"ok": True})
+            else:
+                self.send_error(404)
+
+    return Handler
+
+
+def run_coordinator(coordinator, host="0.0.0.0", port=8765, token=None):
+    """启动 HTTP 服务直到所有文件完成（或被取消），返回汇总"""
+    coordinator.prepare()
+    server = ThreadingHTTPServer((host, port), make_handler(coordinator, token))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    coordinator.engine.emit("coordinator_ready", host=host, port=server.server_port)
+    while not coordinator.finished.wait(timeout=HEARTBEAT_INTERVAL):
+        coordinator.reap_expired()
+    # 留出时间让编码端收到 done 后退出
+    time.sleep(POLL_INTERVAL)
+    server.shutdown()
+    engine = coordinator.engine
+    engine.probe_cache.save()
+    summary = coordinator.summary
+    summary["cancelled"] = engine.cancelled
+    engine.emit(
+        "batch_done",
+        total=summary["total"],
+        success=summary["success"],
+        failed=len(summary["failed"]),
+        skipped=summary["skipped"],
+        cancelled=summary["cancelled"],
+    )
+    return summary
+
+
+class Worker:
+    """从协调端领取任务并在本机编码"""
+
+    def __init__(
+        self,
+        url,
+        name=None,
+        encoder_chain=None,
+        path_map=None,
+        fetch=False,
+        token=None,
+        threads=None,
+    ):
+        self.url = url.rstrip("/")
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.encoder_chain = encoder_chain or EncoderCapabilities().build_chain()
+        self.path_map = path_map or []
+        self.fetch = fetch
+        self.token = token
+        self.threads = threads
+        self.breaker = EncoderCircuitBreaker()
+        self.processes = ProcessTracker()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self.processes.kill_all()
+
+    def request(self, path, data=None, method="POST", body=None):
+        headers = {}
+        if self.token:
+            headers["X-Token"] = self.token
+        if data is not None:
+            body = json.dumps(dict(data, worker=self.name)).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(
+            self.url + path, data=body, headers=headers, method=method
+        )
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            return json.loads(resp.read() or b"{}")
+
+    def map_path(self, path):
+        for src, dst in self.path_map:
+            if path.startswith(src):
+                return dst + path[len(src) :]
+        return path
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                reply = self.request("/lease", {})
+            except OSError as e:
+                print(f"连接协调端失败: {e}", file=sys.stderr)
+                if self._stop_event.wait(POLL_INTERVAL):
+                    break
+                continue
+            job = reply.get("job")
+            if job is None:
+                if reply.get("done"):
+                    break
+                self._stop_event.wait(POLL_INTERVAL)
+                continue
+            ok, encoder, error = self.run_job(job)
+            try:
+                self.request(
+                    "/complete",
+                    {
+                        "job_id": job["id"],
+                        "lease": job["lease"],
+                        "ok": ok,
+                        "encoder": encoder,
+                        "error": error,
+                    },
+                )
+            except OSError as e:
+                print(f"上报结果失败: {e}", file=sys.stderr)
+
+    def run_job(self, job):
+        """执行一个任务，返回 (是否成功, 编码器, 错误信息)"""
+        workdir = tempfile.mkdtemp(prefix="hevc_worker_")
+        try:
+            if self.fetch:
+                source = os.path.join(workdir, "source" + os.path.splitext(job["source"])[1])
+                req = urllib.request.Request(
+                    f"{self.url}/source/{job['id']}",
+                    headers={"X-Token": self.token} if self.token else {},
+                )
+                with urllib.request.urlopen(req, timeout=60) as resp, open(source, "wb") as f:
+                    shutil.copyfileobj(resp, f, 1024 * 1024)
+                output = os.path.join(workdir, "output.mp4")
+            else:
+                source = self.map_path(job["source"])
+                output = self.map_path(job["output"])
+                os.makedirs(os.path.dirname(output), exist_ok=True)
+
+            ok, encoder, error = self.encode(job, source, output)
+            if ok and self.fetch:
+                with open(output, "rb") as f:
+                    req = urllib.request.Request(
+                        f"{self.url}/result/{job['lease']}",
+                        data=f,
+                        method="PUT",
+                        headers=dict(
+                            {"Content-Length": str(os.path.getsize(output))},
+                            **({"X-Token": self.token} if self.token else {}),
+                        ),
+                    )
+                    with urllib.request.urlopen(req, timeout=600) as resp:
+                        ok = json.loads(resp.read()).get("ok", False)
+            return ok, encoder, error
+        except Exception as e:
+            return False, None, str(e)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def encode(self, job, source, output):
+        last_beat = [0.0]
+        lost = threading.Event()
+
+        def on_progress(update):
+            now = time.monotonic()
+            if now - last_beat[0] < HEARTBEAT_INTERVAL and not update["end"]:
+                return
+            last_beat[0] = now
+            try:
+                reply = self.request(
+                    "/heartbeat",
+                    {
+                        "job_id": job["id"],
+                        "lease": job["lease"],
+                        "out_time": update["out_time"],
+                        "fps": update["fps"],
+                        "speed": update["speed"],
+                    },
+                )
+            except OSError:
+                return  # 暂时连不上时继续编码，由租约超时兜底
+            if not reply.get("continue", True):
+                # 任务已被重新分配或批次已取消
+                lost.set()
+                self.processes.kill_all()
+                self.processes.reset()
+
+        chain = [a for a in self.encoder_chain if not self.breaker.is_open(a["name"])]
+        error = None
+        for attempt in chain or self.encoder_chain[-1:]:
+            if self._stop_event.is_set() or lost.is_set():
+                break
+            if job["kind"] == "chunk":
+                # 分段只编码视频，音频和字幕在拼接时按流计划处理
+                cmd = build_ffmpeg_cmd(
+                    attempt, source, output, job["bitrate"], job["crf"], self.threads
+                )
+                cmd = build_chunk_cmd(cmd, job["start"], job["end"])
+            else:
+                cmd = build_ffmpeg_cmd(
+                    attempt,
+                    source,
+                    output,
+                    job["bitrate"],
+                    job["crf"],
+                    self.threads,
+                    streams=job.get("streams"),
+                )
+            returncode, tail = run_ffmpeg(
+                cmd,
+                on_progress=on_progress,
+                tail_lines=ERROR_TAIL_LINES,
+                tracker=self.processes,
+            )
+            if returncode == 0 and os.path.exists(output):
+                self.breaker.record_success(attempt["name"])
+                return True, attempt["name"], None
+            if lost.is_set() or self._stop_event.is_set():
+                break
+            self.breaker.record_failure(attempt["name"], tail, source)
+            error = f"{attempt['name']}: " + " | ".join(tail[-3:])
+        return False, None, error or "已取消"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="分布式 H.265/HEVC 批量转换")
+    parser.add_argument("--token", help="协调端与编码端之间的共享口令")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    coord = sub.add_parser("coordinator", help="扫描目录并分发任务")
+    coord.add_argument("input_dir", help="视频文件夹（编码端需能访问，或使用 --fetch）")
+    coord.add_argument("-o", "--output-dir", help="输出目录（默认: <input_dir>/Converted）")
+    coord.add_argument("--host", default="0.0.0.0")
+    coord.add_argument("--port", type=int, default=8765)
+    coord.add_argument("--resume", action="store_true", help="跳过清单中已完成的文件")
+    coord.add_argument(
+        "--lease-timeout", type=int, default=LEASE_TIMEOUT, help="无心跳多少秒后重新分配"
+    )
+    coord.add_argument(
+        "--chunk-min-duration",
+        type=float,
+        default=0,
+        metavar="SECONDS",
+        help="时长不少于该秒数的文件分段分发（默认 0: 整文件分发）",
+    )
+    coord.add_argument("--chunks", type=int, default=4, help="每个大文件的分段数")
+
+    work = sub.add_parser("worker", help="领取任务并在本机编码")
+    work.add_argument("url", help="协调端地址，例如 http://host:8765")
+    work.add_argument("--name", help="编码端名称（默认: 主机名-进程号）")
+    work.add_argument("--encoders", help="编码尝试顺序，逗号分隔（默认按实测能力）")
+    work.add_argument(
+        "--path-map",
+        action="append",
+        default=[],
+        metavar="SRC=DST",
+        help="把协调端路径前缀 SRC 映射为本机路径 DST，可多次指定",
+    )
+    work.add_argument(
+        "--fetch", action="store_true", help="不使用共享存储：下载源文件并上传结果"
+    )
+    work.add_argument("--threads", type=int, help="每个任务的编码线程数")
+    return parser.parse_args(argv)
+
+
+def print_event(event):
+    sys.stdout.write(json.dumps(event, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.mode == "coordinator":
+        engine = ConversionEngine(
+            args.input_dir,
+            output_dir=args.output_dir,
+            resume=args.resume,
+            encoder_chain=parse_encoder_chain("libx265"),  # 协调端本身不编码
+            on_event=print_event,
+        )
+        coordinator = Coordinator(
+            engine,
+            lease_timeout=args.lease_timeout,
+            chunk_min_duration=args.chunk_min_duration,
+            chunks=args.chunks,
+        )
+        signal.signal(signal.SIGINT, lambda signum, frame: coordinator.cancel())
+        signal.signal(signal.SIGTERM, lambda signum, frame: coordinator.cancel())
+        summary = run_coordinator(coordinator, args.host, args.port, args.token)
+        if summary["cancelled"]:
+            return 130
+        return 1 if summary["failed"] else 0
+
+    path_map = []
+    for item in args.path_map:
+        src, _, dst = item.partition("=")
+        path_map.append((src, dst))
+    worker = Worker(
+        args.url,
+        name=args.name,
+        encoder_chain=parse_encoder_chain(args.encoders) if args.encoders else None,
+        path_map=path_map,
+        fetch=args.fetch,
+        token=args.token,
+        threads=args.threads,
+    )
+    signal.signal(signal.SIGINT, lambda signum, frame: worker.stop())
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    worker.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
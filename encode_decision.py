@@ -0,0 +1,94 @@
+import os
+from media_probe import video_stream, get_video_codec
+from stream_plan import stream_args
+
+# 已是 HEVC 且码率不超过目标码率 × 该系数时不再重新编码
+BITRATE_TOLERANCE = 1.5
+# 编码结果不小于源文件 × 该比例时视为没有明显变小，放弃编码结果
+SIZE_GUARD = 0.9
+# 可直接作为输出的容器扩展名；其余容器需要转封装为 MP4
+MP4_EXTENSIONS = {".mp4", ".m4v"}
+
+SKIP = "skip"
+REMUX = "remux"
+ENCODE = "encode"
+# 编码结果没有明显变小，保留源文件
+KEPT = "kept"
+
+
+def parse_bitrate(value):
+    """把 "3000k"/"6M"/"3000000" 转为 bit/s，无法解析返回 None"""
+    if value in (None, "", "N/A"):
+        return None
+    text = str(value).strip().lower()
+    scale = 1
+    if text[-1:] in ("k", "m"):
+        scale = 1000 if text[-1] == "k" else 1000000
+        text = text[:-1]
+    try:
+        return int(float(text) * scale)
+    except ValueError:
+        return None
+
+
+def video_bitrate(info):
+    """视频流码率；MKV 等容器不提供流码率时用总码率减去音频码率估算"""
+    stream = video_stream(info)
+    if stream is None:
+        return None
+    bitrate = parse_bitrate(stream.get("bit_rate"))
+    if bitrate:
+        return bitrate
+    total = parse_bitrate((info.get("format") or {}).get("bit_rate"))
+    if not total:
+        return None
+    audio = sum(
+        parse_bitrate(s.get("bit_rate")) or 0
+        for s in info.get("streams", [])
+        if s.get("codec_type") == "audio"
+    )
+    return max(0, total - audio)
+
+
+def decide_action(info, path, target_bitrate, tolerance=BITRATE_TOLERANCE):
+    """根据探测信息决定 skip / remux / encode，返回 (动作, 原因)
+
+    已是 HEVC 且码率合理时不重新编码：MP4 容器直接跳过，其他容器用 -c copy
+    转封装为 MP4。码率未知时同样不重新编码，避免对已压缩的文件再次有损编码。
+    """
+    codec = get_video_codec(info).lower()
+    if codec != "hevc":
+        return ENCODE, f"视频编码为 {codec or '未知'}"
+    bitrate = video_bitrate(info)
+    target = parse_bitrate(target_bitrate)
+    if bitrate and target and bitrate > target * tolerance:
+        return ENCODE, (
+            f"HEVC 码率 {bitrate // 1000}k 高于目标 {target // 1000}k × {tolerance}"
+        )
+    rate = f"{bitrate // 1000}k" if bitrate else "未知"
+    if os.path.splitext(path)[1].lower() in MP4_EXTENSIONS:
+        return SKIP, f"已是 HEVC/MP4，码率 {rate}"
+    return REMUX, f"已是 HEVC，码率 {rate}，只需转封装"
+
+
+def build_remux_cmd(input_file, out_file, streams=None):
+    """不重新编码，把视频和音频流复制到 MP4 容器
+
+    streams 为流计划时按计划映射；MP4 不支持的音频仍会转码，视频始终直接复制。
+    """
+    cmd = ["ffmpeg", "-i", input_file]
+    if streams is None:
+        cmd += ["-map", "0:v:0", "-map", "0:a?", "-c", "copy"]
+    else:
+        cmd += ["-c", "copy"] + stream_args(streams)
+    return cmd + ["-tag:v", "hvc1", "-f", "mp4", out_file, "-y"]
+
+
+def is_meaningfully_smaller(input_file, out_file, ratio=SIZE_GUARD):
+    """输出小于源文件 × ratio 时返回 True；ratio 为 0 时关闭检查"""
+    if not ratio:
+        return True
+    try:
+        return os.path.getsize(out_file) < os.path.getsize(input_file) * ratio
+    except OSError:
+        return False
@@ -0,0 +1,340 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+from media_probe import CREATE_NO_WINDOW
+
+DEFAULT_CACHE_FILE = os.path.join(
+    os.path.expanduser("~"), ".hevc_converter", "encoder_caps.json"
+)
+# 试编码：2 秒 640x360 测试图像，足以验证编码器可用并估算速度
+TRIAL_SIZE = "640x360"
+TRIAL_RATE = 30
+TRIAL_SECONDS = 2
+TRIAL_TIMEOUT = 30
+
+# 编码尝试：hwaccel 为 None 时不加 -hwaccel；rate 为 "bitrate" 或 "crf"
+ENCODER_ATTEMPTS = {
+    "nvenc": {"hwaccel": "cuda", "codec": "hevc_nvenc", "rate": "bitrate"},
+    "amf": {"hwaccel": "d3d11va", "codec": "hevc_amf", "rate": "bitrate"},
+    "qsv": {"hwaccel": "d3d11va", "codec": "hevc_qsv", "rate": "bitrate"},
+    "vulkan": {"hwaccel": "vulkan", "codec": "libx265", "rate": "bitrate"},
+    "vulkan-x265": {"hwaccel": "vulkan", "codec": "libx265", "rate": "crf"},
+    "vulkan-scale": {
+        "hwaccel": "vulkan",
+        "codec": "libx265",
+        "rate": "crf",
+        "vf": "scale_vulkan",
+    },
+    "libx265": {"hwaccel": None, "codec": "libx265", "rate": "crf"},
+}
+GPU_ENCODERS = {"nvidia": "nvenc", "amd": "amf", "intel": "qsv"}
+
+
+def parse_encoder_chain(text):
+    """将 "nvenc,libx265" 之类的字符串解析为编码尝试列表"""
+    chain = []
+    for name in text.split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in ENCODER_ATTEMPTS:
+            raise ValueError(
+                f"未知编码器: {name}（可选: {', '.join(sorted(ENCODER_ATTEMPTS))}）"
+            )
+        chain.append(dict(ENCODER_ATTEMPTS[name], name=name))
+    return chain
+
+
+def video_encode_args(attempt, bitrate, crf, threads=None, preset="medium"):
+    """编码尝试对应的视频编码参数（编码器、线程、码率控制），不含输入和滤镜"""
+    args = ["-c:v", attempt["codec"]]
+    if threads:
+        args += ["-threads", str(threads)]
+        if attempt["codec"] == "libx265":
+            args += ["-x265-params", f"pools={threads}"]  # 限制 x265 线程池
+    if attempt["rate"] == "bitrate":
+        args += ["-rc_mode", "VBR_LATENCY", "-b:v", bitrate]
+    else:
+        args += ["-crf", str(crf), "-preset", preset]
+    return args
+
+
+def build_encoder_chain(gpu_type):
+    """根据显卡类型生成默认编码链：硬件编码，然后两级 Vulkan + libx265 回退"""
+    first = GPU_ENCODERS.get(gpu_type, "vulkan")
+    return parse_encoder_chain(f"{first},vulkan-x265,vulkan-scale")
+
+
+def detect_gpu():
+    """检测显卡类型，返回 "nvidia"/"amd"/"intel"，未识别返回 None"""
+    if os.name != "nt":
+        return None
+
+    def match_vendor(text):
+        if "NVIDIA" in text:
+            return "nvidia"
+        elif "AMD" in text or "Radeon" in text:
+            return "amd"
+        elif "Intel" in text:
+            return "intel"
+        return None
+
+    # 方法1: 使用dxdiag命令检测，报告写入临时目录，不在当前目录留下文件
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            report = os.path.join(tmp_dir, "dxdiag.txt")
+            subprocess.run(
+                ["dxdiag", "/t", report],
+                capture_output=True,
+                text=True,
+                creationflags=CREATE_NO_WINDOW,
+                timeout=10,
+            )
+
+            if os.path.exists(report):
+                with open(report, "r", encoding="utf-16") as f:
+                    dxdiag = f.read()
+
+                vendor = match_vendor(dxdiag)
+                if vendor:
+                    return vendor
+    except Exception as e:
+        print(f"dxdiag检测失败: {e}", file=sys.stderr)
+
+    # 方法2: 使用wmic命令检测
+    try:
+        result = subprocess.run(
+            ["wmic", "path", "win32_VideoController", "get", "name"],
+            capture_output=True,
+            text=True,
+            creationflags=CREATE_NO_WINDOW,
+            timeout=5,
+        )
+        if result.returncode == 0:
+            return match_vendor(result.stdout)
+    except Exception as e:
+        print(f"wmic检测失败: {e}", file=sys.stderr)
+    return None
+
+
+def ffmpeg_identity(ffmpeg="ffmpeg"):
+    """返回能区分 ffmpeg 构建的标识：路径 + 版本行 + 文件修改时间，找不到时返回 None"""
+    path = shutil.which(ffmpeg)
+    if not path:
+        return None
+    try:
+        result = subprocess.run(
+            [path, "-hide_banner", "-version"],
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            creationflags=CREATE_NO_WINDOW,
+            timeout=10,
+        )
+        version = (result.stdout.splitlines() or [""])[0].strip()
+        return f"{path}|{version}|{os.stat(path).st_mtime_ns}"
+    except Exception as e:
+        print(f"获取ffmpeg版本失败: {e}", file=sys.stderr)
+        return None
+
+
+def _list_names(ffmpeg, option, parse_line):
+    try:
+        result = subprocess.run(
+            [ffmpeg, "-hide_banner", option],
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            creationflags=CREATE_NO_WINDOW,
+            timeout=10,
+        )
+    except Exception as e:
+        print(f"ffmpeg {option} 执行失败: {e}", file=sys.stderr)
+        return set()
+    names = set()
+    for line in result.stdout.splitlines():
+        name = parse_line(line)
+        if name:
+            names.add(name)
+    return names
+
+
+def list_encoders(ffmpeg="ffmpeg", kind="V"):
+    # 形如 " V....D libx265              libx265 H.265 / HEVC"；kind 为 V(视频)/A(音频)
+    def parse_line(line):
+        parts = line.split()
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] == kind:
+            return parts[1]
+        return None
+
+    return _list_names(ffmpeg, "-encoders", parse_line)
+
+
+def list_hwaccels(ffmpeg="ffmpeg"):
+    def parse_line(line):
+        line = line.strip()
+        if line and not line.endswith(":"):
+            return line
+        return None
+
+    return _list_names(ffmpeg, "-hwaccels", parse_line)
+
+
+def list_filters(ffmpeg="ffmpeg"):
+    # 形如 " ... scale_vulkan      V->V       Scale Vulkan frames"
+    def parse_line(line):
+        parts = line.split()
+        if len(parts) >= 3 and "->" in parts[2]:
+            return parts[1]
+        return None
+
+    return _list_names(ffmpeg, "-filters", parse_line)
+
+
+def trial_encode(attempt, ffmpeg="ffmpeg"):
+    """用 lavfi testsrc 试编码，返回 {"works", "fps", "error"}"""
+    cmd = [ffmpeg, "-hide_banner", "-nostdin", "-v", "error"]
+    cmd += [
+        "-f",
+        "lavfi",
+        "-i",
+        f"testsrc=size={TRIAL_SIZE}:rate={TRIAL_RATE}",
+        "-t",
+        str(TRIAL_SECONDS),
+        "-c:v",
+        attempt["codec"],
+    ]
+    if attempt["rate"] == "bitrate":
+        cmd += ["-rc_mode", "VBR_LATENCY", "-b:v", "1000k"]
+    else:
+        cmd += ["-crf", "28", "-preset", "medium"]
+    cmd += ["-f", "null", "-"]
+    started = time.monotonic()
+    try:
+        result = subprocess.run(
+            cmd,
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            creationflags=CREATE_NO_WINDOW,
+            timeout=TRIAL_TIMEOUT,
+        )
+    except Exception as e:
+        return {"works": False, "fps": 0.0, "error": str(e)}
+    elapsed = max(time.monotonic() - started, 1e-3)
+    if result.returncode != 0:
+        error = (result.stderr.strip().splitlines() or [""])[-1]
+        return {"works": False, "fps": 0.0, "error": error}
+    return {
+        "works": True,
+        "fps": round(TRIAL_RATE * TRIAL_SECONDS / elapsed, 1),
+        "error": None,
+    }
+
+
+def measure_capabilities(ffmpeg="ffmpeg"):
+    """检测每种编码尝试在当前 ffmpeg 上是否可用及其速度"""
+    encoders = list_encoders(ffmpeg)
+    hwaccels = list_hwaccels(ffmpeg)
+    filters = list_filters(ffmpeg)
+    trials = {}  # 相同编码器和码率模式只试编码一次
+    caps = {}
+    for name, attempt in ENCODER_ATTEMPTS.items():
+        if attempt["codec"] not in encoders:
+            caps[name] = {"works": False, "fps": 0.0, "error": "ffmpeg 未编译该编码器"}
+            continue
+        if attempt.get("hwaccel") and attempt["hwaccel"] not in hwaccels:
+            caps[name] = {
+                "works": False,
+                "fps": 0.0,
+                "error": f"ffmpeg 不支持 -hwaccel {attempt['hwaccel']}",
+            }
+            continue
+        if attempt.get("vf") and attempt["vf"] not in filters:
+            caps[name] = {"works": False, "fps": 0.0, "error": f"缺少滤镜 {attempt['vf']}"}
+            continue
+        key = (attempt["codec"], attempt["rate"])
+        if key not in trials:
+            trials[key] = trial_encode(attempt, ffmpeg)
+        caps[name] = dict(trials[key])
+    return caps
+
+
+class EncoderCapabilities:
+    """编码器能力表，按 ffmpeg 构建缓存到磁盘，换了 ffmpeg 才重新试编码"""
+
+    def __init__(self, cache_file=DEFAULT_CACHE_FILE, ffmpeg="ffmpeg"):
+        self.cache_file = cache_file
+        self.ffmpeg = ffmpeg
+        self._lock = threading.Lock()
+        self.caps = None
+
+    def load(self, refresh=False):
+        with self._lock:
+            if self.caps is not None and not refresh:
+                return self.caps
+            identity = ffmpeg_identity(self.ffmpeg)
+            if identity is None:
+                self.caps = {}
+                return self.caps
+            cache = self._read_cache()
+            if not refresh and identity in cache:
+                self.caps = cache[identity]
+                return self.caps
+            self.caps = measure_capabilities(self.ffmpeg)
+            cache[identity] = self.caps
+            self._write_cache(cache)
+            return self.caps
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_cache(self, cache):
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_file = self.cache_file + ".tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(cache, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            print(f"保存编码器能力缓存失败: {e}", file=sys.stderr)
+
+    def build_chain(self):
+        """按实测结果生成编码链：可用的硬件编码器按速度排序，libx265 兜底
+
+        ffmpeg 不可用或没有任何可用编码器时，退回到按显卡厂商猜测的编码链。
+        """
+        caps = self.load()
+        hardware = [
+            name
+            for name, attempt in ENCODER_ATTEMPTS.items()
+            if attempt["codec"] != "libx265" and caps.get(name, {}).get("works")
+        ]
+        hardware.sort(key=lambda name: caps[name]["fps"], reverse=True)
+        names = hardware
+        if caps.get("libx265", {}).get("works"):
+            names = names + ["libx265"]
+        if not names:
+            return build_encoder_chain(detect_gpu())
+        return parse_encoder_chain(",".join(names))
+
+    def describe(self):
+        caps = self.load()
+        working = [
+            f"{name} ({info['fps']:.0f} fps)"
+            for name, info in caps.items()
+            if info.get("works")
+        ]
+        return ", ".join(working) if working else "无可用编码器"
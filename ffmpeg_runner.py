@@ -0,0 +1,85 @@
+import subprocess
+import threading
+from collections import deque
+from media_probe import CREATE_NO_WINDOW
+
+
+def parse_out_time(state):
+    """从 -progress 输出中取已编码的时长(秒)"""
+    for key in ("out_time_us", "out_time_ms"):  # 两者单位都是微秒
+        try:
+            return max(0.0, int(state[key]) / 1000000)
+        except (KeyError, ValueError):
+            pass
+    try:
+        h, m, sec = state["out_time"].split(":")
+        return max(0.0, int(h) * 3600 + int(m) * 60 + float(sec))
+    except (KeyError, ValueError):
+        return 0.0
+
+
+def parse_float(value):
+    try:
+        return float(str(value).rstrip("x"))
+    except (TypeError, ValueError):
+        return 0.0  # 开始阶段 fps/speed 为 "N/A"
+
+
+def run_ffmpeg(cmd, on_progress=None, log=None, tail_lines=50, tracker=None):
+    """运行 ffmpeg 并逐块解析 -progress 输出
+
+    on_progress 在每个进度块结束时以 {"out_time", "fps", "speed", "end"} 调用。
+    log 为以二进制模式打开的日志文件，stderr 原样逐行写入，内存中只保留末尾。
+    tracker 为 ProcessTracker 时登记子进程，以便取消时结束。
+    返回 (退出码, stderr 最后若干行)。
+    """
+    cmd = [cmd[0], "-nostdin", "-nostats", "-progress", "pipe:1"] + list(cmd[1:])
+    proc = subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        creationflags=CREATE_NO_WINDOW,
+    )
+    if tracker is not None:
+        tracker.register(proc)
+    try:
+        return _read_ffmpeg_output(proc, on_progress, log, tail_lines)
+    finally:
+        if tracker is not None:
+            tracker.unregister(proc)
+
+
+def _read_ffmpeg_output(proc, on_progress, log, tail_lines):
+    # stderr 必须并行读取，否则管道写满会阻塞 ffmpeg
+    tail = deque(maxlen=tail_lines)
+
+    def drain_stderr():
+        for raw in proc.stderr:
+            if log is not None:
+                log.write(raw)
+            tail.append(raw.decode("utf-8", errors="replace").rstrip())
+
+    reader = threading.Thread(target=drain_stderr, daemon=True)
+    reader.start()
+
+    state = {}
+    for raw in proc.stdout:
+        key, _, value = raw.decode("utf-8", errors="replace").strip().partition("=")
+        if key != "progress":
+            state[key] = value
+            continue
+        if on_progress:
+            on_progress(
+                {
+                    "out_time": parse_out_time(state),
+                    "fps": parse_float(state.get("fps")),
+                    "speed": parse_float(state.get("speed")),
+                    "end": value == "end",
+                }
+            )
+        state = {}
+
+    proc.wait()
+    reader.join()
+    return proc.returncode, list(tail)
@@ -0,0 +1,290 @@
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+METRICS_NAME = "metrics.jsonl"
+PROM_PREFIX = "hevc_converter"
+
+
+class ScanProbe:
+    """扫描阶段对一个文件的探测：开始时间、调用次数、缓存未命中次数和用时
+
+    扫描时只为每个文件保留这个小对象（放在 ScanJob 上），
+    文件进入编码队列时再并入它的 JobMetrics。
+    """
+
+    __slots__ = ("start", "calls", "misses", "seconds")
+
+    def __init__(self):
+        self.start = time.time()
+        self.calls = 0
+        self.misses = 0
+        self.seconds = 0.0
+
+    def add(self, seconds, cached):
+        self.calls += 1
+        self.misses += 0 if cached else 1
+        self.seconds += seconds
+
+
+class JobMetrics:
+    """单个文件的分阶段计时：探测、每次编码尝试、校验等
+
+    每个阶段记录开始时间戳(time.time)和用时，编码尝试另记编码器和退出码。
+    分段编码时多个线程同时写入，操作都加锁。
+    """
+
+    def __init__(self, path, queued=None):
+        self.path = path
+        self.queued = queued or time.time()
+        self.started = None
+        self.stages = []
+        self.probe_calls = 0
+        self.probe_misses = 0
+        self.probe_time = 0.0
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.started is None:
+                self.started = time.time()
+
+    def add_probe(self, seconds, cached):
+        with self._lock:
+            self.probe_calls += 1
+            self.probe_misses += 0 if cached else 1
+            self.probe_time += seconds
+
+    def add_scan_probe(self, probe):
+        """并入扫描阶段的探测，记为带开始时间的 probe 阶段"""
+        with self._lock:
+            self.probe_calls += probe.calls
+            self.probe_misses += probe.misses
+            self.probe_time += probe.seconds
+        self.add_stage(
+            "probe", probe.start, probe.seconds, calls=probe.calls, misses=probe.misses
+        )
+
+    def add_stage(self, stage, start, seconds, **extra):
+        record = {"stage": stage, "start": round(start, 3), "seconds": round(seconds, 3)}
+        record.update(extra)
+        with self._lock:
+            self.stages.append(record)
+        return record
+
+    @contextmanager
+    def stage(self, stage, **extra):
+        """计时一个阶段；with 块内可向返回的字典补充字段（如退出码）"""
+        start = time.time()
+        started = time.monotonic()
+        fields = dict(extra)
+        try:
+            yield fields
+        finally:
+            self.add_stage(stage, start, time.monotonic() - started, **fields)
+
+    def to_record(self, status, duration=0.0, bytes_in=None, bytes_out=None):
+        finished = time.time()
+        with self._lock:
+            started = self.started or self.queued
+            stages = list(self.stages)
+            probe = {
+                "calls": self.probe_calls,
+                "misses": self.probe_misses,
+                "seconds": round(self.probe_time, 3),
+            }
+        wall = finished - started
+        return {
+            "type": "job",
+            "file": self.path,
+            "status": status,
+            "queued": round(self.queued, 3),
+            "started": round(started, 3),
+            "finished": round(finished, 3),
+            "wall": round(wall, 3),
+            "duration": round(duration or 0.0, 3),
+            "realtime": round(duration / wall, 3) if duration and wall > 0 else None,
+            "bytes_in": bytes_in,
+            "bytes_out": bytes_out,
+            "probe": probe,
+            "stages": stages,
+        }
+
+
+class BatchMetrics:
+    """一次批量转换的指标：每个文件完成时追加一行 JSON，结束时追加批次汇总
+
+    textfile 不为 None 时另写 Prometheus textfile collector 格式的汇总，
+    供 node_exporter 采集。
+    """
+
+    def __init__(self, path=None, textfile=None):
+        self.path = path
+        self.textfile = textfile
+        self.started = time.time()
+        self.scan_seconds = None
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._scanning = {}  # 正在扫描的文件 -> ScanProbe
+        self._totals = {}
+        self._counts = {}
+        self._bytes = {"in": 0, "out": 0}
+        self._media_seconds = 0.0
+        self._probe = {"calls": 0, "misses": 0, "seconds": 0.0}
+
+    def job(self, path):
+        with self._lock:
+            job = self._jobs.get(path)
+            if job is None:
+                job = self._jobs[path] = JobMetrics(path)
+            return job
+
+    def enqueue(self, path, probe=None, queued=None):
+        """文件进入编码队列时建立记录，probe 为扫描阶段的 ScanProbe"""
+        job = JobMetrics(path, queued)
+        if probe is not None:
+            job.add_scan_probe(probe)
+        with self._lock:
+            self._jobs[path] = job
+        return job
+
+    @contextmanager
+    def scanning(self, path):
+        """扫描一个文件期间的探测累计到返回的 ScanProbe，不为每个文件建完整记录"""
+        probe = ScanProbe()
+        with self._lock:
+            self._scanning[path] = probe
+        try:
+            yield probe
+        finally:
+            with self._lock:
+                self._scanning.pop(path, None)
+
+    def add_probe(self, path, seconds, cached):
+        """探测计入已入队的文件或正在扫描的文件，都不是时计入批次汇总"""
+        with self._lock:
+            job = self._jobs.get(path)
+            if job is None:
+                probe = self._scanning.get(path)
+                if probe is not None:
+                    probe.add(seconds, cached)
+                    return
+                self._probe["calls"] += 1
+                self._probe["misses"] += 0 if cached else 1
+                self._probe["seconds"] += seconds
+                return
+        job.add_probe(seconds, cached)
+
+    def scan_done(self):
+        if self.scan_seconds is None:
+            self.scan_seconds = round(time.time() - self.started, 3)
+
+    def finish(self, path, status, duration=0.0, bytes_in=None, bytes_out=None):
+        """文件处理结束：写入该文件的指标并计入批次汇总"""
+        with self._lock:
+            job = self._jobs.pop(path, None)
+            # 扫描时就跳过的文件没有入队记录，只带上扫描阶段的探测
+            probe = self._scanning.pop(path, None) if job is None else None
+        if job is None:
+            job = JobMetrics(path)
+            if probe is not None:
+                job.add_scan_probe(probe)
+        record = job.to_record(status, duration, bytes_in, bytes_out)
+        with self._lock:
+            self._counts[status] = self._counts.get(status, 0) + 1
+            for stage in record["stages"]:
+                self._totals[stage["stage"]] = (
+                    self._totals.get(stage["stage"], 0.0) + stage["seconds"]
+                )
+            self._bytes["in"] += bytes_in or 0
+            self._bytes["out"] += bytes_out or 0
+            if status == "success":
+                self._media_seconds += duration or 0.0
+            for key in ("calls", "misses", "seconds"):
+                self._probe[key] += record["probe"][key]
+        self._append(record)
+        return record
+
+    def summary(self, cancelled=False):
+        wall = time.time() - self.started
+        with self._lock:
+            return {
+                "type": "batch",
+                "started": round(self.started, 3),
+                "wall": round(wall, 3),
+                "scan_seconds": self.scan_seconds,
+                "files": dict(self._counts),
+                "stage_seconds": {k: round(v, 3) for k, v in self._totals.items()},
+                "probe": dict(self._probe, seconds=round(self._probe["seconds"], 3)),
+                "bytes_in": self._bytes["in"],
+                "bytes_out": self._bytes["out"],
+                "media_seconds": round(self._media_seconds, 3),
+                "realtime": round(self._media_seconds / wall, 3) if wall > 0 else None,
+                "cancelled": cancelled,
+            }
+
+    def write_summary(self, cancelled=False):
+        summary = self.summary(cancelled)
+        self._append(summary)
+        if self.textfile:
+            self.write_textfile(summary)
+        return summary
+
+    def _append(self, record):
+        if not self.path:
+            return
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except Exception as e:
+                print(f"写入指标失败: {e}", file=sys.stderr)
+
+    def write_textfile(self, summary):
+        """原子写入 Prometheus textfile，node_exporter 不会读到写了一半的文件"""
+        p = PROM_PREFIX
+        lines = [
+            f"# HELP {p}_files Files in the last batch by result.",
+            f"# TYPE {p}_files gauge",
+        ]
+        for status, count in sorted(summary["files"].items()):
+            lines.append(f'{p}_files{{status="{status}"}} {count}')
+        lines += [
+            f"# HELP {p}_stage_seconds Time spent per stage in the last batch.",
+            f"# TYPE {p}_stage_seconds gauge",
+        ]
+        stages = dict(summary["stage_seconds"], probe=summary["probe"]["seconds"])
+        if summary["scan_seconds"] is not None:
+            stages["scan"] = summary["scan_seconds"]
+        for stage, seconds in sorted(stages.items()):
+            lines.append(f'{p}_stage_seconds{{stage="{stage}"}} {seconds}')
+        lines += [
+            f"# HELP {p}_bytes Bytes read and written in the last batch.",
+            f"# TYPE {p}_bytes gauge",
+            f'{p}_bytes{{direction="in"}} {summary["bytes_in"]}',
+            f'{p}_bytes{{direction="out"}} {summary["bytes_out"]}',
+            f"# HELP {p}_probe_misses ffprobe runs not served from the cache.",
+            f"# TYPE {p}_probe_misses gauge",
+            f"{p}_probe_misses {summary['probe']['misses']}",
+            f"# HELP {p}_batch_wall_seconds Wall time of the last batch.",
+            f"# TYPE {p}_batch_wall_seconds gauge",
+            f"{p}_batch_wall_seconds {summary['wall']}",
+            f"# HELP {p}_realtime_factor Media seconds converted per wall second.",
+            f"# TYPE {p}_realtime_factor gauge",
+            f"{p}_realtime_factor {summary['realtime'] or 0}",
+            f"# HELP {p}_last_batch_timestamp_seconds End time of the last batch.",
+            f"# TYPE {p}_last_batch_timestamp_seconds gauge",
+            f"{p}_last_batch_timestamp_seconds {round(time.time(), 3)}",
+        ]
+        try:
+            os.makedirs(os.path.dirname(self.textfile) or ".", exist_ok=True)
+            tmp_file = self.textfile + ".tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp_file, self.textfile)
+        except Exception as e:
+            print(f"写入 Prometheus textfile 失败: {e}", file=sys.stderr)
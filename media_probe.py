@@ -0,0 +1,215 @@
+import os
+import sys
+import json
+import subprocess
+import threading
+from fractions import Fraction
+
+# 防止弹出控制台窗口；非 Windows 平台不支持 creationflags
+CREATE_NO_WINDOW = 0x08000000 if os.name == "nt" else 0
+CACHE_VERSION = 2  # 2: 保留 format.start_time
+DEFAULT_CACHE_FILE = os.path.join(
+    os.path.expanduser("~"), ".hevc_converter", "probe_cache.json"
+)
+
+# 只保留后续流程需要的字段，避免缓存文件过大
+FORMAT_KEYS = (
+    "format_name",
+    "start_time",
+    "duration",
+    "bit_rate",
+    "size",
+    "nb_streams",
+)
+STREAM_KEYS = (
+    "index",
+    "codec_type",
+    "codec_name",
+    "profile",
+    "width",
+    "height",
+    "pix_fmt",
+    "r_frame_rate",
+    "avg_frame_rate",
+    "duration",
+    "bit_rate",
+    "nb_frames",
+    "channels",
+    "sample_rate",
+)
+
+
+def run_ffprobe(path, tracker=None):
+    """对文件执行一次 ffprobe，返回精简后的 format/streams 信息，失败返回 None
+
+    tracker 为 ProcessTracker 时登记子进程，以便取消时结束。
+    """
+    try:
+        proc = subprocess.Popen(
+            [
+                "ffprobe",
+                "-v",
+                "error",
+                "-show_format",
+                "-show_streams",
+                "-of",
+                "json",
+                path,
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            creationflags=CREATE_NO_WINDOW,
+        )
+        if tracker is not None:
+            tracker.register(proc)
+        try:
+            stdout, _ = proc.communicate()
+        finally:
+            if tracker is not None:
+                tracker.unregister(proc)
+        if proc.returncode != 0:
+            return None
+        raw = json.loads(stdout.decode("utf-8", errors="replace") or "{}")
+    except Exception as e:
+        print(f"ffprobe执行失败: {e}", file=sys.stderr)
+        return None
+
+    fmt = raw.get("format", {})
+    return {
+        "format": {k: fmt[k] for k in FORMAT_KEYS if k in fmt},
+        "streams": [
+            {k: s[k] for k in STREAM_KEYS if k in s} for s in raw.get("streams", [])
+        ],
+    }
+
+
+class ProbeCache:
+    """ffprobe 结果缓存，以 (路径, 大小, 修改时间) 为键并持久化到磁盘"""
+
+    def __init__(self, cache_file=DEFAULT_CACHE_FILE):
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                self._entries = data.get("entries", {})
+        except Exception as e:
+            print(f"读取探测缓存失败: {e}", file=sys.stderr)
+
+    def save(self):
+        if not self.cache_file or not self._dirty:
+            return
+        with self._lock:
+            data = {"version": CACHE_VERSION, "entries": dict(self._entries)}
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_file = self.cache_file + ".tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            print(f"保存探测缓存失败: {e}", file=sys.stderr)
+
+    def is_cached(self, path):
+        """文件未变化且已有缓存的探测结果时返回 True"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(path))
+        return (
+            bool(entry)
+            and entry["size"] == st.st_size
+            and entry["mtime"] == st.st_mtime_ns
+        )
+
+    def probe(self, path, tracker=None):
+        """返回文件的探测信息；文件未变化时直接使用缓存，不再启动 ffprobe"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime_ns:
+            return entry["info"]
+
+        info = run_ffprobe(path, tracker)
+        if tracker is not None and tracker.cancelled:
+            return info  # 被取消结束的探测结果不可信，不写入缓存
+        with self._lock:
+            self._entries[key] = {
+                "size": st.st_size,
+                "mtime": st.st_mtime_ns,
+                "info": info,
+            }
+            self._dirty = True
+        return info
+
+
+def parse_rate(rate):
+    try:
+        value = Fraction(rate)
+        return float(value) if value > 0 else 0.0
+    except (TypeError, ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def video_stream(info):
+    if not info:
+        return None
+    for stream in info.get("streams", []):
+        if stream.get("codec_type") == "video":
+            return stream
+    return None
+
+
+def is_valid_video(info):
+    return video_stream(info) is not None
+
+
+def get_dimensions(info, default=(1920, 1080, 30)):
+    """返回 (宽, 高, 帧率)，信息缺失时使用默认值"""
+    stream = video_stream(info)
+    if not stream or not stream.get("width") or not stream.get("height"):
+        return default
+    framerate = parse_rate(stream.get("r_frame_rate")) or parse_rate(
+        stream.get("avg_frame_rate")
+    )
+    return stream["width"], stream["height"], framerate or default[2]
+
+
+def get_duration(info):
+    if not info:
+        return 0.0
+    try:
+        return float(info.get("format", {}).get("duration", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def get_start_time(info):
+    """容器的起始时间戳（秒）；mkv/flv/wmv 等常不为 0，缺失时按 0 处理"""
+    if not info:
+        return 0.0
+    try:
+        return float(info.get("format", {}).get("start_time", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def get_video_codec(info):
+    stream = video_stream(info)
+    return stream.get("codec_name", "") if stream else ""
@@ -0,0 +1,44 @@
+import sys
+import threading
+
+
+class ProcessTracker:
+    """记录正在运行的 ffmpeg/ffprobe 子进程，取消时统一结束"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._procs = set()
+        self.cancelled = False
+
+    def register(self, proc):
+        with self._lock:
+            if not self.cancelled:
+                self._procs.add(proc)
+                return
+        # 取消之后才启动的进程立即结束
+        self._kill(proc)
+
+    def unregister(self, proc):
+        with self._lock:
+            self._procs.discard(proc)
+
+    def kill_all(self):
+        with self._lock:
+            self.cancelled = True
+            procs = list(self._procs)
+            self._procs.clear()
+        for proc in procs:
+            self._kill(proc)
+
+    def reset(self):
+        with self._lock:
+            self.cancelled = False
+
+    @staticmethod
+    def _kill(proc):
+        # 输出文件会被删除，直接 kill，不等待 ffmpeg 收尾
+        try:
+            if proc.poll() is None:
+                proc.kill()
+        except Exception as e:
+            print(f"结束子进程失败: {e}", file=sys.stderr)
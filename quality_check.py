@@ -0,0 +1,130 @@
+import re
+import sys
+import functools
+import subprocess
+from encoder_caps import list_filters
+from media_probe import CREATE_NO_WINDOW
+
+SAMPLE_WINDOWS = 3  # 抽样窗口数，0 为关闭质量检测
+SAMPLE_SECONDS = 4.0  # 每个窗口的时长
+# 各指标的默认质量下限（取各窗口最低分比较）
+DEFAULT_FLOORS = {"ssim": 0.95, "vmaf": 90.0}
+QUALITY_ACTIONS = ("flag", "reencode")
+QUALITY_TIMEOUT = 300
+
+SSIM_PATTERN = re.compile(r"SSIM .*All:([0-9.]+)")
+VMAF_PATTERN = re.compile(r"VMAF score[:=]\s*([0-9.]+)")
+
+
+@functools.lru_cache(maxsize=None)
+def quality_metric(ffmpeg="ffmpeg"):
+    """ffmpeg 编译了 libvmaf 时用 VMAF，否则用 SSIM"""
+    return "vmaf" if "libvmaf" in list_filters(ffmpeg) else "ssim"
+
+
+def sample_windows(duration, count=SAMPLE_WINDOWS, length=SAMPLE_SECONDS):
+    """在片头片尾之外均匀选取 count 个窗口，返回 [(开始, 时长)]"""
+    if not duration or count <= 0:
+        return []
+    if duration <= length * count:
+        return [(0.0, duration)]  # 短视频直接全片比较
+    step = duration / (count + 1)
+    return [(step * (i + 1) - length / 2, length) for i in range(count)]
+
+
+def build_quality_cmd(
+    reference, distorted, start, length, metric, width, height, distorted_start=None
+):
+    """比较两个文件同一时间窗口的画面质量，结果输出到 stderr
+
+    输入端的 -ss 从各自容器的起始时间算起，并把定位点平移为 0，两个输入因此共用
+    同一时间原点，比较滤镜按时间戳配对画面。不能再用 setpts=PTS-STARTPTS 把各自的
+    第一帧对齐：源文件视频流的 start_time 晚于容器起点时（mkv/flv/wmv 常见），
+    CFR 编码会在开头补出重复帧，两路画面会错开。编码结果开头没有对应源画面的补帧
+    不参与评分。输出缩放到源分辨率后再比较。
+    distorted 为单独编码的片段时用 distorted_start 指定它的起点（通常为 0）。
+    """
+    compare = "libvmaf" if metric == "vmaf" else "ssim"
+    graph = (
+        f"[0:v]scale={width}:{height}:flags=bicubic,format=yuv420p[dist];"
+        f"[1:v]format=yuv420p[ref];"
+        f"[dist][ref]{compare}"
+    )
+    window = ["-ss", f"{start:.3f}", "-t", f"{length:.3f}"]
+    if distorted_start is None:
+        distorted_start = start
+    return (
+        ["ffmpeg", "-hide_banner", "-nostdin"]
+        + ["-ss", f"{distorted_start:.3f}", "-t", f"{length:.3f}"]
+        + ["-i", distorted]
+        + window
+        + ["-i", reference, "-lavfi", graph, "-an", "-f", "null", "-"]
+    )
+
+
+def parse_score(output, metric):
+    pattern = VMAF_PATTERN if metric == "vmaf" else SSIM_PATTERN
+    matches = pattern.findall(output)
+    return float(matches[-1]) if matches else None
+
+
+def run_quality_cmd(cmd, metric, tracker=None):
+    """执行一次质量比较，返回分数；失败或超时返回 None"""
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            creationflags=CREATE_NO_WINDOW,
+        )
+        if tracker is not None:
+            tracker.register(proc)
+        try:
+            _, stderr = proc.communicate(timeout=QUALITY_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            return None
+        finally:
+            if tracker is not None:
+                tracker.unregister(proc)
+    except Exception as e:
+        print(f"质量检测失败: {e}", file=sys.stderr)
+        return None
+    if proc.returncode != 0:
+        return None
+    score = parse_score(stderr.decode("utf-8", errors="replace"), metric)
+    return round(score, 4) if score is not None else None
+
+
+def measure_quality(
+    reference,
+    distorted,
+    duration,
+    width,
+    height,
+    metric=None,
+    windows=SAMPLE_WINDOWS,
+    tracker=None,
+):
+    """在若干抽样窗口上计算 SSIM/VMAF，返回 {"metric", "score", "windows"}
+
+    score 为各窗口中的最低分；无法计算时返回 None。
+    """
+    metric = metric or quality_metric()
+    scores = []
+    for start, length in sample_windows(duration, windows):
+        cmd = build_quality_cmd(reference, distorted, start, length, metric, width, height)
+        score = run_quality_cmd(cmd, metric, tracker)
+        if score is not None:
+            scores.append(score)
+    if not scores:
+        return None
+    return {"metric": metric, "score": min(scores), "windows": scores}
+
+
+def boost_params(bitrate, crf):
+    """质量不达标时重新编码使用的参数：码率提高一半，CRF 降低 3"""
+    num = int(bitrate[:-1])
+    return f"{int(num * 1.5)}k", max(0, crf - 3)
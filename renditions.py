@@ -0,0 +1,112 @@
+import os
+import re
+from encoder_caps import video_encode_args
+from stream_plan import stream_args
+
+THUMB_COUNT = 10  # 缩略图条中的画面数
+THUMB_COLUMNS = 5
+THUMB_WIDTH = 320
+PROXY_AUDIO = ["-c:a", "aac", "-b:a", "128k"]  # 代理文件只带第一条音轨
+HEIGHT_PATTERN = re.compile(r"^(\d{3,4})p$")
+
+
+def parse_renditions(text):
+    """把 "720p,thumbs" 解析为附加输出列表；全分辨率 HEVC 始终输出，不需要列出"""
+    renditions = []
+    for name in text.split(","):
+        name = name.strip().lower()
+        if not name:
+            continue
+        match = HEIGHT_PATTERN.match(name)
+        if match:
+            renditions.append({"name": name, "kind": "video", "height": int(match[1])})
+        elif name == "thumbs":
+            renditions.append({"name": name, "kind": "thumbs"})
+        else:
+            raise ValueError(f"未知输出规格: {name}（可选: 720p 等高度、thumbs）")
+    return renditions
+
+
+def rendition_file(out_file, rendition):
+    """附加输出与主输出放在同一目录：x_hevc_720p.mp4、x_thumbs.jpg"""
+    base = os.path.splitext(out_file)[0]
+    if rendition["kind"] == "thumbs":
+        if base.endswith("_hevc"):
+            base = base[: -len("_hevc")]
+        return f"{base}_thumbs.jpg"
+    return f"{base}_{rendition['name']}.mp4"
+
+
+def scaled_size(width, height, target_height):
+    """按高度等比缩放，宽高取偶数；源分辨率不高于目标时返回 None（不放大）"""
+    if not width or not height or height <= target_height:
+        return None
+    scaled_width = int(round(width * target_height / height / 2)) * 2
+    return scaled_width, target_height - target_height % 2
+
+
+def build_filter_graph(attempt, outputs, duration):
+    """一次解码、split 分给各个输出：[vmain] 为主输出，其余按 outputs 顺序编号"""
+    labels = ["[vmain_in]"] + [f"[r{i}_in]" for i in range(len(outputs))]
+    parts = [f"[0:v]split={len(labels)}{''.join(labels)}"]
+    main_filter = attempt.get("vf") or "null"
+    parts.append(f"[vmain_in]{main_filter}[vmain]")
+    for i, output in enumerate(outputs):
+        if output["rendition"]["kind"] == "thumbs":
+            rate = THUMB_COUNT / duration if duration else 1.0
+            rows = -(-THUMB_COUNT // THUMB_COLUMNS)
+            parts.append(
+                f"[r{i}_in]fps={rate:.6f},scale={THUMB_WIDTH}:-2,"
+                f"tile={THUMB_COLUMNS}x{rows}[r{i}]"
+            )
+        else:
+            width, height = output["size"]
+            parts.append(f"[r{i}_in]scale={width}:{height}[r{i}]")
+    return ";".join(parts)
+
+
+def build_rendition_cmd(
+    attempt,
+    input_file,
+    main_file,
+    bitrate,
+    crf,
+    outputs,
+    duration,
+    threads=None,
+    preset="medium",
+    streams=None,
+):
+    """一条 ffmpeg 命令同时输出全分辨率 HEVC 和各附加输出，源文件只解码一次
+
+    outputs 为 [{"rendition", "work", "size", "bitrate", "crf"}]，work 为临时文件。
+    main_file 为 None 时只输出附加文件（主输出已由转封装或分段编码生成）。
+    """
+    cmd = ["ffmpeg"]
+    if attempt.get("hwaccel"):
+        cmd += ["-hwaccel", attempt["hwaccel"]]
+    if threads:
+        cmd += ["-threads", str(threads)]  # 解码线程
+    cmd += ["-i", input_file]
+    cmd += ["-filter_complex", build_filter_graph(attempt, outputs, duration)]
+    if main_file is not None:
+        cmd += ["-map", "[vmain]"]
+        cmd += video_encode_args(attempt, bitrate, crf, threads, preset)
+        if streams is None:
+            cmd += ["-map", "0:a?", "-c:a", "copy"]
+        else:
+            cmd += stream_args(streams, video=False)
+        cmd += ["-f", "mp4", main_file]
+    else:
+        # 不需要主输出时丢弃这一路，保持滤镜图的输出都有去处
+        cmd += ["-map", "[vmain]", "-f", "null", os.devnull]
+    for i, output in enumerate(outputs):
+        cmd += ["-map", f"[r{i}]"]
+        if output["rendition"]["kind"] == "thumbs":
+            cmd += ["-frames:v", "1", "-update", "1", output["work"]]
+            continue
+        cmd += video_encode_args(
+            attempt, output["bitrate"], output["crf"], threads, preset
+        )
+        cmd += ["-map", "0:a:0?"] + PROXY_AUDIO + ["-f", "mp4", output["work"]]
+    return cmd + ["-y"]
@@ -0,0 +1,242 @@
+import os
+import heapq
+import threading
+
+try:
+    import psutil  # 可选依赖，用于读取可用内存和负载
+except ImportError:
+    psutil = None
+
+GB = 1024 ** 3
+# (最大像素数, 每个任务的编码线程数, 预估内存)
+RESOLUTION_COSTS = (
+    (1280 * 720, 4, 0.5 * GB),
+    (1920 * 1080, 8, 1 * GB),
+    (2560 * 1440, 12, 1.5 * GB),
+    (float("inf"), 16, 3 * GB),
+)
+MEMORY_RESERVE = 0.1  # 始终为系统保留的内存比例
+LOAD_FACTOR = 1.25  # 负载超过 核数 × 该值 时暂停启动新任务
+
+
+def available_memory():
+    """返回 (可用内存, 总内存) 字节数，无法获取时返回 (None, None)"""
+    if psutil is not None:
+        mem = psutil.virtual_memory()
+        return mem.available, mem.total
+    try:
+        info = {}
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                info[key] = int(value.split()[0]) * 1024
+        return info["MemAvailable"], info["MemTotal"]
+    except (OSError, KeyError, ValueError, IndexError):
+        return None, None
+
+
+def system_load():
+    """返回 1 分钟平均负载，不支持的平台返回 None"""
+    try:
+        return os.getloadavg()[0]
+    except (AttributeError, OSError):
+        if psutil is not None and hasattr(psutil, "getloadavg"):
+            return psutil.getloadavg()[0]
+        return None
+
+
+def job_cost(width, height):
+    pixels = (width or 1920) * (height or 1080)
+    for max_pixels, threads, memory in RESOLUTION_COSTS:
+        if pixels <= max_pixels:
+            return threads, memory
+    return RESOLUTION_COSTS[-1][1:]
+
+
+class ResourceScheduler:
+    """按核数划分并发编码任务
+
+    每个任务按分辨率申请若干核（同时作为 ffmpeg/x265 的线程数），
+    已占用核数不超过总核数时才能开始；可用内存不足或系统负载过高时
+    暂停启动新任务。至少总会有一个任务在运行。
+    max_jobs 不为 None 时固定并发数，核数在这些任务间平均分配。
+    """
+
+    def __init__(self, max_jobs=None, cpu_count=None):
+        self.cpu_count = cpu_count or os.cpu_count() or 2
+        self.fixed_jobs = max(1, int(max_jobs)) if max_jobs else None
+        self._cond = threading.Condition()
+        self._used_threads = 0
+        self._active = 0
+
+    @property
+    def max_jobs(self):
+        """线程池大小上限：固定并发数，或按最小分辨率任务能容纳的数量"""
+        if self.fixed_jobs:
+            return self.fixed_jobs
+        return max(1, self.cpu_count // RESOLUTION_COSTS[0][1])
+
+    def plan(self, width, height):
+        """返回任务的 (线程数, 预估内存)"""
+        threads, memory = job_cost(width, height)
+        if self.fixed_jobs:
+            threads = max(1, self.cpu_count // self.fixed_jobs)
+        return min(threads, self.cpu_count), memory
+
+    def _can_start(self, threads, memory):
+        if self._active == 0:
+            return True
+        if self.fixed_jobs:
+            if self._active >= self.fixed_jobs:
+                return False
+        elif self._used_threads + threads > self.cpu_count:
+            return False
+        avail, total = available_memory()
+        if avail is not None and avail - memory < total * MEMORY_RESERVE:
+            return False
+        load = system_load()
+        if load is not None and load > self.cpu_count * LOAD_FACTOR:
+            return False
+        return True
+
+    def acquire(self, width, height, stop_event=None):
+        """阻塞直到资源足够，返回任务槽；stop_event 被设置时返回 None"""
+        threads, memory = self.plan(width, height)
+        with self._cond:
+            while not self._can_start(threads, memory):
+                if stop_event is not None and stop_event.is_set():
+                    return None
+                # 负载和内存会变化，定期重新检查
+                self._cond.wait(timeout=1.0)
+            self._used_threads += threads
+            self._active += 1
+        return {"threads": threads, "memory": memory}
+
+    def release(self, slot):
+        if slot is None:
+            return
+        with self._cond:
+            self._used_threads -= slot["threads"]
+            self._active -= 1
+            self._cond.notify_all()
+
+
+def device_of(path):
+    """返回路径所在的设备号；路径尚不存在时取最近的已存在上级目录"""
+    path = os.path.abspath(path)
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+
+class DeviceLimiter:
+    """限制同时读写同一设备（磁盘、NAS 挂载）的任务数
+
+    per_device 为每个设备的默认上限(0 为不限)，limits 为 {目录: 上限}，
+    按目录所在设备单独设置。一个任务同时申请源文件和输出目录所在的设备，
+    全部有空位才一起占用，不会互相等待造成死锁。
+    """
+
+    def __init__(self, per_device=0, limits=None):
+        self.per_device = per_device
+        self.limits = {}
+        for path, limit in (limits or {}).items():
+            device = device_of(path)
+            if device is not None:
+                self.limits[device] = limit
+        self._cond = threading.Condition()
+        self._active = {}
+
+    def limit(self, device):
+        return self.limits.get(device, self.per_device)
+
+    def acquire(self, paths, stop_event=None):
+        """阻塞直到各设备都有空位，返回占用的设备列表；stop_event 被设置时返回 None"""
+        devices = {device_of(path) for path in paths}
+        devices = sorted(d for d in devices if d is not None and self.limit(d))
+        with self._cond:
+            while any(self._active.get(d, 0) >= self.limit(d) for d in devices):
+                if stop_event is not None and stop_event.is_set():
+                    return None
+                self._cond.wait(timeout=1.0)
+            for device in devices:
+                self._active[device] = self._active.get(device, 0) + 1
+        return devices
+
+    def release(self, devices):
+        if not devices:
+            return
+        with self._cond:
+            for device in devices:
+                self._active[device] -= 1
+            self._cond.notify_all()
+
+
+# 编码速度系数（相对 libx265 medium），用于估算任务工作量
+ENCODER_COST = {
+    "libx265": 1.0,
+    "hevc_nvenc": 0.1,
+    "hevc_amf": 0.12,
+    "hevc_qsv": 0.12,
+}
+PRESET_COST = {
+    "ultrafast": 0.15,
+    "superfast": 0.2,
+    "veryfast": 0.3,
+    "faster": 0.5,
+    "fast": 0.7,
+    "medium": 1.0,
+    "slow": 2.0,
+    "slower": 4.0,
+    "veryslow": 8.0,
+}
+# lpt: 最长任务优先，缩短整批耗时；spt: 最短任务优先，尽早出结果；size: 按文件大小升序
+ORDERINGS = ("lpt", "spt", "size")
+
+
+def estimate_cost(duration, width, height, framerate, codec="libx265", preset="medium"):
+    """估算编码工作量：总像素数(百万) × 编码器/预设系数"""
+    pixels = duration * (width or 1920) * (height or 1080) * (framerate or 30)
+    factor = ENCODER_COST.get(codec, 1.0) * PRESET_COST.get(preset, 1.0)
+    return pixels * factor / 1e6
+
+
+class ScanJob:
+    """扫描得到的待转换文件；库很大时每个文件只占一个带 __slots__ 的小对象"""
+
+    __slots__ = ("path", "size", "cost", "duration", "probe", "queued")
+
+    def __init__(self, path, size, cost, duration, probe=None, queued=None):
+        self.path = path
+        self.size = size
+        self.cost = cost
+        self.duration = duration
+        # 扫描阶段的探测(ScanProbe)和扫描完成时间，提交编码时并入该文件的指标
+        self.probe = probe
+        self.queued = queued
+
+
+def order_jobs(jobs, ordering="lpt"):
+    """jobs 为 ScanJob 列表，原地按调度策略排序后返回"""
+    if ordering == "lpt":
+        jobs.sort(key=lambda job: job.cost, reverse=True)
+    elif ordering == "spt":
+        jobs.sort(key=lambda job: job.cost)
+    elif ordering == "size":
+        jobs.sort(key=lambda job: job.size)
+    else:
+        raise ValueError(f"未知调度策略: {ordering}（可选: {', '.join(ORDERINGS)}）")
+    return jobs
+
+
+def simulate_makespan(costs, workers):
+    """按给定顺序把任务分给最先空闲的 worker，返回整批完成时间（工作量单位）"""
+    finish_times = [0.0] * max(1, workers)
+    for cost in costs:
+        heapq.heapreplace(finish_times, finish_times[0] + cost)
+    return max(finish_times)
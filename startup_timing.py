@@ -0,0 +1,51 @@
+import time
+import threading
+from contextlib import contextmanager
+
+PROCESS_START = time.perf_counter()  # 尽早导入本模块，作为启动计时的起点
+
+
+class StartupTimer:
+    """记录启动过程中各步骤的用时，窗口可交互后和后台初始化完成后各输出一次报告
+
+    步骤可以在任意线程中记录；后台步骤（编码器检测等）单独标注，
+    不计入窗口出现前的用时。
+    """
+
+    def __init__(self, started=PROCESS_START):
+        self.started = started
+        self.steps = []  # (名称, 开始时间, 用时, 是否后台)
+        self._lock = threading.Lock()
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def add(self, name, start, seconds, background=False):
+        with self._lock:
+            self.steps.append((name, start, seconds, background))
+
+    def since_start(self, name):
+        """记录从计时起点到现在的一步，如模块导入"""
+        self.add(name, self.started, time.perf_counter() - self.started)
+
+    @contextmanager
+    def step(self, name, background=False):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter() - start, background)
+
+    def report(self, title):
+        """按开始时间排序的各步骤用时，毫秒"""
+        with self._lock:
+            steps = sorted(self.steps, key=lambda step: step[1])
+        lines = [f"{title}: 启动后 {self.elapsed_ms():.0f} ms"]
+        for name, start, seconds, background in steps:
+            offset = (start - self.started) * 1000
+            lines.append(
+                f"  {name:<16} {seconds * 1000:7.1f} ms  "
+                f"(+{offset:.0f} ms{'，后台' if background else ''})"
+            )
+        return "\n".join(lines)
+
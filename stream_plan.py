@@ -0,0 +1,95 @@
+import functools
+from encoder_caps import list_encoders
+from media_probe import video_stream
+
+# MP4 可以直接容纳的音频编码，其余（WMA、PCM、Vorbis、FLAC 等）需要转码
+MP4_AUDIO_CODECS = {"aac", "mp3", "mp2", "ac3", "eac3", "alac", "opus"}
+# 文本字幕转为 mov_text；图形字幕(PGS/VobSub/DVB)无法转换，直接丢弃
+TEXT_SUBTITLE_CODECS = {"mov_text", "subrip", "srt", "ass", "ssa", "webvtt", "text"}
+# 音频转码目标: (ffmpeg 编码器, 每声道码率 kbps, 最高码率 kbps)
+AUDIO_TARGETS = {"aac": ("aac", 64, 384), "opus": ("libopus", 48, 256)}
+AUDIO_CODEC_CHOICES = tuple(AUDIO_TARGETS)
+STREAM_TYPE_NAMES = {"data": "数据", "attachment": "附件"}
+
+
+@functools.lru_cache(maxsize=None)
+def audio_encoder_available(encoder, ffmpeg="ffmpeg"):
+    return encoder in list_encoders(ffmpeg, kind="A")
+
+
+def audio_transcode_args(stream, audio_codec="aac"):
+    """音频转码参数（不含流序号），所选编码器不可用时退回 AAC"""
+    encoder, per_channel, limit = AUDIO_TARGETS[audio_codec]
+    if audio_codec != "aac" and not audio_encoder_available(encoder):
+        encoder, per_channel, limit = AUDIO_TARGETS["aac"]
+    channels = int(stream.get("channels") or 2)
+    return [encoder, f"{min(limit, per_channel * channels)}k"]
+
+
+def plan_streams(info, audio_codec="aac"):
+    """编码前按探测到的流列表决定每条流的处理方式，保证 MP4 能容纳全部输出流
+
+    返回 {"video": 视频流序号, "streams": [{"index", "type", "codec", "bitrate"}],
+    "notes": [说明]}；codec 为 "copy" 或转码用的编码器。没有探测信息时返回 None，
+    调用方按原来的 -c:a copy 处理。
+    """
+    video = video_stream(info)
+    if video is None or "index" not in video:
+        return None
+    streams = []
+    notes = []
+    for stream in info.get("streams", []):
+        kind = stream.get("codec_type")
+        codec = stream.get("codec_name") or "未知"
+        index = stream.get("index")
+        if index is None or stream is video:
+            continue
+        if kind == "audio":
+            if codec in MP4_AUDIO_CODECS:
+                streams.append(
+                    {"index": index, "type": "a", "codec": "copy", "bitrate": None}
+                )
+                continue
+            encoder, bitrate = audio_transcode_args(stream, audio_codec)
+            streams.append(
+                {"index": index, "type": "a", "codec": encoder, "bitrate": bitrate}
+            )
+            notes.append(f"音频流 #{index} ({codec}) 转码为 {encoder} {bitrate}")
+        elif kind == "subtitle":
+            if codec in TEXT_SUBTITLE_CODECS:
+                streams.append(
+                    {"index": index, "type": "s", "codec": "mov_text", "bitrate": None}
+                )
+                if codec != "mov_text":
+                    notes.append(f"字幕流 #{index} ({codec}) 转为 mov_text")
+            else:
+                notes.append(f"丢弃字幕流 #{index} ({codec})：MP4 不支持图形字幕")
+        elif kind == "video":
+            notes.append(f"丢弃附加视频流 #{index} ({codec})")
+        else:
+            kind = STREAM_TYPE_NAMES.get(kind, kind or "未知")
+            notes.append(f"丢弃{kind}流 #{index} ({codec})")
+    return {"video": video["index"], "streams": streams, "notes": notes}
+
+
+def stream_args(plan, input_index=0, video=True):
+    """把流计划展开为 -map 和逐流的编码参数
+
+    plan 为 None 时返回原来的 ["-c:a", "copy"]。拼接分段时视频来自另一个输入，
+    用 video=False 只映射音频和字幕，input_index 指向源文件。
+    """
+    if plan is None:
+        return ["-c:a", "copy"]
+    args = []
+    if video:
+        args += ["-map", f"{input_index}:{plan['video']}"]
+    counts = {"a": 0, "s": 0}
+    for stream in plan["streams"]:
+        kind = stream["type"]
+        n = counts[kind]
+        counts[kind] += 1
+        args += ["-map", f"{input_index}:{stream['index']}"]
+        args += [f"-c:{kind}:{n}", stream["codec"]]
+        if stream["bitrate"]:
+            args += [f"-b:{kind}:{n}", stream["bitrate"]]
+    return args
@@ -0,0 +1,83 @@
+import os
+import sys
+import textwrap
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FAKE_FFPROBE = """
+import json, os, sys
+args = sys.argv[1:]
+path = args[-1]
+# 容器起始时间戳，时间戳都是绝对 PTS
+start = float(os.environ.get("FAKE_START_TIME", "0"))
+if "-read_intervals" in args:
+    # 每个目标点之前最近的偶数秒（从文件起点算）为关键帧
+    for target in args[args.index("-read_intervals") + 1].split(","):
+        t = float(target.split("%")[0]) - start
+        print(f"{int(t // 2 * 2) + start:.6f},K__")
+    sys.exit(0)
+try:
+    with open(path, "rb") as f:
+        head = f.read(4)
+except OSError:
+    sys.exit(1)
+duration = "60.0" if "long" in os.path.basename(path) else "10.0"
+codec = "hevc" if head == b"HEVC" else "h264"
+print(json.dumps({
+    "format": {"format_name": "mov", "start_time": str(start), "duration": duration,
+               "bit_rate": "5000000"},
+    "streams": [
+        {"index": 0, "codec_type": "video", "codec_name": codec, "width": 1280,
+         "height": 720, "r_frame_rate": "30/1", "avg_frame_rate": "30/1"},
+        {"index": 1, "codec_type": "audio", "codec_name": "aac", "channels": 2},
+    ],
+}))
+"""
+
+FAKE_FFMPEG = """
+import json, os, sys, time
+args = sys.argv[1:]
+if os.environ.get("FAKE_FFMPEG_LOG"):
+    with open(os.environ["FAKE_FFMPEG_LOG"], "a", encoding="utf-8") as f:
+        f.write(json.dumps(args) + "\\n")
+out = args[-2] if args[-1] == "-y" else args[-1]
+if out.startswith("-"):
+    sys.exit(0)  # -encoders、-version 等查询没有输出文件
+time.sleep(float(os.environ.get("FAKE_FFMPEG_DELAY", "0")))
+error = os.environ.get("FAKE_FFMPEG_ERROR")
+if error and "-c:v" in args:
+    print(error, file=sys.stderr)
+    sys.exit(1)
+with open(out, "wb") as f:
+    f.write(b"HEVC" + b"x" * 4096)
+"""
+
+
+def write_script(directory, name, body):
+    path = os.path.join(directory, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"#!{sys.executable}\n" + textwrap.dedent(body))
+    os.chmod(path, 0o755)
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    """在 PATH 前面放入假的 ffmpeg/ffprobe：输出以 HEVC 开头即视为 HEVC"""
+    if os.name == "nt":
+        pytest.skip("假 ffmpeg 脚本依赖 shebang")
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    write_script(str(bin_dir), "ffprobe", FAKE_FFPROBE)
+    write_script(str(bin_dir), "ffmpeg", FAKE_FFMPEG)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return bin_dir
+
+
+def make_source(path, size=4096):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"H264" + b"s" * size)
+    return path
@@ -0,0 +1,69 @@
+import json
+
+from chunked import chunk_targets, find_keyframes, plan_chunks
+from conftest import make_source
+from convert_engine import ConversionEngine
+from encoder_caps import parse_encoder_chain
+from media_probe import ProbeCache
+
+
+def test_plan_chunks_cuts_on_keyframes_at_least_min_chunk_apart():
+    keyframes = [0.0, 4.0, 10.5, 12.0, 25.0, 41.0, 55.0]
+    assert plan_chunks(60.0, keyframes, min_chunk=10.0) == [
+        (0.0, 10.5),
+        (10.5, 25.0),
+        (25.0, 41.0),
+        (41.0, None),
+    ]
+
+
+def test_plan_chunks_keeps_tail_at_least_min_chunk():
+    # 55 秒处的关键帧离结尾不足 10 秒，最后一段从 41 秒一直到结尾
+    chunks = plan_chunks(60.0, [20.0, 41.0, 55.0], min_chunk=10.0)
+    assert chunks[-1] == (41.0, None)
+
+
+def test_plan_chunks_without_usable_keyframes_is_one_chunk():
+    assert plan_chunks(15.0, [], min_chunk=10.0) == [(0.0, None)]
+    assert plan_chunks(15.0, [3.0, 8.0], min_chunk=10.0) == [(0.0, None)]
+
+
+def test_plan_chunks_covers_whole_file_without_gaps():
+    keyframes = [float(t) for t in range(0, 600, 2)]
+    chunks = plan_chunks(600.0, keyframes, min_chunk=30.0)
+    assert chunks[0][0] == 0.0 and chunks[-1][1] is None
+    for (_, end), (start, _) in zip(chunks, chunks[1:]):
+        assert end == start
+    assert all(end - start >= 30.0 for start, end in chunks[:-1])
+
+
+def test_find_keyframes_is_relative_to_file_start(fake_ffmpeg, monkeypatch, tmp_path):
+    # 时间戳从 1.4 秒开始；关键帧在文件内的 20、40 秒，即绝对 PTS 21.4、41.4
+    monkeypatch.setenv("FAKE_START_TIME", "1.4")
+    path = make_source(str(tmp_path / "long.mkv"))
+    assert find_keyframes(path, [21.0, 41.0], start_time=1.4) == [20.0, 40.0]
+    # 不减去起始时间时，-ss 切点会偏离关键帧
+    assert find_keyframes(path, [21.0, 41.0]) == [19.4, 39.4]
+
+
+def test_engine_chunks_on_relative_keyframes(fake_ffmpeg, monkeypatch, tmp_path):
+    monkeypatch.setenv("FAKE_START_TIME", "1.4")
+    calls_log = tmp_path / "ffmpeg_calls.jsonl"
+    monkeypatch.setenv("FAKE_FFMPEG_LOG", str(calls_log))
+    make_source(str(tmp_path / "videos" / "long.mkv"), size=20000)
+    engine = ConversionEngine(
+        str(tmp_path / "videos"),
+        output_dir=str(tmp_path / "out"),
+        encoder_chain=parse_encoder_chain("libx265"),
+        probe_cache=ProbeCache(None),
+        quality_windows=0,
+        chunk_min_duration=30,
+        chunks=3,
+    )
+    assert engine.run()["success"] == 1
+    with open(calls_log, encoding="utf-8") as f:
+        calls = [json.loads(line) for line in f]
+    seeks = sorted(
+        float(args[args.index("-ss") + 1]) for args in calls if "-ss" in args
+    )
+    assert seeks == [0.0, 20.0, 40.0]
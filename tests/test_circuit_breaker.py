@@ -0,0 +1,81 @@
+from circuit_breaker import EncoderCircuitBreaker, classify_failure
+from conftest import make_source
+from convert_engine import ConversionEngine
+from encoder_caps import parse_encoder_chain
+from media_probe import ProbeCache
+
+NVENC_ERROR = ["[h264_nvenc @ 0x55d0] OpenEncodeSessionEx failed: out of memory (10)"]
+
+
+def test_classify_input_errors():
+    tail = ["", "/videos/a.mp4: Invalid data found when processing input"]
+    assert classify_failure(tail, "/videos/a.mp4") == (
+        "input",
+        "invalid data found when processing input",
+    )
+
+
+def test_classify_encoder_errors():
+    assert classify_failure(NVENC_ERROR) == ("encoder", "openencodesessionex failed")
+
+
+def test_input_errors_take_priority_over_encoder_errors():
+    tail = ["Error while decoding stream #0:0", "hwaccel initialisation returned error"]
+    assert classify_failure(tail)[0] == "input"
+
+
+def test_unknown_signature_ignores_numbers_and_file_name():
+    first = classify_failure(["Conversion failed at 0x7f3a frame 120"], "/v/a.mp4")
+    second = classify_failure(["Conversion failed at 0x9b10 frame 4511"], "/v/b.mp4")
+    assert first == second == ("unknown", "conversion failed at # frame #")
+    assert classify_failure(["a.mp4: bad"], "/v/a.mp4") == ("unknown", "<input>: bad")
+
+
+def test_classify_empty_tail():
+    assert classify_failure(["", "  "]) == ("unknown", "exit without message")
+
+
+def test_breaker_trips_after_same_reason_repeats():
+    breaker = EncoderCircuitBreaker(threshold=3)
+    assert breaker.record_failure("nvenc", NVENC_ERROR) is None
+    assert breaker.record_failure("nvenc", NVENC_ERROR) is None
+    assert breaker.record_failure("nvenc", NVENC_ERROR)
+    assert breaker.is_open("nvenc")
+    assert not breaker.is_open("libx265")
+
+
+def test_breaker_ignores_input_errors_and_resets_on_success():
+    breaker = EncoderCircuitBreaker(threshold=2)
+    breaker.record_failure("nvenc", NVENC_ERROR)
+    breaker.record_failure("nvenc", ["moov atom not found"])
+    breaker.record_success("nvenc")
+    assert breaker.record_failure("nvenc", NVENC_ERROR) is None
+    assert not breaker.is_open("nvenc")
+
+
+def test_chunk_failures_report_the_trip(tmp_path, fake_ffmpeg, monkeypatch):
+    monkeypatch.setenv("FAKE_FFMPEG_ERROR", "Unknown encoder 'libx265'")
+    make_source(str(tmp_path / "videos" / "long.mkv"))  # 60 秒，分 3 段
+    events = []
+    engine = ConversionEngine(
+        str(tmp_path / "videos"),
+        output_dir=str(tmp_path / "out"),
+        log_dir=str(tmp_path / "logs"),
+        encoder_chain=parse_encoder_chain("libx265"),
+        probe_cache=ProbeCache(None),
+        on_event=events.append,
+        breaker=EncoderCircuitBreaker(threshold=3),
+        chunk_min_duration=30,
+        chunks=3,
+    )
+    assert len(engine.run()["failed"]) == 1
+    tripped = [e for e in events if e["event"] == "breaker_tripped"]
+    assert tripped == [
+        {
+            "event": "breaker_tripped",
+            "encoder": "libx265",
+            "reason": "连续 3 次失败: unknown encoder",
+        }
+    ]
+    (log_file,) = (tmp_path / "logs").glob("long_*.log")
+    assert "熔断: 本次会话后续任务不再尝试 libx265" in log_file.read_text("utf-8")
@@ -0,0 +1,64 @@
+import os
+
+from conversion_manifest import ConversionManifest
+
+
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def test_done_requires_verified_output(tmp_path):
+    source, output = tmp_path / "a.mkv", tmp_path / "a_hevc.mp4"
+    write(source, b"source")
+    write(output, b"output")
+    manifest = ConversionManifest(str(tmp_path / "manifest.jsonl"))
+    manifest.record(str(source), "done", str(output), "libx265", verified=False)
+    assert not manifest.is_done(str(source))
+    manifest.record(str(source), "done", str(output), "libx265", verified=True)
+    assert manifest.is_done(str(source))
+
+
+def test_not_done_for_failed_or_unknown_source(tmp_path):
+    source = tmp_path / "a.mkv"
+    write(source, b"source")
+    manifest = ConversionManifest(str(tmp_path / "manifest.jsonl"))
+    assert not manifest.is_done(str(source))
+    manifest.record(str(source), "failed")
+    assert not manifest.is_done(str(source))
+
+
+def test_not_done_when_source_or_output_changed(tmp_path):
+    source, output = tmp_path / "a.mkv", tmp_path / "a_hevc.mp4"
+    write(source, b"source")
+    write(output, b"output")
+    manifest = ConversionManifest(str(tmp_path / "manifest.jsonl"))
+    record = manifest.record(str(source), "done", str(output), verified=True)
+    assert not manifest.is_done(str(source), record["size"] + 1, record["mtime"])
+    write(output, b"truncated")
+    assert not manifest.is_done(str(source))
+    os.remove(output)
+    assert not manifest.is_done(str(source))
+
+
+def test_skipped_and_kept_need_no_output(tmp_path):
+    source = tmp_path / "a.mp4"
+    write(source, b"source")
+    manifest = ConversionManifest(str(tmp_path / "manifest.jsonl"))
+    manifest.record(str(source), "kept")
+    assert manifest.is_done(str(source))
+    manifest.record(str(source), "skipped")
+    assert manifest.is_done(str(source))
+
+
+def test_last_record_wins_after_reload(tmp_path):
+    source, output = tmp_path / "a.mkv", tmp_path / "a_hevc.mp4"
+    write(source, b"source")
+    write(output, b"output")
+    path = str(tmp_path / "manifest.jsonl")
+    manifest = ConversionManifest(path)
+    manifest.record(str(source), "done", str(output), verified=True)
+    manifest.record(str(source), "failed")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"source": "partial')  # 崩溃时留下的半行
+    assert not ConversionManifest(path).is_done(str(source))
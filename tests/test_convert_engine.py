@@ -0,0 +1,47 @@
+import threading
+
+import pytest
+
+from conftest import make_source
+from convert_engine import ConversionEngine
+from encoder_caps import parse_encoder_chain
+from media_probe import ProbeCache
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_cancel_does_not_record_interrupted_files(
+    tmp_path, fake_ffmpeg, monkeypatch, stream
+):
+    monkeypatch.setenv("FAKE_FFMPEG_DELAY", "5")
+    for name in ("a.mkv", "b.mkv", "c.mkv"):
+        make_source(str(tmp_path / "videos" / name), size=20000)
+    events = []
+    started = threading.Event()
+
+    def on_event(event):
+        events.append(event)
+        if event["event"] == "encoder" and event["status"] == "trying":
+            started.set()
+
+    engine = ConversionEngine(
+        str(tmp_path / "videos"),
+        output_dir=str(tmp_path / "out"),
+        log_dir=str(tmp_path / "logs"),
+        workers=2,
+        encoder_chain=parse_encoder_chain("libx265"),
+        probe_cache=ProbeCache(None),
+        on_event=on_event,
+        quality_windows=0,
+        stream=stream,
+    )
+    result = {}
+    runner = threading.Thread(target=lambda: result.update(summary=engine.run()))
+    runner.start()
+    assert started.wait(10)
+    engine.cancel()
+    runner.join(10)
+
+    summary = result["summary"]
+    assert summary["cancelled"]
+    assert summary["failed"] == [] and summary["success"] == 0
+    assert not [e for e in events if e["event"] == "file_done"]
@@ -0,0 +1,79 @@
+import crf_search
+import convert_engine
+from conftest import make_source
+from convert_engine import ConversionEngine
+from crf_search import CrfSearchCache, choose_crf, search_crf
+from encoder_caps import parse_encoder_chain
+from media_probe import ProbeCache
+
+RESULTS = [
+    {"crf": 22, "score": 0.985, "size_ratio": 0.6},
+    {"crf": 24, "score": 0.975, "size_ratio": 0.45},
+    {"crf": 26, "score": 0.96, "size_ratio": 0.3},
+]
+
+
+def test_choose_crf_by_quality_and_size():
+    assert choose_crf(RESULTS, target_quality=0.97)["crf"] == 24
+    assert choose_crf(RESULTS, target_size=0.5)["crf"] == 24
+    # 没有候选达标时退回质量最好 / 体积最小的一项
+    assert choose_crf(RESULTS, target_quality=0.99)["crf"] == 22
+    assert choose_crf(RESULTS, target_size=0.1)["crf"] == 26
+    assert choose_crf([], target_quality=0.97) is None
+
+
+def test_search_crf_uses_metric_and_reports_fallback(tmp_path, monkeypatch):
+    metrics = set()
+
+    def fake_run_ffmpeg(cmd, tail_lines=None, tracker=None):
+        with open(cmd[-2], "wb") as f:
+            f.write(b"x" * 1000)
+        return 0, []
+
+    def fake_run_quality_cmd(cmd, metric, tracker=None):
+        metrics.add(metric)
+        return 0.9
+
+    monkeypatch.setattr(crf_search, "run_ffmpeg", fake_run_ffmpeg)
+    monkeypatch.setattr(crf_search, "run_quality_cmd", fake_run_quality_cmd)
+    make_cmd = lambda out, crf: ["ffmpeg", "-i", "src.mkv", "-c:a", "copy", out, "-y"]
+    result = search_crf(make_cmd, "src.mkv", 60.0, 1280, 720, 28, metric="ssim")
+    assert metrics == {"ssim"}
+    assert result["metric"] == "ssim"
+    assert not result["met"]
+    assert result["crf"] == 24  # 候选中 CRF 最低的一项
+
+
+def test_tune_rate_passes_selected_metric(tmp_path, fake_ffmpeg, monkeypatch):
+    source = str(tmp_path / "videos" / "a.mkv")
+    make_source(source)
+    calls = []
+
+    def fake_search_crf(*args, **kwargs):
+        calls.append(kwargs)
+        return {
+            "crf": 26,
+            "bitrate": "2000k",
+            "score": 0.93,
+            "size_ratio": 0.4,
+            "metric": kwargs["metric"],
+            "met": False,
+            "candidates": [],
+        }
+
+    monkeypatch.setattr(convert_engine, "search_crf", fake_search_crf)
+    events = []
+    engine = ConversionEngine(
+        str(tmp_path / "videos"),
+        output_dir=str(tmp_path / "out"),
+        encoder_chain=parse_encoder_chain("nvenc,libx265"),  # 硬件编码器用 libx265 搜索
+        probe_cache=ProbeCache(None),
+        quality_metric="ssim",
+        crf_search=True,
+        crf_cache=CrfSearchCache(None),
+        on_event=events.append,
+    )
+    assert engine.tune_rate(source, 10.0, 1280, 720, "3000k", 28) == ("2000k", 26)
+    assert calls[0]["metric"] == "ssim"
+    event = [e for e in events if e["event"] == "crf_search"][0]
+    assert event["metric"] == "ssim" and event["met"] is False
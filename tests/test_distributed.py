@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+
+import distributed
+from conftest import make_source
+from convert_engine import ConversionEngine
+from distributed import Coordinator, Worker, run_coordinator
+from encoder_caps import parse_encoder_chain
+from media_probe import ProbeCache
+
+
+def make_engine(input_dir, output_dir, events):
+    return ConversionEngine(
+        str(input_dir),
+        output_dir=str(output_dir),
+        encoder_chain=parse_encoder_chain("libx265"),
+        probe_cache=ProbeCache(None),
+        on_event=events.append,
+    )
+
+
+def leftover_files(output_dir):
+    """输出目录中残留的租约、临时文件和分段目录"""
+    leftovers = []
+    for root, dirs, files in os.walk(output_dir):
+        leftovers += [d for d in dirs if d.endswith("_chunks")]
+        leftovers += [f for f in files if ".lease" in f or ".part" in f]
+    return leftovers
+
+
+def test_localhost_workers_share_the_batch(tmp_path, fake_ffmpeg, monkeypatch):
+    monkeypatch.setattr(distributed, "POLL_INTERVAL", 0.05)
+    monkeypatch.setenv("FAKE_FFMPEG_DELAY", "0.2")
+    input_dir = tmp_path / "videos"
+    output_dir = tmp_path / "out"
+    make_source(str(input_dir / "a.mp4"))
+    make_source(str(input_dir / "sub" / "b.mkv"))
+    make_source(str(input_dir / "long.mp4"))  # 假 ffprobe 报告 60 秒，按关键帧分 3 段
+    events = []
+    ready = threading.Event()
+
+    def on_event(event):
+        events.append(event)
+        if event["event"] == "coordinator_ready":
+            ready.port = event["port"]
+            ready.set()
+
+    engine = make_engine(input_dir, output_dir, events)
+    engine.on_event = on_event
+    coordinator = Coordinator(engine, chunk_min_duration=30, chunks=3)
+    result = {}
+    server = threading.Thread(
+        target=lambda: result.update(
+            summary=run_coordinator(coordinator, "127.0.0.1", 0)
+        )
+    )
+    server.start()
+    assert ready.wait(10)
+
+    url = f"http://127.0.0.1:{ready.port}"
+    workers = [
+        Worker(url, name=f"w{i}", encoder_chain=parse_encoder_chain("libx265"))
+        for i in range(2)
+    ]
+    threads = [threading.Thread(target=worker.run) for worker in workers]
+    for thread in threads:
+        thread.start()
+    server.join(30)
+    for thread in threads:
+        thread.join(10)
+
+    summary = result["summary"]
+    assert summary["success"] == 3 and not summary["failed"]
+    for name in ("a_hevc.mp4", os.path.join("sub", "b_hevc.mp4"), "long_hevc.mp4"):
+        with open(output_dir / name, "rb") as f:
+            assert f.read(4) == b"HEVC"
+    leased = {e["worker"] for e in events if e["event"] == "job_leased"}
+    assert leased == {"w0", "w1"}
+    assert len([e for e in events if e["event"] == "job_leased"]) == 5
+    assert leftover_files(output_dir) == []
+
+
+def test_expired_lease_cannot_overwrite_reassigned_job(tmp_path, fake_ffmpeg):
+    input_dir = tmp_path / "videos"
+    output_dir = tmp_path / "out"
+    make_source(str(input_dir / "a.mp4"))
+    events = []
+    coordinator = Coordinator(make_engine(input_dir, output_dir, events))
+    coordinator.prepare()
+
+    stale = coordinator.lease("slow")
+    coordinator.jobs[stale["id"]]["deadline"] = time.monotonic() - 1
+    fresh = coordinator.lease("fast")
+    assert fresh["id"] == stale["id"]
+    assert fresh["lease"] != stale["lease"]
+    assert fresh["output"] != stale["output"]
+    assert any(e["event"] == "job_expired" for e in events)
+
+    # 过期的编码端仍在写自己的文件，它的上报和上传都不再被接受
+    for path, body in ((stale["output"], b"HEVCstale"), (fresh["output"], b"HEVC")):
+        with open(path, "wb") as f:
+            f.write(body + b"x" * 4096)
+    assert coordinator.lease_output(stale["lease"]) is None
+    assert not coordinator.heartbeat(stale["id"], "slow", stale["lease"])
+    coordinator.complete(stale["id"], "slow", stale["lease"], True, "libx265")
+    assert coordinator.jobs[fresh["id"]]["status"] == "leased"
+
+    coordinator.complete(fresh["id"], "fast", fresh["lease"], True, "libx265")
+    assert coordinator.finished.wait(10)
+    with open(output_dir / "a_hevc.mp4", "rb") as f:
+        assert not f.read().startswith(b"HEVCstale")
+    assert coordinator.summary["success"] == 1
+    assert leftover_files(output_dir) == []
+
+
+def test_failed_chunk_drops_the_rest_of_the_file(tmp_path, fake_ffmpeg):
+    input_dir = tmp_path / "videos"
+    output_dir = tmp_path / "out"
+    make_source(str(input_dir / "long.mp4"))
+    events = []
+    coordinator = Coordinator(
+        make_engine(input_dir, output_dir, events),
+        max_attempts=1,
+        chunk_min_duration=30,
+        chunks=3,
+    )
+    coordinator.prepare()
+    assert len(coordinator.pending) == 3
+    chunk_dir = coordinator.files[str(input_dir / "long.mp4")]["chunk_dir"]
+
+    first = coordinator.lease("w1")
+    second = coordinator.lease("w2")
+    with open(second["output"], "wb") as f:
+        f.write(b"HEVC" + b"x" * 4096)
+    coordinator.complete(first["id"], "w1", first["lease"], False, error="boom")
+
+    # 第三段还没租出，整个文件失败后不再分配
+    assert coordinator.lease("w3") is None
+    assert coordinator.finished.is_set()
+    assert len(coordinator.summary["failed"]) == 1
+    assert not os.path.exists(chunk_dir)
+
+    # 仍在编码的第二段完成后输出直接丢弃
+    coordinator.complete(second["id"], "w2", second["lease"], True, "libx265")
+    assert coordinator.jobs[second["id"]]["status"] == "failed"
+    assert not any(e["event"] == "job_done" for e in events)
+    assert leftover_files(output_dir) == []
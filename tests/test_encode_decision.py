@@ -0,0 +1,59 @@
+import pytest
+
+from encode_decision import ENCODE, REMUX, SKIP, decide_action
+
+
+def probe_info(codec, bit_rate=None, format_bit_rate=None, audio_bit_rate=None):
+    streams = [{"index": 0, "codec_type": "video", "codec_name": codec}]
+    if bit_rate is not None:
+        streams[0]["bit_rate"] = bit_rate
+    if audio_bit_rate is not None:
+        streams.append(
+            {
+                "index": 1,
+                "codec_type": "audio",
+                "codec_name": "aac",
+                "bit_rate": audio_bit_rate,
+            }
+        )
+    info = {"streams": streams, "format": {}}
+    if format_bit_rate is not None:
+        info["format"]["bit_rate"] = format_bit_rate
+    return info
+
+
+def test_non_hevc_is_encoded():
+    action, reason = decide_action(probe_info("h264", "2000000"), "a.mp4", "3000k")
+    assert action == ENCODE
+    assert "h264" in reason
+
+
+def test_missing_codec_is_encoded():
+    assert decide_action({"streams": []}, "a.mp4", "3000k")[0] == ENCODE
+
+
+@pytest.mark.parametrize(
+    "path, expected", [("a.mp4", SKIP), ("a.M4V", SKIP), ("a.mkv", REMUX)]
+)
+def test_hevc_within_target_is_not_reencoded(path, expected):
+    assert decide_action(probe_info("hevc", "4000000"), path, "3000k")[0] == expected
+
+
+def test_hevc_above_tolerance_is_encoded():
+    info = probe_info("hevc", "4600000")
+    assert decide_action(info, "a.mp4", "3000k")[0] == ENCODE
+    assert decide_action(info, "a.mp4", "3000k", tolerance=2.0)[0] == SKIP
+
+
+def test_hevc_bitrate_estimated_from_container():
+    # MKV 没有流码率：总码率 5.5M 减去音频 0.5M 后仍高于 3M × 1.5
+    info = probe_info("hevc", format_bit_rate="5500000", audio_bit_rate="500000")
+    assert decide_action(info, "a.mkv", "3M")[0] == ENCODE
+    info = probe_info("hevc", format_bit_rate="4500000", audio_bit_rate="500000")
+    assert decide_action(info, "a.mkv", "3M")[0] == REMUX
+
+
+def test_unknown_hevc_bitrate_is_not_reencoded():
+    action, reason = decide_action(probe_info("hevc"), "a.mkv", "3000k")
+    assert action == REMUX
+    assert "未知" in reason
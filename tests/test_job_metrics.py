@@ -0,0 +1,103 @@
+import json
+import time
+
+from conftest import make_source
+from convert_engine import ConversionEngine
+from encoder_caps import parse_encoder_chain
+from job_metrics import BatchMetrics
+from media_probe import ProbeCache
+
+
+def test_scan_probe_becomes_timed_stage_of_queued_job():
+    metrics = BatchMetrics()
+    with metrics.scanning("a.mkv") as probe:
+        metrics.add_probe("a.mkv", 0.25, cached=False)
+        metrics.add_probe("a.mkv", 0.001, cached=True)
+    queued = time.time()
+    metrics.enqueue("a.mkv", probe, queued)
+    job = metrics.job("a.mkv")
+    job.start()
+    record = metrics.finish("a.mkv", "success")
+
+    assert record["queued"] == round(queued, 3)
+    assert record["queued"] <= record["started"]
+    stage = record["stages"][0]
+    assert stage["stage"] == "probe"
+    assert stage["start"] == round(probe.start, 3)
+    assert (stage["calls"], stage["misses"], stage["seconds"]) == (2, 1, 0.251)
+    assert record["probe"] == {"calls": 2, "misses": 1, "seconds": 0.251}
+    assert metrics.summary()["probe"]["misses"] == 1
+
+
+def test_file_skipped_during_scan_keeps_its_probe():
+    metrics = BatchMetrics()
+    with metrics.scanning("a.mp4"):
+        metrics.add_probe("a.mp4", 0.1, cached=False)
+        record = metrics.finish("a.mp4", "skipped")
+        metrics.add_probe("a.mp4", 0.1, cached=True)  # 已写出记录，计入批次汇总
+    assert record["stages"][0]["stage"] == "probe"
+    assert record["probe"]["misses"] == 1
+    assert metrics.summary()["probe"] == {"calls": 2, "misses": 1, "seconds": 0.2}
+
+
+def test_probe_outside_scan_and_job_goes_to_batch_totals():
+    metrics = BatchMetrics()
+    metrics.add_probe("a.mkv", 0.5, cached=False)
+    assert metrics._jobs == {}
+    assert metrics.summary()["probe"]["calls"] == 1
+
+
+def test_pipelined_run_records_probe_stage(tmp_path, fake_ffmpeg):
+    input_dir = tmp_path / "videos"
+    make_source(str(input_dir / "a.mkv"), size=20000)  # 假编码输出约 4 KB，明显变小
+    engine = ConversionEngine(
+        str(input_dir),
+        output_dir=str(tmp_path / "out"),
+        log_dir=str(tmp_path / "logs"),
+        encoder_chain=parse_encoder_chain("libx265"),
+        probe_cache=ProbeCache(None),
+        quality_windows=0,
+        stream=True,
+    )
+    assert engine.run()["success"] == 1
+    with open(tmp_path / "logs" / "metrics.jsonl", encoding="utf-8") as f:
+        job = [json.loads(line) for line in f][0]
+    assert job["type"] == "job"
+    probe = job["stages"][0]
+    assert probe["stage"] == "probe" and probe["misses"] == 1
+    assert job["queued"] <= job["started"]
+
+
+def make_batch_engine(tmp_path):
+    return ConversionEngine(
+        str(tmp_path / "videos"),
+        output_dir=str(tmp_path / "out"),
+        log_dir=str(tmp_path / "logs"),
+        encoder_chain=parse_encoder_chain("libx265"),
+        probe_cache=ProbeCache(None),
+        quality_windows=0,
+    )
+
+
+def test_batch_scan_keeps_probe_on_scan_job(tmp_path, fake_ffmpeg):
+    for name in ("a.mkv", "b.mkv", "c.mkv"):
+        make_source(str(tmp_path / "videos" / name), size=20000)
+    engine = make_batch_engine(tmp_path)
+    jobs = engine.scan_jobs()
+    assert engine.metrics._jobs == {} and engine.metrics._scanning == {}
+    assert [job.probe.misses for job in jobs] == [1, 1, 1]
+    assert all(job.queued >= job.probe.start for job in jobs)
+
+
+def test_batch_run_records_scan_probe_per_job(tmp_path, fake_ffmpeg):
+    for name in ("a.mkv", "b.mkv", "c.mkv"):
+        make_source(str(tmp_path / "videos" / name), size=20000)
+    assert make_batch_engine(tmp_path).run()["success"] == 3
+    with open(tmp_path / "logs" / "metrics.jsonl", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    for job in records[:-1]:
+        assert job["stages"][0]["stage"] == "probe"
+        assert job["stages"][0]["misses"] == 1
+        assert job["queued"] <= job["started"]
+    # 每个文件另有一次校验输出的探测；批次汇总不重复计入扫描阶段的探测
+    assert records[-1]["probe"]["misses"] == 6
@@ -0,0 +1,88 @@
+import shutil
+import subprocess
+
+import pytest
+
+from quality_check import build_quality_cmd, measure_quality, sample_windows
+
+requires_ffmpeg = pytest.mark.skipif(
+    not (shutil.which("ffmpeg") and shutil.which("ffprobe")), reason="需要 ffmpeg"
+)
+
+
+def test_sample_windows():
+    assert sample_windows(0, 3) == []
+    assert sample_windows(10.0, 3, 4.0) == [(0.0, 10.0)]
+    assert sample_windows(40.0, 3, 4.0) == [(8.0, 4.0), (18.0, 4.0), (28.0, 4.0)]
+
+
+def test_quality_cmd_keeps_shared_time_origin():
+    cmd = build_quality_cmd("src.mkv", "out.mp4", 12.0, 4.0, "ssim", 1280, 720)
+    graph = cmd[cmd.index("-lavfi") + 1]
+    assert "STARTPTS" not in graph
+    assert graph.endswith("[dist][ref]ssim")
+    # 两个输入从同一位置开始，-ss 把定位点平移为各自的时间原点
+    assert cmd[cmd.index("out.mp4") - 5 : cmd.index("out.mp4")] == [
+        "-ss",
+        "12.000",
+        "-t",
+        "4.000",
+        "-i",
+    ]
+    assert cmd[cmd.index("src.mkv") - 5 : cmd.index("src.mkv")] == [
+        "-ss",
+        "12.000",
+        "-t",
+        "4.000",
+        "-i",
+    ]
+
+
+def test_quality_cmd_for_separately_encoded_clip():
+    cmd = build_quality_cmd("src.mkv", "clip.mp4", 12.0, 4.0, "vmaf", 640, 360, 0.0)
+    clip, source = cmd.index("clip.mp4"), cmd.index("src.mkv")
+    assert cmd[clip - 5 : clip - 3] == ["-ss", "0.000"]
+    assert cmd[source - 5 : source - 3] == ["-ss", "12.000"]
+    assert "libvmaf" in cmd[cmd.index("-lavfi") + 1]
+
+
+def video_start_time(path):
+    return float(
+        subprocess.check_output(
+            [
+                "ffprobe", "-v", "error", "-select_streams", "v:0",
+                "-show_entries", "stream=start_time", "-of", "csv=p=0", path,
+            ]
+        )  # fmt: skip
+    )
+
+
+@requires_ffmpeg
+def test_source_with_delayed_video_start_is_compared_frame_by_frame(tmp_path):
+    # 视频流比音频晚 0.5 秒开始，CFR 编码会在开头补出 15 个重复帧
+    source = str(tmp_path / "delayed.mkv")
+    encoded = str(tmp_path / "delayed_hevc.mp4")
+    subprocess.run(
+        [
+            "ffmpeg", "-v", "error",
+            "-f", "lavfi", "-i", "sine=frequency=440:duration=6.5",
+            "-itsoffset", "0.5",
+            "-f", "lavfi", "-i", "testsrc2=size=320x240:rate=30:duration=6",
+            "-map", "1:v", "-map", "0:a", "-c:v", "ffv1", "-c:a", "aac",
+            source, "-y",
+        ],
+        check=True,
+    )  # fmt: skip
+    subprocess.run(
+        [
+            "ffmpeg", "-v", "error", "-i", source,
+            "-c:v", "mpeg4", "-q:v", "2", "-r", "30", "-c:a", "aac",
+            encoded, "-y",
+        ],
+        check=True,
+    )  # fmt: skip
+    assert video_start_time(source) > 0.4
+
+    result = measure_quality(source, encoded, 6.5, 320, 240, metric="ssim")
+    # 错开一帧以上时 testsrc2 的运动画面 SSIM 会明显下降
+    assert result["score"] > 0.97
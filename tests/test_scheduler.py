@@ -0,0 +1,48 @@
+import pytest
+
+from scheduler import ScanJob, order_jobs, simulate_makespan
+
+
+def make_jobs():
+    return [
+        ScanJob("small_long.mp4", size=10, cost=9.0, duration=60),
+        ScanJob("big_short.mp4", size=300, cost=2.0, duration=5),
+        ScanJob("mid.mp4", size=100, cost=5.0, duration=30),
+    ]
+
+
+@pytest.mark.parametrize(
+    "ordering, expected",
+    [
+        ("lpt", ["small_long.mp4", "mid.mp4", "big_short.mp4"]),
+        ("spt", ["big_short.mp4", "mid.mp4", "small_long.mp4"]),
+        ("size", ["small_long.mp4", "mid.mp4", "big_short.mp4"]),
+    ],
+)
+def test_order_jobs(ordering, expected):
+    jobs = make_jobs()
+    assert order_jobs(jobs, ordering) is jobs  # 原地排序
+    assert [job.path for job in jobs] == expected
+
+
+def test_order_jobs_rejects_unknown_ordering():
+    with pytest.raises(ValueError):
+        order_jobs(make_jobs(), "random")
+
+
+def test_simulate_makespan_assigns_to_first_free_worker():
+    assert simulate_makespan([4, 3, 3, 2], workers=2) == 6
+    assert simulate_makespan([2, 3, 3, 4], workers=2) == 7
+    assert simulate_makespan([], workers=3) == 0
+
+
+def test_simulate_makespan_treats_zero_workers_as_one():
+    assert simulate_makespan([1, 2, 3], workers=0) == 6
+
+
+def test_lpt_never_worse_than_spt_on_mixed_batch():
+    costs = [1, 1, 1, 1, 1, 1, 10]
+    lpt = [job.cost for job in order_jobs([ScanJob(str(c), 0, c, 0) for c in costs])]
+    spt = sorted(costs)
+    assert simulate_makespan(lpt, 3) == 10
+    assert simulate_makespan(spt, 3) == 12
@@ -0,0 +1,37 @@
+from stream_plan import stream_args
+
+
+def make_plan():
+    return {
+        "video": 0,
+        "streams": [
+            {"index": 1, "type": "a", "codec": "copy", "bitrate": None},
+            {"index": 2, "type": "a", "codec": "aac", "bitrate": "384k"},
+            {"index": 4, "type": "s", "codec": "mov_text", "bitrate": None},
+        ],
+        "notes": [],
+    }
+
+
+def test_stream_args_without_plan_copies_audio():
+    assert stream_args(None) == ["-c:a", "copy"]
+
+
+def test_stream_args_numbers_output_streams_per_type():
+    assert stream_args(make_plan()) == [
+        "-map", "0:0",
+        "-map", "0:1", "-c:a:0", "copy",
+        "-map", "0:2", "-c:a:1", "aac", "-b:a:1", "384k",
+        "-map", "0:4", "-c:s:0", "mov_text",
+    ]  # fmt: skip
+
+
+def test_stream_args_for_concat_maps_only_audio_and_subtitles():
+    args = stream_args(make_plan(), input_index=1, video=False)
+    assert args[:4] == ["-map", "1:1", "-c:a:0", "copy"]
+    assert "1:0" not in args
+    assert [args[i + 1] for i, arg in enumerate(args) if arg == "-map"] == [
+        "1:1",
+        "1:2",
+        "1:4",
+    ]
@@ -0,0 +1,33 @@
+from ui_events import UiEventQueue
+
+
+def test_drain_coalesces_progress_and_keeps_order():
+    events = UiEventQueue()
+    events.put({"event": "progress", "percent": 10})
+    events.put({"event": "file_start", "file": "a.mp4"})
+    events.put({"event": "progress", "percent": 20})
+    events.put({"event": "file_failed", "file": "a.mp4"})
+    events.put({"event": "progress", "percent": 30})
+    events.put({"event": "scan_progress", "count": 5})
+    assert events.drain() == [
+        {"event": "file_start", "file": "a.mp4"},
+        {"event": "file_failed", "file": "a.mp4"},
+        {"event": "progress", "percent": 30},
+        {"event": "scan_progress", "count": 5},
+    ]
+    assert events.drain() == []
+
+
+def test_drain_keeps_every_non_coalesced_event():
+    events = UiEventQueue()
+    for i in range(3):
+        events.put({"event": "log", "message": str(i)})
+    assert [e["message"] for e in events.drain()] == ["0", "1", "2"]
+
+
+def test_drain_limit_leaves_rest_for_next_refresh():
+    events = UiEventQueue()
+    for i in range(5):
+        events.put({"event": "log", "message": str(i)})
+    assert len(events.drain(limit=3)) == 3
+    assert [e["message"] for e in events.drain()] == ["3", "4"]
@@ -0,0 +1,47 @@
+import queue
+
+REFRESH_MS = 100  # 界面刷新间隔，每次刷新处理积压的全部事件
+MAX_EVENTS_PER_DRAIN = 5000  # 单次刷新最多取出的事件数，防止长时间占用主线程
+# 只有最新一条有意义的事件，同一批刷新中只保留最后一条
+COALESCED_EVENTS = {
+    "progress",
+    "scan_progress",
+    "file_queued",
+    "file_done",
+    "file_skipped",
+    "encoder",
+    "quality",
+    "crf_search",
+}
+
+
+class UiEventQueue:
+    """工作线程与 Tk 主线程之间的事件通道
+
+    引擎在任意线程中调用 put()，Tk 主线程按固定间隔调用 drain() 取出积压的事件。
+    进度类事件在一次 drain 中合并为最新的一条，界面每个刷新周期只重绘一次，
+    文件数量很多时也不会堆积大量 after 回调。
+    """
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+
+    def put(self, event):
+        self._queue.put(event)
+
+    def drain(self, limit=MAX_EVENTS_PER_DRAIN):
+        """取出积压的事件，合并后按发生顺序返回"""
+        kept = []
+        latest = {}
+        for index in range(limit):
+            try:
+                event = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if event["event"] in COALESCED_EVENTS:
+                latest[event["event"]] = (index, event)
+            else:
+                kept.append((index, event))
+        kept.extend(latest.values())
+        kept.sort(key=lambda item: item[0])
+        return [event for _, event in kept]
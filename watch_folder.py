@@ -0,0 +1,273 @@
+import os
+import sys
+import time
+import errno
+import struct
+import select
+import ctypes
+import ctypes.util
+import threading
+
+POLL_INTERVAL = 2.0  # 轮询模式下重新遍历目录的间隔
+SETTLE_SECONDS = 3.0  # 大小和修改时间保持不变多久后认为文件已写完
+CHECK_INTERVAL = 1.0  # 检查待定文件是否稳定的间隔
+
+# inotify 事件，见 <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_ISDIR = 0x40000000
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+WATCH_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def _load_inotify():
+    """Linux 下通过 ctypes 调用 libc 的 inotify，不可用时返回 None"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        name = ctypes.util.find_library("c") or "libc.so.6"
+        libc = ctypes.CDLL(name, use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint32,
+        ]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class FolderWatcher:
+    """监视目录树中新出现或被修改的视频文件，文件停止增长后回调 on_ready(路径)
+
+    Linux 上用 inotify 获取变化，其他平台或 inotify 不可用时定期遍历目录。
+    两种方式都只把变化的文件放入待定列表，大小和修改时间在 settle 秒内
+    不再变化才认为写入完成，避免把正在拷贝的文件交给编码。
+    """
+
+    def __init__(
+        self,
+        root,
+        extensions,
+        on_ready,
+        exclude_dirs=(),
+        settle=SETTLE_SECONDS,
+        poll_interval=POLL_INTERVAL,
+        use_inotify=True,
+        include_existing=True,
+    ):
+        self.root = os.path.normpath(root)
+        self.extensions = extensions
+        self.on_ready = on_ready
+        self.exclude = {os.path.normcase(os.path.abspath(d)) for d in exclude_dirs}
+        self.settle = settle
+        self.poll_interval = poll_interval
+        # 启动时已存在的文件也交给 on_ready，之后只处理变化的文件
+        self.include_existing = include_existing
+        self.libc = _load_inotify() if use_inotify else None
+        self.backend = "inotify" if self.libc else "polling"
+        self._pending = {}  # 路径 -> (大小, 修改时间, 最后一次变化的时间)
+        self._known = {}  # 轮询模式下上一次看到的 (大小, 修改时间)
+        self._watches = {}  # inotify 监视描述符 -> 目录
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def is_excluded(self, path):
+        return os.path.normcase(os.path.abspath(path)) in self.exclude
+
+    def wants(self, path):
+        return os.path.splitext(path)[1].lower() in self.extensions
+
+    def run(self):
+        """阻塞运行直到 stop()；稳定检查在单独的线程中进行"""
+        checker = threading.Thread(target=self._check_loop, daemon=True)
+        checker.start()
+        try:
+            if self.libc is not None:
+                self._run_inotify()
+            else:
+                self._run_polling()
+        finally:
+            self._stop_event.set()
+            checker.join()
+
+    def touch(self, path):
+        """记录一次变化：重新开始计算稳定时间"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._pending.pop(path, None)
+            return
+        with self._lock:
+            self._pending[path] = (st.st_size, st.st_mtime_ns, time.monotonic())
+
+    def _scan_existing(self):
+        """记录已有文件；include_existing 时修改时间早于 settle 秒的直接就绪，
+        其余按新文件等待稳定。在开始监视之后调用，两者之间出现的文件不会漏掉。
+        """
+        for _, entry in self._walk(self.root):
+            if self._stop_event.is_set():
+                return
+            if entry is None:
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            self._known[entry.path] = (st.st_size, st.st_mtime_ns)
+            if not self.include_existing:
+                continue
+            if st.st_size and time.time() - st.st_mtime >= self.settle:
+                try:
+                    self.on_ready(entry.path)
+                except Exception as e:
+                    print(f"处理已有文件失败: {e}", file=sys.stderr)
+            else:
+                self.touch(entry.path)
+
+    def _check_loop(self):
+        while not self._stop_event.wait(CHECK_INTERVAL):
+            now = time.monotonic()
+            with self._lock:
+                pending = list(self._pending.items())
+            for path, (size, mtime, changed) in pending:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    with self._lock:
+                        self._pending.pop(path, None)
+                    continue
+                if (st.st_size, st.st_mtime_ns) != (size, mtime):
+                    self.touch(path)
+                    continue
+                if size == 0 or now - changed < self.settle:
+                    continue
+                with self._lock:
+                    if self._pending.get(path, (None,))[:2] != (size, mtime):
+                        continue
+                    del self._pending[path]
+                try:
+                    self.on_ready(path)
+                except Exception as e:
+                    print(f"处理新文件失败: {e}", file=sys.stderr)
+
+    def _walk(self, top):
+        """遍历 top 下的目录和视频文件，跳过排除的目录"""
+        stack = [top]
+        while stack:
+            current = stack.pop()
+            if self.is_excluded(current):
+                continue
+            try:
+                with os.scandir(current) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            yield current, None
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif self.wants(entry.name):
+                        yield current, entry
+                except OSError:
+                    continue
+
+    def _run_polling(self):
+        self._scan_existing()
+        while not self._stop_event.wait(self.poll_interval):
+            seen = {}
+            for _, entry in self._walk(self.root):
+                if entry is None:
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                seen[entry.path] = (st.st_size, st.st_mtime_ns)
+                # 新出现或大小/修改时间变化的文件放入待定列表
+                if self._known.get(entry.path) != seen[entry.path]:
+                    self.touch(entry.path)
+            self._known = seen
+
+    def _add_watch(self, directory):
+        wd = self.libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            print(
+                f"无法监视目录 {directory}: {os.strerror(err)}", file=sys.stderr
+            )
+            return
+        self._watches[wd] = directory
+
+    def _watch_tree(self, top, touch_files=False):
+        for directory, entry in self._walk(top):
+            if entry is None:
+                self._add_watch(directory)
+            elif touch_files:
+                # 新建目录里在加上监视之前已写入的文件
+                self.touch(entry.path)
+
+    def _run_inotify(self):
+        self._fd = self.libc.inotify_init1(IN_NONBLOCK)
+        if self._fd < 0:
+            print("inotify 初始化失败，改为轮询", file=sys.stderr)
+            self.backend = "polling"
+            self._run_polling()
+            return
+        try:
+            self._watch_tree(self.root)
+            self._scan_existing()
+            self._known = {}  # inotify 模式下不需要保留
+            while not self._stop_event.is_set():
+                ready, _, _ = select.select([self._fd], [], [], 0.5)
+                if not ready:
+                    continue
+                try:
+                    data = os.read(self._fd, 64 * 1024)
+                except OSError as e:
+                    if e.errno == errno.EAGAIN:
+                        continue
+                    raise
+                self._handle_events(data)
+        finally:
+            os.close(self._fd)
+
+    def _handle_events(self, data):
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出时可能漏掉文件，重新遍历一次
+                print(
+                    "inotify 事件队列溢出，重新遍历目录", file=sys.stderr
+                )
+                self._watch_tree(self.root, touch_files=True)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_DELETE_SELF:
+                self._watches.pop(wd, None)
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not self.is_excluded(path):
+                    self._watch_tree(path, touch_files=True)
+            elif self.wants(path):
+                self.touch(path)